@@ -0,0 +1,153 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+from compositing import to_premultiplied_bgra
+
+ASSET_DIR = 'resources/img'
+ASSET_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+FIT_STRETCH = 'stretch' # Resize to exactly the target size, aspect ratio is not kept
+FIT_CONTAIN = 'contain' # Largest size that fits inside the target size with the aspect ratio kept
+
+# Process-wide LRU cache of decoded images and their resized, premultiplied BGRA variants.
+# Entries are keyed by (path, mtime, file size, target size, fit mode), so an edited file on
+# disk is picked up automatically and never served stale.
+class AssetCache:
+    def __init__(self, max_bytes=ASSET_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (value, nbytes), least recently used first
+        self._lock = threading.Lock()
+        self._loading = {} # key -> lock, so concurrent misses on one key only load it once
+
+    def _key(self, path, size=None, fit=None):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, tuple(size) if size else None, fit)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def _store(self, key, value, nbytes):
+        with self._lock:
+            if nbytes > self.max_bytes or key in self._entries:
+                return
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def _get_or_load(self, key, load):
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+                # Another thread may have loaded it while we waited
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is not None:
+                    return entry[0]
+
+                value, nbytes = load()
+                self._store(key, value, nbytes)
+        finally:
+            # Also after a failed load, otherwise the key's lock would stay in _loading for good
+            with self._lock:
+                self._loading.pop(key, None)
+        return value
+
+    # Decoded RGBA image, shared between callers so it must not be modified
+    def image(self, path):
+        def load():
+            with Image.open(path) as img:
+                out = img.convert('RGBA')
+            with self._lock:
+                self.decodes += 1
+            return out, out.width * out.height * 4
+
+        return self._get_or_load(self._key(path), load)
+
+    # Resized, premultiplied BGRA array of the image at path, ready for compositing.paste_bgra
+    def sprite(self, path, size, fit=FIT_STRETCH):
+        def load():
+            sprite = to_premultiplied_bgra(resize_image(self.image(path), size, fit))
+            sprite.flags.writeable = False
+            return sprite, sprite.nbytes
+
+        return self._get_or_load(self._key(path, size, fit), load)
+
+    # Decoded RGBA image of encoded bytes, e.g. a downloaded logo. Keyed by the content digest, so
+    # read() (which returns the bytes) is only called on a miss and nothing goes through a file.
+    def image_from_bytes(self, digest, read):
+        def load():
+            with Image.open(io.BytesIO(read())) as img:
+                out = img.convert('RGBA')
+            with self._lock:
+                self.decodes += 1
+            return out, out.width * out.height * 4
+
+        return self._get_or_load(('bytes', digest, None, None, None), load)
+
+    def sprite_from_bytes(self, digest, read, size, fit=FIT_STRETCH):
+        def load():
+            sprite = to_premultiplied_bgra(resize_image(self.image_from_bytes(digest, read), size, fit))
+            sprite.flags.writeable = False
+            return sprite, sprite.nbytes
+
+        return self._get_or_load(('bytes', digest, None, tuple(size), fit), load)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'decodes': self.decodes,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+def resize_image(image, size, fit=FIT_STRETCH):
+    width, height = size
+    if fit == FIT_CONTAIN:
+        ratio = min(width / image.width, height / image.height)
+        width = max(1, round(image.width * ratio))
+        height = max(1, round(image.height * ratio))
+    elif fit != FIT_STRETCH:
+        raise ValueError(f'Invalid fit mode: {fit}')
+
+    return image.resize((width, height))
+
+def asset_path(name):
+    return os.path.join(ASSET_DIR, name)
+
+asset_cache = AssetCache()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from asset_cache import asset_cache, asset_path
+from graphics import get_action_message_and_icon, included_events, PLAYER_ICON
+from remote_assets import remote_assets, is_remote
+
+PREFETCH_WORKERS = 8
+PREFETCH_PER_HOST = 4 # Concurrent downloads from one server, the rest wait for a free slot
+PREFETCH_TIMEOUT = (0.5, 5) # Connect, read. An unreachable server fails the job in under a second.
+
+class MissingAssetsError(Exception):
+    def __init__(self, missing):
+        self.missing = missing # reference -> error
+        super().__init__('Missing assets: ' + ', '.join(f'{ref} ({error})' for ref, error in missing.items()))
+
+# Every logo and icon the clips of a job will draw, each once, in the order they are first used.
+# Clips without an event that gets graphics are skipped like download_and_meta skips them.
+def collect_asset_refs(clips_config):
+    refs = []
+    for clip_config in clips_config:
+        clip_meta = clip_config.get('clip_meta', [])
+        if not any(meta.get('action') in included_events for meta in clip_meta):
+            continue
+        for meta in clip_meta:
+            clip_refs = [meta.get('home_logo_url'), meta.get('visiting_logo_url'), meta.get('league_logo_url'), PLAYER_ICON]
+            try:
+                clip_refs.append(get_action_message_and_icon(meta)[0])
+            except Exception:
+                pass # An action without an icon is reported by the renderer
+            refs += [ref for ref in clip_refs if ref and ref not in refs]
+    return refs
+
+# Download (remote) or read (local) and decode every reference into the asset cache at once, so the
+# renderer only ever finds them there. Local files are checked up front, which fails a job with a
+# missing logo immediately instead of after the downloads. Raises MissingAssetsError listing every
+# reference that could not be loaded.
+def prefetch_assets(refs, workers=PREFETCH_WORKERS, per_host=PREFETCH_PER_HOST, timeout=PREFETCH_TIMEOUT):
+    t_start = time.perf_counter()
+    refs = list(dict.fromkeys(refs))
+    missing = {ref: 'not found' for ref in refs if not is_remote(ref) and not os.path.isfile(asset_path(ref))}
+    if missing:
+        raise MissingAssetsError(missing)
+
+    host_slots = {}
+    host_lock = threading.Lock()
+
+    def load(ref):
+        if not is_remote(ref):
+            asset_cache.image(asset_path(ref))
+            return
+        with host_lock:
+            slot = host_slots.setdefault(urlparse(ref).netloc, threading.Semaphore(per_host))
+        with slot:
+            digest = remote_assets.digest(ref, timeout)
+        asset_cache.image_from_bytes(digest, remote_assets.reader(digest))
+
+    def load_or_error(ref):
+        try:
+            load(ref)
+            return None
+        except Exception as e:
+            return e
+
+    if refs:
+        with ThreadPoolExecutor(max_workers=min(workers, len(refs))) as pool:
+            errors = dict(zip(refs, pool.map(load_or_error, refs)))
+        missing = {ref: error for ref, error in errors.items() if error is not None}
+    if missing:
+        raise MissingAssetsError(missing)
+
+    print(f'Prefetched {len(refs)} assets in {time.perf_counter() - t_start:.2f}s')
+    return refs
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from layers import blend_layer
+from layout import BLOCKS
+from media_probe import probe_cache
+from pipeline import run_pipeline, PIPELINE_QUEUE_SIZE
+from progress import progress_monitor
+from utils import run_and_log
+from video_writer import open_writer, audio_map_args, input_window_args
+
+CHUNK_MIN_FRAMES = 250 # Below ~10s per chunk the process start-up costs more than it saves
+
+# How many worker processes a job asked for; 'auto' means one per core
+def chunk_workers(encoding_params=None):
+    workers = (encoding_params or {}).get('chunk_workers', 1)
+    if workers == 'auto':
+        workers = os.cpu_count() or 1
+    return max(int(workers), 1)
+
+# Frame indices of the source's keyframes, from the probe cache when the source was probed. Otherwise
+# ffmpeg only decodes the keyframes themselves (-skip_frame nokey), so this is cheap even for long clips.
+# Returns [0] if it fails.
+def keyframe_indices(source, fps):
+    try:
+        info = probe_cache.probe(source)
+        if info.keyframe_times:
+            return info.keyframe_indices(fps)
+    except Exception:
+        pass # No ffprobe, fall back to ffmpeg
+
+    cmd = ['ffmpeg', '-hide_banner', '-nostats', '-skip_frame', 'nokey', '-i', source, '-an', '-vf', 'showinfo', '-f', 'null', '-']
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    except OSError as e:
+        print(f'Could not list keyframes of {source}: {e}')
+        return [0]
+
+    times = [float(t) for t in re.findall(r'pts_time:(-?[0-9.]+)', result.stderr)]
+    if result.returncode != 0 or not times:
+        print(f'Could not list keyframes of {source}: {result.stderr.strip()[-200:]}')
+        return [0]
+    return sorted({round((t - times[0]) * fps) for t in times})
+
+# Split [0, duration) into at most workers ranges of roughly equal length, each starting on a keyframe
+def plan_chunks(keyframes, duration, workers, min_frames=CHUNK_MIN_FRAMES):
+    workers = min(workers, max(duration // min_frames, 1))
+    starts = [0]
+    for k in range(1, workers):
+        target = duration * k // workers
+        start = min(keyframes, key=lambda f: abs(f - target))
+        if start - starts[-1] >= min_frames and duration - start >= min_frames:
+            starts.append(start)
+    return list(zip(starts, starts[1:] + [duration]))
+
+# Worker initializer: the subscribers live in the parent, so hand every progress event of this
+# process's encoders to it through queue
+def forward_progress(queue):
+    progress_monitor.subscribe(queue.put)
+
+# Parent side of forward_progress, publishes the workers' events until it reads None
+def republish_progress(queue):
+    for event in iter(queue.get, None):
+        progress_monitor.publish(event)
+
+# Worker: render frames [start, end) of the clip into chunk_filename. The clip begins at source frame
+# first_frame. Windows use clip-wide frame indices, so a layer switches on at the same frame no matter
+# which chunk it falls in.
+def render_chunk(source, chunk_filename, start, end, layers, windows, fps, size, encoding_params, first_frame=0):
+    cap = cv2.VideoCapture(source)
+    if first_frame + start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame + start)
+    out = open_writer(chunk_filename, fps, size, encoding_params, total_frames=end - start)
+    position = [start]
+
+    def read(buf):
+        if position[0] >= end:
+            return False, None
+        position[0] += 1
+        return cap.read(buf) if buf is not None else cap.read()
+
+    def composite(frame, n):
+        n += start
+        for block in BLOCKS:
+            first, last = windows[block]
+            if first <= n <= last:
+                blend_layer(frame, layers[block])
+
+    try:
+        stats = run_pipeline(read, composite, out.write, encoding_params.get('pipeline_queue_size', PIPELINE_QUEUE_SIZE))
+    finally:
+        cap.release()
+        out.release()
+    return chunk_filename, stats.frames['encode']
+
+# Join chunks that share encoder settings without re-encoding them, and copy in the audio of
+# audio_source in the same pass since the chunks themselves are rendered without it
+def concat_chunks(chunk_filenames, output_filename, audio_source=None, audio_tracks=None, audio_window=None):
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as list_file:
+        for chunk_filename in chunk_filenames:
+            list_file.write(f"file '{os.path.abspath(chunk_filename)}'\n")
+    try:
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', list_file.name]
+        if audio_source:
+            cmd += input_window_args(audio_window) + ['-i', audio_source, '-map', '0:v'] + audio_map_args(1, audio_tracks)
+        cmd += ['-c', 'copy', '-movflags', '+faststart', output_filename]
+        return run_and_log(cmd, msg='ffmpeg concat chunks') == 0
+    finally:
+        os.remove(list_file.name)
+
+# Render a long clip as keyframe-aligned chunks in parallel worker processes, then stream-copy
+# them together. The clip is duration frames of source from first_frame on, audio_window is the
+# matching (start_s, duration_s) of the source audio. Returns False when the
+# clip is too short to split or any step failed, in which case nothing was written and the caller
+# should render it in one piece.
+def render_chunked(source, output_filename, layers, windows, fps, size, duration, encoding_params=None, first_frame=0, audio_window=None):
+    encoding_params = dict(encoding_params or {})
+    workers = chunk_workers(encoding_params)
+    if workers < 2 or duration < 2 * CHUNK_MIN_FRAMES:
+        return False
+
+    keyframes = [0] + [k - first_frame for k in keyframe_indices(source, fps) if first_frame < k < first_frame + duration]
+    chunks = plan_chunks(keyframes, duration, workers)
+    if len(chunks) < 2:
+        return False
+
+    # Every worker runs its own encoder, so share the cores out instead of letting each x264 take all of them
+    encoding_params.setdefault('encoder_threads', max((os.cpu_count() or 1) // len(chunks), 1))
+    print(f'Rendering {output_filename} as {len(chunks)} chunks: {chunks}')
+
+    # Spawn, not fork: the caller runs clips on threads, and a forked child can inherit a lock
+    # another thread was holding and hang on it
+    context = multiprocessing.get_context('spawn')
+    progress_queue = context.Queue()
+    republisher = threading.Thread(target=republish_progress, args=(progress_queue,), name='chunk-progress', daemon=True)
+    republisher.start()
+
+    with tempfile.TemporaryDirectory(prefix='reels_chunks_') as tmp_dir:
+        # Named after the output, as the chunk's name is the label of its progress events
+        stem = os.path.splitext(os.path.basename(output_filename))[0]
+        chunk_filenames = [os.path.join(tmp_dir, f'{stem}_chunk_{i:03d}.mp4') for i in range(len(chunks))]
+        try:
+            with ProcessPoolExecutor(max_workers=len(chunks), mp_context=context,
+                                     initializer=forward_progress, initargs=(progress_queue,)) as pool:
+                futures = [pool.submit(render_chunk, source, chunk_filename, start, end, layers, windows, fps, size, encoding_params, first_frame)
+                           for chunk_filename, (start, end) in zip(chunk_filenames, chunks)]
+                frames = [future.result()[1] for future in futures]
+        except Exception as e:
+            print(f'Chunked rendering of {output_filename} failed: {e}')
+            return False
+        finally:
+            # The workers have exited and flushed their events, so None is the last item
+            progress_queue.put(None)
+            republisher.join()
+            progress_queue.close()
+
+        # A short chunk would shift every later frame. Only the last one may come up short,
+        # as the container's frame count is an estimate.
+        for (start, end), count in zip(chunks[:-1], frames):
+            if count != end - start:
+                print(f'Chunk {start}-{end} of {output_filename} has {count} frames instead of {end - start}.')
+                return False
+        return concat_chunks(chunk_filenames, output_filename, source, encoding_params.get('audio_tracks'), audio_window)
@@ -0,0 +1,63 @@
+import functools
+import json
+import threading
+import numpy as np
+
+COLOR_NAMES_FILE = 'resources/colors/color_names.json'
+COLOR_NAME_CACHE_SIZE = 4096
+
+# D65 reference white of sRGB
+WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+SRGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+
+# '#1a2B3c' or '1a2b3c' -> (26, 43, 60)
+def hex_to_rgb(hex_color):
+    value = hex_color.strip().lstrip('#')
+    if len(value) == 3:
+        value = ''.join(c * 2 for c in value)
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+# CIE L*a*b* of an (..., 3) array of 8-bit sRGB values. Distances in Lab follow perceived
+# colour differences far better than distances in RGB.
+def srgb_to_lab(rgb):
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ SRGB_TO_XYZ.T / WHITE_D65
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+# Bundled colour names with their Lab coordinates, loaded on first use
+class ColorNames:
+    def __init__(self, path=COLOR_NAMES_FILE):
+        self.path = path
+        self.names = None
+        self.lab = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self.names is None:
+                with open(self.path, 'r') as file:
+                    entries = json.load(file)
+                self.lab = srgb_to_lab([hex_to_rgb(entry['hex']) for entry in entries])
+                self.names = [entry['name'] for entry in entries]
+
+    # (name, delta_e) of the closest named colour, delta_e being the CIE76 distance in Lab
+    def nearest(self, hex_color):
+        if self.names is None:
+            self._load()
+        distances = np.linalg.norm(self.lab - srgb_to_lab(hex_to_rgb(hex_color)), axis=1)
+        i = int(np.argmin(distances))
+        return self.names[i], float(distances[i])
+
+color_names = ColorNames()
+
+# Name of the closest bundled colour, memoized by the normalized hex value
+def color_name(hex_color):
+    return _color_name('#%02X%02X%02X' % hex_to_rgb(hex_color))
+
+@functools.lru_cache(maxsize=COLOR_NAME_CACHE_SIZE)
+def _color_name(hex_color):
+    return color_names.nearest(hex_color)[0]
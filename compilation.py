@@ -0,0 +1,99 @@
+import os
+from collections import Counter
+from media_probe import probe_cache
+from utils import run_and_log
+from video_writer import encoder_args, match_output_args, CRF_OUTPUT_VIDEO
+
+# Stream parameters that must be identical for the concat demuxer to join files with -c copy
+VIDEO_COPY_KEYS = ('codec_name', 'profile', 'level', 'width', 'height', 'pix_fmt', 'time_base', 'r_frame_rate')
+AUDIO_COPY_KEYS = ('codec_name', 'sample_rate', 'channels')
+
+# ffprobe's profile names to the libx264 -profile:v values that produce them
+X264_PROFILES = {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'}
+
+# First video stream and all audio streams of a file
+def probe_streams(filename):
+    return probe_cache.probe(filename).streams()
+
+# Everything that has to match between two files for a stream-copy concat
+def stream_signature(streams):
+    video = tuple(str((streams['video'] or {}).get(key)) for key in VIDEO_COPY_KEYS)
+    audio = tuple(tuple(str(stream.get(key)) for key in AUDIO_COPY_KEYS) for stream in streams['audio'])
+    return video, audio
+
+def write_concat_list(filenames, list_filename):
+    with open(list_filename, 'w') as file:
+        for filename in filenames:
+            file.write(f"file '{os.path.abspath(filename)}'\n")
+    return list_filename
+
+# -level:v giving an encode the H.264 level of the probed video stream, which ffprobe reports as 41 for 4.1
+def level_args(video):
+    try:
+        level = int(video.get('level') or 0)
+    except ValueError:
+        return []
+    return ['-level:v', f'{level / 10:.1f}'] if level > 0 else []
+
+# Re-encode filename to the stream parameters of reference, so it can be copy-concatenated with it.
+# Rate control is the job's (encoding_params), like that of the clips around it.
+def conform_command(filename, output_filename, reference, audio_bitrate, encoding_params=None):
+    encoding_params = encoding_params or {}
+    video = reference['video']
+    profile = X264_PROFILES.get(video.get('profile'))
+    if video.get('codec_name') != 'h264' or not profile:
+        return None
+
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', filename,
+           '-map', '0:v:0',
+           '-vf', f"scale={video['width']}:{video['height']},setsar=1,fps={video['r_frame_rate']},format={video['pix_fmt']}"]
+    cmd += encoder_args(encoding_params.get('crf', CRF_OUTPUT_VIDEO), encoding_params.get('video_bitrate'))
+    cmd += match_output_args(encoding_params) or ['-profile:v', profile, '-video_track_timescale', video['time_base'].split('/')[-1]]
+    if video['pix_fmt'] != 'yuv420p':
+        cmd += ['-pix_fmt', video['pix_fmt']]
+    cmd += level_args(video)
+    if reference['audio']:
+        audio = reference['audio'][0]
+        cmd += ['-map', '0:a', '-c:a', audio['codec_name'], '-ar', str(audio['sample_rate']), '-ac', str(audio['channels']), '-b:a', audio_bitrate]
+    return cmd + [output_filename]
+
+# Join the files with the concat demuxer and -c copy. Files whose streams differ from the most common
+# parameters are re-encoded to match first, so only they pay for an encode. Returns False when that
+# is not possible (e.g. a file without audio next to ones with audio) and nothing was written.
+def concat_stream_copy(filenames, output_filename, list_filename, audio_bitrate, encoding_params=None):
+    probes = []
+    for info in probe_cache.probe_all(filenames):
+        if isinstance(info, Exception):
+            raise info
+        probes.append(info.streams())
+    if any(probe['video'] is None for probe in probes):
+        return False
+
+    signatures = [stream_signature(probe) for probe in probes]
+    reference_signature = Counter(signatures).most_common(1)[0][0]
+    reference = probes[signatures.index(reference_signature)]
+
+    inputs = []
+    conformed_count = 0
+    for filename, probe, signature in zip(filenames, probes, signatures):
+        if signature == reference_signature:
+            inputs.append(filename)
+            continue
+        if bool(probe['audio']) != bool(reference['audio']):
+            print(f'{filename} does not match the audio layout of the other clips.')
+            return False
+
+        conformed = f'{os.path.splitext(filename)[0]}_conform.mp4'
+        cmd = conform_command(filename, conformed, reference, audio_bitrate, encoding_params)
+        if cmd is None or run_and_log(cmd, msg=f'conform {filename}') != 0:
+            return False
+        inputs.append(conformed)
+        conformed_count += 1
+
+    if conformed_count:
+        print(f'Re-encoded {conformed_count}/{len(filenames)} clips to match the others.')
+
+    write_concat_list(inputs, list_filename)
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', list_filename,
+           '-map', '0', '-c', 'copy', '-movflags', '+faststart', output_filename]
+    return run_and_log(cmd, msg='ffmpeg concat copy') == 0
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+# In-place compositing primitives for BGR frames. Everything here works directly on the
+# numpy frame and only touches the region covered by the sprite or polygon, instead of
+# converting the whole frame to PIL and back.
+
+# Convert a PIL image of any mode to a BGRA ndarray with colors premultiplied by alpha
+def to_premultiplied_bgra(image):
+    rgba = np.asarray(image.convert('RGBA'))
+    return premultiply(cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA))
+
+def premultiply(bgra):
+    out = bgra.copy()
+    alpha = bgra[:, :, 3:].astype(np.uint16)
+    out[:, :, :3] = (bgra[:, :, :3] * alpha + 127) // 255
+    return out
+
+# Blend premultiplied colors onto a frame region in place: roi = bgr + roi * (255 - alpha) / 255.
+# bgr and inv_alpha are uint16 so callers can keep them around between frames.
+def blend_premultiplied(roi, bgr, inv_alpha):
+    blended = roi * inv_alpha
+    blended += 127
+    blended //= 255
+    blended += bgr
+    np.minimum(blended, 255, out=blended)
+    np.copyto(roi, blended, casting='unsafe')
+    return roi
+
+# Intersect a w x h box placed at (x, y) with the frame.
+# Returns (frame_slice, sprite_slice) or None if the box is entirely outside the frame.
+def clip_box(frame_w, frame_h, x, y, w, h):
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, frame_w), min(y + h, frame_h)
+
+    if x0 >= x1 or y0 >= y1:
+        return None
+
+    frame_slice = (slice(y0, y1), slice(x0, x1))
+    sprite_slice = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+    return frame_slice, sprite_slice
+
+# Paste a premultiplied BGRA sprite with its top-left corner at (x, y), equivalent to PIL's paste(img, box, img)
+def paste_bgra(frame, sprite, x, y):
+    boxes = clip_box(frame.shape[1], frame.shape[0], int(x), int(y), sprite.shape[1], sprite.shape[0])
+    if boxes is None:
+        return frame
+
+    frame_slice, sprite_slice = boxes
+    src = sprite[sprite_slice]
+    blend_premultiplied(frame[frame_slice], src[:, :, :3].astype(np.uint16), (255 - src[:, :, 3:]).astype(np.uint16))
+
+    return frame
+
+# Fill a polygon given as (x, y) float vertices, equivalent to PIL's ImageDraw.polygon(vertices, fill=color)
+def fill_polygon(frame, vertices, color):
+    # PIL truncates float vertices to the pixel grid, flooring keeps the edges on the same pixels
+    points = np.floor(np.asarray(vertices, dtype=np.float64)).astype(np.int32)
+    cv2.fillPoly(frame, [points], color)
+    return frame
@@ -0,0 +1,65 @@
+import copy
+import json
+import os
+import tempfile
+
+CLIP_META_KEYS = ["home_logo_url", "home_name", "home_initials", "visiting_logo_url", "visiting_name", "visiting_initials", "league_logo_url", "league_name", "action"]
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# Replace path with data in one step, a crash mid-write leaves the old file intact
+def write_json_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file, indent=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+# The job config (config_template/*.json) and the graphic settings (graphic_templates/main_template.json),
+# each read from disk once. Edits only change the in-memory copies until flush() writes every changed
+# file at once, so an interrupted session never leaves a half-edited config behind.
+class ConfigSession:
+    def __init__(self, config_path, graphic_path):
+        self.config_path = config_path
+        self.graphic_path = graphic_path
+        self.config = load_json(config_path)
+        self.graphic = load_json(graphic_path)
+        self._saved = {'config': copy.deepcopy(self.config), 'graphic': copy.deepcopy(self.graphic)}
+
+    def count_clips(self):
+        return len(self.config.get('clips', []))
+
+    # Edit a colour or layout setting of general_settings
+    def modify_graphic(self, setting, value):
+        self.graphic["general_settings"][setting] = value
+
+    # Edit a field of the job config; clip meta fields are set on clip index
+    def modify_config(self, type, value, index=0):
+        if(type == 'graphic_template'):
+            self.config['clip_parameters']['clip_graphic_template'][type] = value
+        elif(type in CLIP_META_KEYS):
+            self.config['clips'][index]['clip_meta'][0][type] = value
+        elif(type == 'platform' or type == 'aspect_ratio'):
+            self.config['encoding_parameters'][type] = value
+        elif(type == 'video_url'):
+            for clip in self.config['clips']:
+                clip[type] = value
+
+    def dirty(self):
+        return [name for name in ('config', 'graphic') if getattr(self, name) != self._saved[name]]
+
+    # Write the changed files, each with an atomic rename
+    def flush(self):
+        for name in self.dirty():
+            write_json_atomic(self.config_path if name == 'config' else self.graphic_path, getattr(self, name))
+            self._saved[name] = copy.deepcopy(getattr(self, name))
+
+    # Drop the edits made since the last flush
+    def rollback(self):
+        self.config = copy.deepcopy(self._saved['config'])
+        self.graphic = copy.deepcopy(self._saved['graphic'])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import cv2
+from utils import run_and_log
+from video_writer import encoder_args, audio_map_args, input_window_args, match_output_filter, match_output_args, CRF_OUTPUT_VIDEO
+
+OVERLAY_PYTHON = 'python' # Decode, blend and encode frame by frame in Python
+OVERLAY_FFMPEG = 'ffmpeg' # Pre-rendered layers composited by a single ffmpeg process
+
+# Templates whose blocks are static during their whole time window, so ffmpeg can composite
+# them without Python seeing a frame. Templates with per-frame logic must stay on the Python path.
+STATIC_TEMPLATES = {'rectangle', 'diamond'}
+
+# Whether a job asked for the ffmpeg overlay backend and can actually use it
+def use_ffmpeg_overlay(graphic_template, encoding_params=None):
+    backend = (encoding_params or {}).get('overlay_backend', OVERLAY_PYTHON)
+
+    if backend != OVERLAY_FFMPEG:
+        return False
+    if graphic_template not in STATIC_TEMPLATES:
+        print(f"Template '{graphic_template}' needs per-frame rendering, using the Python compositor.")
+        return False
+    if not shutil.which('ffmpeg'):
+        print('ffmpeg was not found, using the Python compositor.')
+        return False
+    return True
+
+# Straight-alpha BGRA from a premultiplied layer, which is what PNG and ffmpeg's overlay expect
+def unpremultiply(bgra):
+    alpha = bgra[:, :, 3:].astype(np.uint16)
+    bgr = (bgra[:, :, :3].astype(np.uint16) * 255 + alpha // 2) // np.maximum(alpha, 1)
+    return np.dstack((np.minimum(bgr, 255).astype(np.uint8), bgra[:, :, 3:]))
+
+def write_layer_png(layer, path):
+    if not cv2.imwrite(path, unpremultiply(layer.bgra)):
+        raise IOError(f'Could not write overlay layer to {path}')
+    return path
+
+# Chain one overlay filter per layer onto the source video (input 0). Layer i is input i and is
+# only shown for frames first..last, the same windows the Python compositor uses.
+def build_filtergraph(overlays):
+    filters = []
+    current = '0:v'
+    for i, (layer, (first, last)) in enumerate(overlays, start=1):
+        label = f'v{i}'
+        filters.append(f"[{current}][{i}:v]overlay=x={layer.x}:y={layer.y}:enable='between(n,{max(first, 0)},{last})'[{label}]")
+        current = label
+    return ';'.join(filters), current
+
+def overlay_command(source, output_filename, png_paths, filtergraph, output_label, encoding_params=None, window=None):
+    encoding_params = encoding_params or {}
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + input_window_args(window) + ['-i', source]
+    for path in png_paths:
+        cmd += ['-i', path]
+
+    output_filter = match_output_filter(encoding_params)
+    if output_filter:
+        filtergraph = f'{filtergraph};' if filtergraph else ''
+        filtergraph += f'[{output_label}]{output_filter}[out]'
+        output_label = 'out'
+    if filtergraph:
+        cmd += ['-filter_complex', filtergraph, '-map', f'[{output_label}]']
+    else:
+        cmd += ['-map', output_label]
+    cmd += audio_map_args(0, encoding_params.get('audio_tracks'))
+    cmd += encoder_args(encoding_params.get('crf', CRF_OUTPUT_VIDEO), encoding_params.get('video_bitrate'))
+    cmd += match_output_args(encoding_params)
+    return cmd + [output_filename]
+
+# Composite pre-rendered layers onto source in one ffmpeg pass that decodes, overlays and encodes natively.
+# layers and windows are keyed by block. window = (start_s, duration_s) trims the source, the frame
+# windows then count from its first frame. Returns False if ffmpeg failed, so the caller can fall back.
+def render_overlays_ffmpeg(source, output_filename, layers, windows, encoding_params=None, window=None, total_frames=None):
+    with tempfile.TemporaryDirectory(prefix='reels_layers_') as tmp_dir:
+        overlays = []
+        png_paths = []
+        for block, layer in layers.items():
+            first, last = windows[block]
+            if layer is None or last < max(first, 0):
+                continue
+            png_paths.append(write_layer_png(layer, os.path.join(tmp_dir, f'{block}.png')))
+            overlays.append((layer, (first, last)))
+
+        filtergraph, output_label = build_filtergraph(overlays)
+        cmd = overlay_command(source, output_filename, png_paths, filtergraph, output_label, encoding_params, window)
+
+        return run_and_log(cmd, msg=f'ffmpeg overlay {output_filename}', total_frames=total_frames) == 0
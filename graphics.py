@@ -1,5 +1,7 @@
 import requests
 import os
+import json
+import functools
 import cv2
 import time
 import logging
@@ -7,9 +9,25 @@ import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageColor
 from urllib.parse import urlparse
 from utils import run_and_log
+from layers import render_layer, blend_layer
+from compositing import paste_bgra, fill_polygon, to_premultiplied_bgra
+from asset_cache import asset_cache, asset_path, resize_image, FIT_CONTAIN, FIT_STRETCH
+from render_context import RenderContext
+from video_writer import open_writer
+from pipeline import run_pipeline, PIPELINE_QUEUE_SIZE
+from chunked_render import render_chunked
+from hls_output import use_hls_output, open_hls_writer
+from variants import parse_variants, meta_filename, WORK_DIR, crop_box, output_size, layout_aspect, crop_and_scale
+from ffmpeg_overlay import use_ffmpeg_overlay, render_overlays_ffmpeg
+from media_probe import probe_cache
+from remote_assets import remote_assets, is_remote
+from layout import BLOCKS, LayoutCompiler, RectOp, TextOp, LogoOp, PolygonOp, rect_box, center_point, text_origin, diamond_vertices
 from math import sqrt
 
 included_events = ['goal', 'shot', 'yellow card', 'red card', 'penalty']
+PLAYER_ICON = 'icons/player_icon.png'
+LAYOUT_CACHE_SIZE = 64
+LAYER_CACHE_SIZE = 32
 
 class GraphicsTemplate:
     def __init__(self):
@@ -52,201 +70,136 @@ class GraphicsTemplate:
         if not generate_meta:
             return
         
-        create_animated_meta(video_h, video_w, self.clip.config['clip_meta'], self.bg_color, self.text_color, home_color, visiting_color, self.clip.local_file_name, clip_num, graphic_template, graphic_layout, self.clip.aspect_ratio)
-
-def generate_rect(x_offset, y_offset, end_x=1, end_y=1, color=(255, 255, 255), text=[], font_scale=1, grow="", opacity=1):
-    global font_style, width, height, frame
-    if opacity != 1:
-        overlay = frame.copy()
-    # If rectangle is centered both horiz. and vert.
-    if (end_x == 1 and end_y == 1):
-        top_left = int(width * x_offset), int(height * y_offset)
-        bottom_right = (int(width - top_left[0]), int(height - top_left[1]))
-    # If rectangle is offcenter both horiz. and vert.
-    elif (end_x != 1 and end_y != 1):
-        top_left = int(width * x_offset), int(height * y_offset)
-        bottom_right = (int(width * end_x), int(height * end_y))
-    # If rectangle is centered only horizontally
-    elif (end_y != 1):
-        top_left = (int(width * x_offset), int(height * y_offset))
-        bottom_right = (int(width - top_left[0]), int(height * end_y))
-
-    if text:
-        text_size = cv2.getTextSize(max(text, key=len), font_style, ((bottom_right[1]-top_left[1])*font_scale)/22, 2)
-        text_width = int(text_size[0][0])
-        new_top_left = ["",""] 
-        new_bottom_right = ["",""]
-        new_top_left[1] = top_left[1]
-        new_bottom_right[1] = bottom_right[1]
-        if grow == "":
-            if (end_x == 1 and end_y == 1):
-                if len(text) == 2:
-                    new_top_left[0] = int(top_left[0] - text_width)
-                    new_bottom_right[0] = int(bottom_right[0] + text_width)
-                else:
-                    new_top_left[0] = int(top_left[0] - text_width/2)
-                    new_bottom_right[0] = int(bottom_right[0] + text_width/2)
-            elif (end_y != 1):
-                if len(text) == 2:
-                    new_top_left[0] = int(top_left[0] - text_width)
-                    new_bottom_right[0] = int(bottom_right[0] + text_width)
-                else:
-                    new_top_left[0] = int(top_left[0] - text_width/2)
-                    new_bottom_right[0] = int(bottom_right[0] + text_width/2)
-            elif (end_x != 1 and end_y != 1):
-                    new_top_left = top_left[0]
-                    new_bottom_right[0] = int(bottom_right[0] + text_width/2)
-        elif grow == "left":
-            new_top_left[0] = int(top_left[0] - text_width)
-            new_bottom_right[0] = bottom_right[0]
-        else:
-            new_top_left[0] = top_left[0]
-            new_bottom_right[0] = int(bottom_right[0] + text_width)
+        create_animated_meta(video_h, video_w, self.clip.config['clip_meta'], self.bg_color, self.text_color, home_color, visiting_color, self.clip.local_file_name, clip_num, graphic_template, graphic_layout, self.clip.aspect_ratio, encoding_params=self.clip.encoding_params,
+                             start_offset_s=self.clip.start_offset_s, end_offset_s=self.clip.end_offset_s, work_dir=self.clip.work_dir)
 
-        top_left = tuple(new_top_left)
-        bottom_right = tuple(new_bottom_right)
-    
-    cv2.rectangle(frame, top_left, bottom_right, color, -1)
-    
-    if opacity != 1:
-        cv2.addWeighted(overlay, opacity, frame, 1 - opacity, 0, frame)
+def generate_rect(ctx, x_offset, y_offset, end_x=1, end_y=1, color=(255, 255, 255), text=[], font_scale=1, grow="", opacity=1):
+    top_left, bottom_right = rect_box(ctx, x_offset, y_offset, end_x, end_y, text, font_scale, grow)
+    draw_rect(ctx, top_left, bottom_right, color, opacity)
 
     return top_left, bottom_right, bottom_right[1]-top_left[1] # Return top_left, bottom_right and height of rect.
 
-def generate_center_text(text, x_offset, y_offset, end_x=1, end_y=1, position=0, color=(0,0,0), thickness=2, rect_h=0, font_scale=1):
-    global font_style, frame, height, width
-    
-    if (end_x == 1 and end_y == 1):
-        center_w = int(width / 2)
-        center_h = int(height / 2)
-        if position != 0:
-            w_offset = int((width - 2*(x_offset*width))*position)
-            center_w = center_w - w_offset
-    elif (end_x != 1 and end_y != 1):
-        center_w = int(width*x_offset + ((width*end_x - width*x_offset)/2))
-        center_h = int(height*y_offset + ((height*end_y - height*y_offset)/2))
-        if position != 0:
-            w_offset = int((width*end_x - width*x_offset)*position)
-            center_w = center_w - w_offset
-    elif (end_y != 1):
-        center_w = int(width / 2)
-        center_h = int(height*y_offset + ((height*end_y - height*y_offset)/2))
-        if position != 0:
-            w_offset = int((width - 2*(x_offset*width))*position)
-            center_w = center_w - w_offset
-    
+def generate_center_text(ctx, text, x_offset, y_offset, end_x=1, end_y=1, position=0, color=(0,0,0), thickness=2, rect_h=0, font_scale=1):
+    center = center_point(ctx, x_offset, y_offset, end_x, end_y, position)
+
     if rect_h != 0:
         font_scale = (rect_h)/22 # Scale the font, 22 meaning the standard size of the font in pixels
-    else:
-        font_scale = font_scale
-    
-    text_size, _ = cv2.getTextSize(text, font_style, font_scale, thickness)
-    
-    text_origin = (int(center_w - text_size[0] / 2), int(center_h + text_size[1] / 2))
-
-    cv2.putText(frame, text, (text_origin[0], text_origin[1]), font_style, font_scale, color, thickness, cv2.LINE_AA)
-
-def generate_center_logo(logo, logo_w, logo_h, x_offset, y_offset, end_x=1, end_y=1, position=0, keepRatio=False):
-    global width, height, frame
-    if (end_x == 1 and end_y == 1):
-        center_w = int(width / 2)
-        center_h = int(height / 2)
-        if position != 0:
-            w_offset = int((width - 2*(x_offset*width))*position)
-            center_w = center_w - w_offset
-    elif (end_x != 1 and end_y != 1):
-        center_w = int(width*x_offset + ((width*end_x - width*x_offset)/2))
-        center_h = int(height*y_offset + ((height*end_y - height*y_offset)/2))
-        if position != 0:
-            w_offset = int((width*end_x - width*x_offset)*position)
-            center_w = center_w - w_offset
-    elif (end_y != 1):
-        center_w = int(width / 2)
-        center_h = int(height*y_offset + ((height*end_y - height*y_offset)/2))
-        if position != 0:
-            w_offset = int((width - 2*(x_offset*width))*position)
-            center_w = center_w - w_offset
-
-    if not is_image(logo):
-        logo = Image.open(f"resources/img/{logo}")
-        
-    new_size = (logo_w, logo_h)
 
-    if keepRatio:
-        # Not working, ValueError: use 4-item box
-        resized_image = logo.thumbnail((new_size)) 
-    else:
-        resized_image = logo.resize(new_size)
+    draw_text(ctx, text, text_origin(ctx, text, center, font_scale, thickness), font_scale, color, thickness)
 
-    logo_origin = (int(center_w - new_size[0] / 2), int(center_h - new_size[1] / 2))
+def generate_center_logo(ctx, logo, logo_w, logo_h, x_offset, y_offset, end_x=1, end_y=1, position=0, keepRatio=False):
+    center = center_point(ctx, x_offset, y_offset, end_x, end_y, position)
+    draw_logo(ctx, logo, center, (logo_w, logo_h), FIT_CONTAIN if keepRatio else FIT_STRETCH)
 
-    # Convert cv2 image to PIL image for "paste()"
-    frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    frame_copy = frame_pil.copy()
+    return ctx.frame
 
-    frame_copy.paste(resized_image, (logo_origin[0], logo_origin[1]), resized_image)
+def generate_diamond(ctx, x_offset, y_offset, length_offset, rotation=45, color=(255, 255, 255)):
+    vertices, top_left, bottom_right = diamond_vertices(ctx, x_offset, y_offset, length_offset)
+    draw_polygon(ctx, vertices, color)
 
-    # Convert PIL image back to cv2 image
-    frame = cv2.cvtColor(np.array(frame_copy), cv2.COLOR_RGB2BGR)
+    # Return frame with polygon and corner positions og element, for further use when placing logo/icons
+    return ctx.frame, top_left, bottom_right
+
+# Draw primitives onto ctx.frame, positions are already resolved to pixels (see layout.py)
+def draw_rect(ctx, top_left, bottom_right, color, opacity=1):
+    frame = ctx.frame
+    if opacity == 1:
+        cv2.rectangle(frame, top_left, bottom_right, color, -1)
+        return frame
+
+    # Translucent rectangle, only the covered region is blended instead of the whole frame
+    x0, x1 = sorted((top_left[0], bottom_right[0]))
+    y0, y1 = sorted((top_left[1], bottom_right[1]))
+    roi = frame[max(y0, 0):max(y1 + 1, 0), max(x0, 0):max(x1 + 1, 0)]
+    if roi.size:
+        filled = np.empty_like(roi)
+        filled[:] = color
+        roi[:] = cv2.addWeighted(roi, opacity, filled, 1 - opacity, 0)
 
     return frame
 
-def generate_diamond(x_offset, y_offset, length_offset, rotation=45, color=(255, 255, 255)):
-    global width, height, frame
-    # Calculate position for polygon-center with video's widtg and height
-    center_x = x_offset * width
-    center_y = y_offset * height
-    length = length_offset * height
-    
-    top_left = (center_x - length, center_y - length)
-    bottom_right = (center_x + length, center_y + length)
-
-    # Calculate vertices for polygon
-    vertices = [(center_x + length, center_y), (center_x, center_y + length), (center_x - length, center_y), (center_x, center_y - length)]
-
-    # Convert frame for PIL-draw usage
-    frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    frame_copy = frame_pil.copy()
-    draw = ImageDraw.Draw(frame_copy)
-
-    draw.polygon(vertices, fill=color)
-
-    # Convert frame for OpenCV usage
-    frame = cv2.cvtColor(np.array(frame_copy), cv2.COLOR_RGB2BGR)
-
-    # Return frame with polygon and corner positions og element, for further use when placing logo/icons
-    return frame, top_left, bottom_right
-
+def draw_text(ctx, text, origin, font_scale, color, thickness):
+    cv2.putText(ctx.frame, text, origin, ctx.font_style, font_scale, color, thickness, cv2.LINE_AA)
+    return ctx.frame
+
+def draw_logo(ctx, logo, center, size, fit=FIT_STRETCH):
+    if is_image(logo):
+        sprite = to_premultiplied_bgra(resize_image(logo, size, fit))
+    elif is_remote(logo):
+        # Downloaded once into the remote asset cache, then decoded from memory like a local file
+        digest = remote_assets.digest(logo)
+        sprite = asset_cache.sprite_from_bytes(digest, remote_assets.reader(digest), size, fit)
+    else:
+        # Decoded and resized once per process, every later call is a cache hit
+        sprite = asset_cache.sprite(asset_path(logo), size, fit)
+
+    logo_origin = (int(center[0] - sprite.shape[1] / 2), int(center[1] - sprite.shape[0] / 2))
+
+    # Blend the logo straight into the frame, only the pixels under the logo are touched
+    return paste_bgra(ctx.frame, sprite, logo_origin[0], logo_origin[1])
+
+def draw_polygon(ctx, vertices, color):
+    # Fill the polygon in place, color is BGR like the frame
+    return fill_polygon(ctx.frame, vertices, color)
+
+# Execute the draw ops of a compiled layout block onto ctx.frame
+def render_ops(ctx, ops):
+    for op in ops:
+        if isinstance(op, RectOp):
+            draw_rect(ctx, op.top_left, op.bottom_right, op.color, op.opacity)
+        elif isinstance(op, TextOp):
+            draw_text(ctx, op.text, op.origin, op.font_scale, op.color, op.thickness)
+        elif isinstance(op, LogoOp):
+            draw_logo(ctx, op.logo, op.center, op.size, op.fit)
+        elif isinstance(op, PolygonOp):
+            draw_polygon(ctx, op.points, op.color)
+        else:
+            raise ValueError(f'Unknown draw op: {op}')
+    return ctx.frame
+
+# Version of every logo a block draws: mtime and size of a local file, the content digest of a
+# remote one. Part of the layer cache key, so replacing a logo file under the same name is picked up
+# the way AssetCache picks it up.
+def asset_versions(ops):
+    versions = []
+    for op in ops:
+        if not isinstance(op, LogoOp) or is_image(op.logo):
+            continue
+        if is_remote(op.logo):
+            versions.append(remote_assets.digest(op.logo))
+        else:
+            try:
+                stat = os.stat(asset_path(op.logo))
+                versions.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                versions.append(None) # Reported by draw_logo
+    return tuple(versions)
+
+# Rasterize a block into a premultiplied layer. Cached on the ops themselves and the versions of
+# their logos, so clips whose block looks the same (e.g. the scoreboard of one match) share the layer.
+def rasterize_block(ops, width, height):
+    return _rasterize_block(ops, width, height, asset_versions(ops))
+
+@functools.lru_cache(maxsize=LAYER_CACHE_SIZE)
+def _rasterize_block(ops, width, height, versions):
+    ctx = RenderContext(width, height)
+    return render_layer(lambda canvas: render_ops(ctx.with_frame(canvas), ops), width, height)
 
 def is_image(var):
     return isinstance(var, Image.Image)
 
+# Decoded image at url, through the remote asset cache. Shared like get_img_local, so it must not be modified.
 def get_img(url: str) -> Image or None:
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        parsed_url = urlparse(url)
-        
-        filename = os.path.basename(parsed_url.path)
-        folder_path = 'images'
-        save_path = os.path.join(folder_path, filename)
-        
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        with Image.open(save_path) as img:
-            out = img.copy()
-        
-        os.remove(save_path)
-        return out
-
+    try:
+        digest = remote_assets.digest(url)
+    except requests.RequestException as e:
+        print(f'Could not fetch {url}: {e}')
+        return None
+    return asset_cache.image_from_bytes(digest, remote_assets.reader(digest))
+
+# Decoded image from resources/img, shared through the asset cache so it must not be modified
 def get_img_local(image_name):
-    folder_path = 'resources/img'
-    image_path = os.path.join(folder_path, image_name)
-
-    with Image.open(image_path) as img:
-        out = img.copy()
-    
-    return out
+    return asset_cache.image(asset_path(image_name))
 
 def hex_to_bgr(hex):
     rgb = list(ImageColor.getcolor(hex, "RGB"))
@@ -254,6 +207,7 @@ def hex_to_bgr(hex):
     bgr = tuple(rgb)
     return bgr
 
+# Returns the action's icon (path relative to resources/img) and the message shown with it
 def get_action_message_and_icon(meta, language='EN'): 
     team_logo_url = meta['home_logo_url']
     score = meta['score']
@@ -261,620 +215,749 @@ def get_action_message_and_icon(meta, language='EN'):
 
     if language == 'EN':
         if meta['action'] == 'shot':
-            icon = get_img_local('icons/shot_icon.png')
+            icon = 'icons/shot_icon.png'
             msg = 'Shot at goal'
         elif meta['action'] == 'goal':
-            icon = get_img_local('icons/goal_icon.png')
+            icon = 'icons/goal_icon.png'
             msg = 'Goal'
         elif meta['action'] == 'yellow card':
-            icon = get_img_local('icons/yellow_icon.png')
+            icon = 'icons/yellow_icon.png'
             msg = 'Yellow card'
         elif meta['action'] == 'red card':
-            icon = get_img_local('icons/red_icon.png')
+            icon = 'icons/red_icon.png'
             msg = 'Red card'
         elif meta['action'] == 'penalty':
-            icon = get_img_local('icons/penalty_icon.png')
+            icon = 'icons/penalty_icon.png'
         else:
-            icon = get_img_local('ball_icon.png')
+            icon = 'ball_icon.png'
             msg = 'Missing action'
 
         return icon, msg
     
-width = 1920
-height = 1080
-frame = np.zeros((height, width, 3), dtype=np.uint8)
-font_style = cv2.FONT_HERSHEY_SIMPLEX
+# Resolve a template for one resolution and one clip_meta entry into a display list of draw ops.
+# Plans are cached, so clips of the same match with the same metadata skip the geometry entirely.
+def compile_layout(width, height, meta, bg_color, text_color, home_color, visiting_color, graphic_template, graphic_layout, aspect_ratio=[16, 9]):
+    key = (width, height, json.dumps(meta, sort_keys=True), bg_color, text_color, tuple(home_color), tuple(visiting_color),
+           graphic_template, graphic_layout, tuple(aspect_ratio) if aspect_ratio is not None else None)
+    return _compile_layout(*key)
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _compile_layout(width, height, meta, bg_color, text_color, home_color, visiting_color, graphic_template, graphic_layout, aspect_ratio):
+    meta = json.loads(meta)
+    aspect_ratio = list(aspect_ratio) if aspect_ratio is not None else None
+
+    home_logo_url = meta['home_logo_url']
+    home_name = meta['home_name']
+    home_ini = meta['home_initials']
+    home_color1 = hex_to_bgr(home_color[0])
+    home_color2 = hex_to_bgr(home_color[1])
+
+    visiting_logo_url = meta['visiting_logo_url']
+    visiting_name = meta['visiting_name']
+    visiting_ini = meta['visiting_initials']
+    visiting_color1 = hex_to_bgr(visiting_color[0])
+    visiting_color2 = hex_to_bgr(visiting_color[1])
+
+    league_logo_url = meta['league_logo_url']
+    league_name = meta['league_name']
+    icon, msg = get_action_message_and_icon(meta)
+    player_logo_url = PLAYER_ICON
+    player_name = meta['player_name']
+    score = meta['score']
+    game_time = meta['time']
 
-def create_animated_meta(video_h, video_w, clip_meta, bg_color, text_color, home_color, visiting_color, local_file_name, clip_num, graphic_template, graphic_layout, aspect_ratio=[16, 9], fps=25.0):
-    global frame, width, height, font_style
-    for i, meta in enumerate(clip_meta):
-        # Initialize video capture 
-        cap = cv2.VideoCapture(local_file_name)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        duration = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        # Initialize video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        output_filename = f'video/{clip_num}_meta.mp4'
-        
-        if os.path.exists(output_filename):
-            os.remove(output_filename)
-            print(f"Existing {output_filename} deleted successfully.")
+    # Dynamic sizes
+    if aspect_ratio == [16, 9] or aspect_ratio is None:
+        if graphic_template == 'rectangle':
+            aspect_ratio = [16, 9]
 
-        out = cv2.VideoWriter(output_filename, fourcc, fps, (width, height))
-        
-        home_logo_url = meta['home_logo_url']
-        home_name = meta['home_name']
-        home_ini = meta['home_initials']
-        home_color1 = hex_to_bgr(home_color[0])
-        home_color2 = hex_to_bgr(home_color[1])
-
-        visiting_logo_url = meta['visiting_logo_url']
-        visiting_name = meta['visiting_name']
-        visiting_ini = meta['visiting_initials']
-        visiting_color1 = hex_to_bgr(visiting_color[0])
-        visiting_color2 = hex_to_bgr(visiting_color[1])
-        
-        league_logo_url = meta['league_logo_url']
-        league_name = meta['league_name']
-        icon, msg = get_action_message_and_icon(meta)
-        player_logo_url = "icons/player_icon.png"
-        player_name = meta['player_name']
-        score = meta['score']
-        game_time = meta['time']
-
-        # Dynamic sizes
-        if aspect_ratio == [16, 9] or aspect_ratio is None:
-            if graphic_template == 'rectangle':
-                aspect_ratio = [16, 9]
-                
-                bg_color_graphic = hex_to_bgr(bg_color) 
-                bg_color_white = hex_to_bgr("#FFFFFF")
-                bg_color_black = hex_to_bgr("#343434")
-                text_color = hex_to_bgr(text_color)
-                text_color_black = hex_to_bgr("#343434")
-
-                # Introduction
-                # y-offset
-                in_y_start = 0.78
-                in_y_end = 0.85
-
-                # x-offset
-                in_team1_logo_offset  = -0.04
-                in_team1_name_start = 0.45
-                in_team1_name_end = 0.46
-                in_team1_color_end = 0.47
-                
-                in_score_end = 0.53
-
-                in_team2_color_end = 0.54
-                in_team2_name_end = 0.55
-                in_team2_logo_offset = 0.04
-
-                in_league_start = 0.49
-                in_league_end = 0.51
-
-                # Scoreboard
-                # y-offset
-                sc_y_start = 0.055
-                sc_y_end = 0.1
-                sc_y_league_end = 0.9
-                sc_y_time_end = 0.145
-
-                # x-offset
-                sc_team1_logo_start = 0.04
-                sc_team1_logo_end = 0.065 #0.025
-                sc_team1_color_end = 0.068
-                sc_team1_name_end = 0.113
-                sc_team1_score_end = 0.137
-
-                sc_team2_score_start = 0.198
-                sc_team2_score_end = 0.223
-                sc_team2_name_end = 0.271
-                sc_team2_color_start = 0.268
-                sc_team2_logo_end = 0.295
+            bg_color_graphic = hex_to_bgr(bg_color) 
+            bg_color_white = hex_to_bgr("#FFFFFF")
+            bg_color_black = hex_to_bgr("#343434")
+            text_color = hex_to_bgr(text_color)
+            text_color_black = hex_to_bgr("#343434")
 
-                # Action
-                # y-offset
-                ac_y_start = 0.85
-                ac_y_end = 0.9
-                ac_msg_y_end = 0.93
-                # x-offset
-                ac_team_color_start = 0.04
-                ac_team_color_end = 0.043
-                ac_player_end = 0.068
-                ac_name_end = 0.072
-                ac_action_offset = 0.025 
-
-                ac_icon_height = int(0.048*height*0.9)
-                ac_icon_width = int(0.027*width*0.9)
-
-                # Icons !! Aspect ratio is not kept !!
-                if "j1" in league_logo_url or "allsvenskan" in league_logo_url:
-                    league_height = int(0.2*height - 0.125*height)
-                    league_width = int(0.2*width - 0.16*width)
-                else:
-                    league_height = int(0.2*width - 0.16*width)
-                    league_width = int(0.2*width - 0.16*width)
-                
-                sc_team1_logo_dim = int((sc_team1_logo_end*width - sc_team1_logo_start*width)*0.8)
-                sc_team2_logo_dim = int((sc_team1_logo_end*width - sc_team1_logo_start*width)*0.8)
-
-                if graphic_layout == "center":
-                    sc_middle_offset = 0.332
-                    sc_team1_logo_start += sc_middle_offset
-                    sc_team1_logo_end += sc_middle_offset
-                    sc_team1_color_end += sc_middle_offset
-                    sc_team1_name_end += sc_middle_offset
-                    sc_team1_score_end +=sc_middle_offset
-
-                    sc_team2_score_start += sc_middle_offset
-                    sc_team2_score_end += sc_middle_offset
-                    sc_team2_name_end += sc_middle_offset
-                    sc_team2_color_start += sc_middle_offset
-                    sc_team2_logo_end +=  sc_middle_offset
-
-                    ac_team_color_start += sc_middle_offset
-                    ac_team_color_end += sc_middle_offset
-                    ac_player_end += sc_middle_offset
-                    ac_name_end += sc_middle_offset
-
-            elif graphic_template == 'diamond':
-                aspect_ratio = [16, 9]
-                # Color-template
-                bg_color_graphic = hex_to_bgr(bg_color)
-                bg_color_black = hex_to_bgr("#343434")
-                bg_color_white = hex_to_bgr("#FFFFFF")
-                text_color_graphic = hex_to_bgr(text_color)
-                text_color_white = hex_to_bgr("#FFFFFF")
-
-                # Scoreboard
-                sc_league_center_x = 0.045
-                sc_league_center_y = 0.1
-                sc_league_length = 0.055
-
-                if "allsvenskan" in league_logo_url:
-                    sc_league_height = int(0.07*height)
-                    sc_league_width = int(0.03*width)
-                elif "j1" in league_logo_url:
-                    sc_league_height = int(0.06*height)
-                    sc_league_width = int(0.03*width)
-                else:
-                    sc_league_height = int(0.063*height)
-                    sc_league_width = int(0.035*width)
+            # Introduction
+            # y-offset
+            in_y_start = 0.78
+            in_y_end = 0.85
 
-                sc_team1_name_start = sc_league_center_x
-                sc_team1_name_end = 0.13
-                sc_team1_color_end = 0.135
-                sc_score_end = 0.205
-                sc_team2_color_end = 0.21
-                sc_team2_name_end = 0.285
-
-                # Introduction
-                in_league_center_x = 0.5
-                in_league_center_y = 0.83
-                in_league_length = 0.07
-
-                if "allsvenskan" in league_logo_url:
-                    in_league_height = int(0.08*height)
-                    in_league_width = int(0.035*width)
-                elif "j1" in league_logo_url:
-                    in_league_height = int(0.072*height)
-                    in_league_width = int(0.035*width)
-                else:
-                    in_league_height = int(0.082*height)
-                    in_league_width = int(0.046*width)
-
-                in_team1_name_start = in_league_center_x - 0.04
-                in_team1_name_end = in_league_center_x
-                in_team1_color_offset = -0.005
-                in_team1_score_offset = -0.04
-                in_team1_logo_offset = -0.04
-
-                in_team2_name_start = in_league_center_x 
-                in_team2_name_end = in_team2_name_start + 0.04
-                in_team2_color_offset = 0.005
-                in_team2_score_offset = 0.04
-                in_team2_logo_offset = 0.04
-
-                in_league_name_offset = 0.04
-
-                # Very simple and inefficient way to maintain aspect ratio of logos when resizing
-                potrait_logo = ["tokyo", "urawa", "volen", "fortuna"] 
-                if any(x in home_logo_url for x in potrait_logo):
-                    in_team1_height = int(0.055*height)
-                    in_team1_width = int(0.026*width)
-                else:
-                    in_team1_height = int(0.054*height)
-                    in_team1_width = int(0.03*width)
-
-                if any(x in visiting_logo_url for x in potrait_logo):
-                    in_team2_height = int(0.055*height)
-                    in_team2_width = int(0.026*width)
-                else:
-                    in_team2_height = int(0.054*height)
-                    in_team2_width = int(0.03*width)
+            # x-offset
+            in_team1_logo_offset  = -0.04
+            in_team1_name_start = 0.45
+            in_team1_name_end = 0.46
+            in_team1_color_end = 0.47
 
-                # Action
-                ac_team_center_x = 0.045
-                ac_team_center_y = 0.9
-                ac_team_length = 0.055
+            in_score_end = 0.53
 
-                ac_name_y_start = ac_team_center_y
-                ac_name_y_end = ac_team_center_y + ac_team_length
-                ac_name_start = ac_team_center_x
-                ac_name_end = ac_name_start + 0.02
+            in_team2_color_end = 0.54
+            in_team2_name_end = 0.55
+            in_team2_logo_offset = 0.04
 
-                ac_action_y_start = ac_team_center_y - ac_team_length/2
-                ac_action_y_end = ac_team_center_y
-                ac_action_start = ac_team_center_x
-                ac_action_end = ac_action_start + 0.08
-
-                if graphic_layout == "center":
-                    sc_middle_offset = 0.3203125
-                    sc_league_center_x += sc_middle_offset
-                    sc_team1_name_start = sc_league_center_x
-                    sc_team1_name_end +=  sc_middle_offset
-                    sc_team1_color_end += sc_middle_offset
-                    sc_score_end +=       sc_middle_offset
-                    sc_team2_color_end += sc_middle_offset
-                    sc_team2_name_end +=  sc_middle_offset
-                    
-                    ac_middle_offset = sc_middle_offset
-                    ac_team_center_x += ac_middle_offset
-                    ac_name_start = ac_team_center_x
-                    ac_name_end = ac_name_start + 0.06
-                    ac_action_start = ac_team_center_x
-                    ac_action_end = ac_action_start + 0.06
-
-        elif aspect_ratio == [9, 16]:
-            if graphic_template == 'diamond':
-                bg_color_graphic = hex_to_bgr(bg_color)
-                bg_color_black = hex_to_bgr("#343434")
-                bg_color_white = hex_to_bgr("#FFFFFF")
-                text_color_graphic = hex_to_bgr(text_color)
-                text_color_white = hex_to_bgr("#FFFFFF")
-
-                # Scoreboard
-                sc_league_center_x = 0.172
-                sc_league_center_y = 0.095
-                sc_league_length = 0.04
-
-                if "allsvenskan" in league_logo_url:
-                    sc_league_height = int(0.048*height)
-                    sc_league_width = int(0.08*width)
-                elif "j1" in league_logo_url:
-                    sc_league_height = int(0.042*height)
-                    sc_league_width = int(0.067*width)
-                else:
-                    sc_league_height = int(0.044*height)
-                    sc_league_width = int(0.08*width)
-         
+            in_league_start = 0.49
+            in_league_end = 0.51
+
+            # Scoreboard
+            # y-offset
+            sc_y_start = 0.055
+            sc_y_end = 0.1
+            sc_y_league_end = 0.9
+            sc_y_time_end = 0.145
+
+            # x-offset
+            sc_team1_logo_start = 0.04
+            sc_team1_logo_end = 0.065 #0.025
+            sc_team1_color_end = 0.068
+            sc_team1_name_end = 0.113
+            sc_team1_score_end = 0.137
+
+            sc_team2_score_start = 0.198
+            sc_team2_score_end = 0.223
+            sc_team2_name_end = 0.271
+            sc_team2_color_start = 0.268
+            sc_team2_logo_end = 0.295
+
+            # Action
+            # y-offset
+            ac_y_start = 0.85
+            ac_y_end = 0.9
+            ac_msg_y_end = 0.93
+            # x-offset
+            ac_team_color_start = 0.04
+            ac_team_color_end = 0.043
+            ac_player_end = 0.068
+            ac_name_end = 0.072
+            ac_action_offset = 0.025 
+
+            ac_icon_height = int(0.048*height*0.9)
+            ac_icon_width = int(0.027*width*0.9)
+
+            # Icons !! Aspect ratio is not kept !!
+            if "j1" in league_logo_url or "allsvenskan" in league_logo_url:
+                league_height = int(0.2*height - 0.125*height)
+                league_width = int(0.2*width - 0.16*width)
+            else:
+                league_height = int(0.2*width - 0.16*width)
+                league_width = int(0.2*width - 0.16*width)
+
+            sc_team1_logo_dim = int((sc_team1_logo_end*width - sc_team1_logo_start*width)*0.8)
+            sc_team2_logo_dim = int((sc_team1_logo_end*width - sc_team1_logo_start*width)*0.8)
+
+            if graphic_layout == "center":
+                sc_middle_offset = 0.332
+                sc_team1_logo_start += sc_middle_offset
+                sc_team1_logo_end += sc_middle_offset
+                sc_team1_color_end += sc_middle_offset
+                sc_team1_name_end += sc_middle_offset
+                sc_team1_score_end +=sc_middle_offset
+
+                sc_team2_score_start += sc_middle_offset
+                sc_team2_score_end += sc_middle_offset
+                sc_team2_name_end += sc_middle_offset
+                sc_team2_color_start += sc_middle_offset
+                sc_team2_logo_end +=  sc_middle_offset
+
+                ac_team_color_start += sc_middle_offset
+                ac_team_color_end += sc_middle_offset
+                ac_player_end += sc_middle_offset
+                ac_name_end += sc_middle_offset
+
+        elif graphic_template == 'diamond':
+            aspect_ratio = [16, 9]
+            # Color-template
+            bg_color_graphic = hex_to_bgr(bg_color)
+            bg_color_black = hex_to_bgr("#343434")
+            bg_color_white = hex_to_bgr("#FFFFFF")
+            text_color_graphic = hex_to_bgr(text_color)
+            text_color_white = hex_to_bgr("#FFFFFF")
+
+            # Scoreboard
+            sc_league_center_x = 0.045
+            sc_league_center_y = 0.1
+            sc_league_length = 0.055
+
+            if "allsvenskan" in league_logo_url:
+                sc_league_height = int(0.07*height)
+                sc_league_width = int(0.03*width)
+            elif "j1" in league_logo_url:
+                sc_league_height = int(0.06*height)
+                sc_league_width = int(0.03*width)
+            else:
+                sc_league_height = int(0.063*height)
+                sc_league_width = int(0.035*width)
+
+            sc_team1_name_start = sc_league_center_x
+            sc_team1_name_end = 0.13
+            sc_team1_color_end = 0.135
+            sc_score_end = 0.205
+            sc_team2_color_end = 0.21
+            sc_team2_name_end = 0.285
+
+            # Introduction
+            in_league_center_x = 0.5
+            in_league_center_y = 0.83
+            in_league_length = 0.07
+
+            if "allsvenskan" in league_logo_url:
+                in_league_height = int(0.08*height)
+                in_league_width = int(0.035*width)
+            elif "j1" in league_logo_url:
+                in_league_height = int(0.072*height)
+                in_league_width = int(0.035*width)
+            else:
+                in_league_height = int(0.082*height)
+                in_league_width = int(0.046*width)
+
+            in_team1_name_start = in_league_center_x - 0.04
+            in_team1_name_end = in_league_center_x
+            in_team1_color_offset = -0.005
+            in_team1_score_offset = -0.04
+            in_team1_logo_offset = -0.04
+
+            in_team2_name_start = in_league_center_x 
+            in_team2_name_end = in_team2_name_start + 0.04
+            in_team2_color_offset = 0.005
+            in_team2_score_offset = 0.04
+            in_team2_logo_offset = 0.04
+
+            in_league_name_offset = 0.04
+
+            # Very simple and inefficient way to maintain aspect ratio of logos when resizing
+            potrait_logo = ["tokyo", "urawa", "volen", "fortuna"] 
+            if any(x in home_logo_url for x in potrait_logo):
+                in_team1_height = int(0.055*height)
+                in_team1_width = int(0.026*width)
+            else:
+                in_team1_height = int(0.054*height)
+                in_team1_width = int(0.03*width)
+
+            if any(x in visiting_logo_url for x in potrait_logo):
+                in_team2_height = int(0.055*height)
+                in_team2_width = int(0.026*width)
+            else:
+                in_team2_height = int(0.054*height)
+                in_team2_width = int(0.03*width)
+
+            # Action
+            ac_team_center_x = 0.045
+            ac_team_center_y = 0.9
+            ac_team_length = 0.055
+
+            ac_name_y_start = ac_team_center_y
+            ac_name_y_end = ac_team_center_y + ac_team_length
+            ac_name_start = ac_team_center_x
+            ac_name_end = ac_name_start + 0.02
+
+            ac_action_y_start = ac_team_center_y - ac_team_length/2
+            ac_action_y_end = ac_team_center_y
+            ac_action_start = ac_team_center_x
+            ac_action_end = ac_action_start + 0.08
+
+            if graphic_layout == "center":
+                sc_middle_offset = 0.3203125
+                sc_league_center_x += sc_middle_offset
                 sc_team1_name_start = sc_league_center_x
-                sc_team1_name_end = 0.355
-                sc_team1_color_end = 0.366
-                sc_score_end = 0.518
-                sc_team2_color_end = 0.529
-                sc_team2_name_end = 0.712
-
-                # Introduction
-                if "allsvenskan" in league_logo_url:
-                    in_league_height = int(0.08*height)
-                    in_league_width = int(0.035*width)
-                elif "j1" in league_logo_url:
-                    in_league_height = int(0.072*height)
-                    in_league_width = int(0.035*width)
-                else:
-                    in_league_height = int(0.082*height)
-                    in_league_width = int(0.046*width)
-
-
-                in_team1_center_x = sc_league_center_x
-                in_team1_center_y = 0.788
-                in_team1_length = sc_league_length
-
-                in_team1_y_start = in_team1_center_y - in_team1_length
-                in_team1_y_end = in_team1_center_y
-                in_team1_name_start = in_team1_center_x
-                in_team1_name_end = in_team1_center_x + 0.04
-                in_team1_color_offset = 0.01
-                in_team1_score_offset = 0.07
-                
-                in_team2_center_x = 0.827
-                in_team2_center_y = 0.869
-                in_team2_length = sc_league_length
-
-                in_team2_y_start = in_team2_center_y
-                in_team2_y_end = in_team2_center_y + sc_league_length
-                in_team2_name_end = in_team2_center_x 
-                in_team2_name_start = in_team2_name_end - 0.04
-                in_team2_color_offset = -0.01
-                in_team2_score_offset = -0.07
-
-                in_league_y_start = 0.808
-                in_league_y_end = in_league_y_start + sc_league_length
-                in_league_name_start = 0.474
-                in_league_name_end = 0.509
-                
-                # Very simple and inefficient way to maintain aspect ratio of logos when resizing
-                if "volen" in home_logo_url:
-                    in_team1_width = int(0.07*width)
-                    in_team1_height = int(0.044*height)
-                elif "psv" in home_logo_url:
-                    in_team1_width = int(0.101*width)
-                    in_team1_height = int(0.047*height)
-                elif "rot" in home_logo_url and "kashima" in home_logo_url:
-                    in_team1_width = int(0.088*width)
-                    in_team1_height = int(0.05*height)
-                else:
-                    in_team1_width = int(0.066*width)
-                    in_team1_height = int(0.0463*height)
-
-                if "volen" in visiting_logo_url:
-                    in_team2_width = int(0.07*width)
-                    in_team2_height = int(0.044*height)
-                elif "psv" in visiting_logo_url:
-                    in_team2_width = int(0.101*width)
-                    in_team2_height = int(0.047*height)
-                elif "rot" in visiting_logo_url or "kashima" in visiting_logo_url:
-                    in_team2_width = int(0.088*width)
-                    in_team2_height = int(0.05*height)
-                else:
-                    in_team2_width = int(0.066*width)
-                    in_team2_height = int(0.0463*height)
+                sc_team1_name_end +=  sc_middle_offset
+                sc_team1_color_end += sc_middle_offset
+                sc_score_end +=       sc_middle_offset
+                sc_team2_color_end += sc_middle_offset
+                sc_team2_name_end +=  sc_middle_offset
+
+                ac_middle_offset = sc_middle_offset
+                ac_team_center_x += ac_middle_offset
+                ac_name_start = ac_team_center_x
+                ac_name_end = ac_name_start + 0.06
+                ac_action_start = ac_team_center_x
+                ac_action_end = ac_action_start + 0.06
 
-                # Action
-                ac_team_center_x = 0.827
-                ac_team_center_y = 0.869
-                ac_team_length = sc_league_length
+    elif aspect_ratio == [9, 16]:
+        if graphic_template == 'diamond':
+            bg_color_graphic = hex_to_bgr(bg_color)
+            bg_color_black = hex_to_bgr("#343434")
+            bg_color_white = hex_to_bgr("#FFFFFF")
+            text_color_graphic = hex_to_bgr(text_color)
+            text_color_white = hex_to_bgr("#FFFFFF")
 
-                ac_name_y_start = ac_team_center_y
-                ac_name_y_end = ac_team_center_y + ac_team_length
+            # Scoreboard
+            sc_league_center_x = 0.172
+            sc_league_center_y = 0.095
+            sc_league_length = 0.04
+
+            if "allsvenskan" in league_logo_url:
+                sc_league_height = int(0.048*height)
+                sc_league_width = int(0.08*width)
+            elif "j1" in league_logo_url:
+                sc_league_height = int(0.042*height)
+                sc_league_width = int(0.067*width)
+            else:
+                sc_league_height = int(0.044*height)
+                sc_league_width = int(0.08*width)
+
+            sc_team1_name_start = sc_league_center_x
+            sc_team1_name_end = 0.355
+            sc_team1_color_end = 0.366
+            sc_score_end = 0.518
+            sc_team2_color_end = 0.529
+            sc_team2_name_end = 0.712
+
+            # Introduction
+            if "allsvenskan" in league_logo_url:
+                in_league_height = int(0.08*height)
+                in_league_width = int(0.035*width)
+            elif "j1" in league_logo_url:
+                in_league_height = int(0.072*height)
+                in_league_width = int(0.035*width)
+            else:
+                in_league_height = int(0.082*height)
+                in_league_width = int(0.046*width)
+
+
+            in_team1_center_x = sc_league_center_x
+            in_team1_center_y = 0.788
+            in_team1_length = sc_league_length
+
+            in_team1_y_start = in_team1_center_y - in_team1_length
+            in_team1_y_end = in_team1_center_y
+            in_team1_name_start = in_team1_center_x
+            in_team1_name_end = in_team1_center_x + 0.04
+            in_team1_color_offset = 0.01
+            in_team1_score_offset = 0.07
+
+            in_team2_center_x = 0.827
+            in_team2_center_y = 0.869
+            in_team2_length = sc_league_length
+
+            in_team2_y_start = in_team2_center_y
+            in_team2_y_end = in_team2_center_y + sc_league_length
+            in_team2_name_end = in_team2_center_x 
+            in_team2_name_start = in_team2_name_end - 0.04
+            in_team2_color_offset = -0.01
+            in_team2_score_offset = -0.07
+
+            in_league_y_start = 0.808
+            in_league_y_end = in_league_y_start + sc_league_length
+            in_league_name_start = 0.474
+            in_league_name_end = 0.509
+
+            # Very simple and inefficient way to maintain aspect ratio of logos when resizing
+            if "volen" in home_logo_url:
+                in_team1_width = int(0.07*width)
+                in_team1_height = int(0.044*height)
+            elif "psv" in home_logo_url:
+                in_team1_width = int(0.101*width)
+                in_team1_height = int(0.047*height)
+            elif "rot" in home_logo_url and "kashima" in home_logo_url:
+                in_team1_width = int(0.088*width)
+                in_team1_height = int(0.05*height)
+            else:
+                in_team1_width = int(0.066*width)
+                in_team1_height = int(0.0463*height)
+
+            if "volen" in visiting_logo_url:
+                in_team2_width = int(0.07*width)
+                in_team2_height = int(0.044*height)
+            elif "psv" in visiting_logo_url:
+                in_team2_width = int(0.101*width)
+                in_team2_height = int(0.047*height)
+            elif "rot" in visiting_logo_url or "kashima" in visiting_logo_url:
+                in_team2_width = int(0.088*width)
+                in_team2_height = int(0.05*height)
+            else:
+                in_team2_width = int(0.066*width)
+                in_team2_height = int(0.0463*height)
+
+            # Action
+            ac_team_center_x = 0.827
+            ac_team_center_y = 0.869
+            ac_team_length = sc_league_length
+
+            ac_name_y_start = ac_team_center_y
+            ac_name_y_end = ac_team_center_y + ac_team_length
+            ac_name_end = ac_team_center_x
+            ac_name_start = ac_name_end - 0.02
+
+            ac_action_y_start = ac_team_center_y - ac_team_length/2
+            ac_action_y_end = ac_team_center_y
+            ac_action_end = ac_team_center_x
+            ac_action_start = ac_action_end + 0.04
+
+            if graphic_layout == "center":
+                sc_middle_offset = 0.07685185185
+                sc_league_center_x += sc_middle_offset
+                sc_team1_name_start = sc_league_center_x
+                sc_team1_name_end +=  sc_middle_offset
+                sc_team1_color_end += sc_middle_offset
+                sc_score_end +=       sc_middle_offset
+                sc_team2_color_end += sc_middle_offset
+                sc_team2_name_end +=  sc_middle_offset
+
+                ac_middle_offset = -sc_middle_offset
+                ac_team_center_x += ac_middle_offset
                 ac_name_end = ac_team_center_x
                 ac_name_start = ac_name_end - 0.02
-
-                ac_action_y_start = ac_team_center_y - ac_team_length/2
-                ac_action_y_end = ac_team_center_y
                 ac_action_end = ac_team_center_x
-                ac_action_start = ac_action_end + 0.04
-
-                if graphic_layout == "center":
-                    sc_middle_offset = 0.07685185185
-                    sc_league_center_x += sc_middle_offset
-                    sc_team1_name_start = sc_league_center_x
-                    sc_team1_name_end +=  sc_middle_offset
-                    sc_team1_color_end += sc_middle_offset
-                    sc_score_end +=       sc_middle_offset
-                    sc_team2_color_end += sc_middle_offset
-                    sc_team2_name_end +=  sc_middle_offset
-                    
-                    ac_middle_offset = -sc_middle_offset
-                    ac_team_center_x += ac_middle_offset
-                    ac_name_end = ac_team_center_x
-                    ac_name_start = ac_name_end - 0.02
-                    ac_action_end = ac_team_center_x
-                    ac_action_start = ac_action_end - 0.04
-        else:
-            raise ValueError(f'Invalid aspect ratio entered: {aspect_ratio}.')
-        
-        i = 1
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            i += 1
-            if graphic_template == 'rectangle':
-            # Scoreboard
-                if i <= int(duration):
-                    # Home team
-                    generate_rect(sc_team1_logo_start, sc_y_start, sc_team1_logo_end, sc_y_end, bg_color_graphic) # Logo container
-                    generate_rect(sc_team1_color_end, sc_y_start, sc_team1_name_end, sc_y_end, bg_color_graphic) # Name container
-                    generate_rect(sc_team1_logo_end, sc_y_start, sc_team1_color_end, sc_y_end - (sc_y_end - sc_y_start)/2, home_color1) # Color1 rect
-                    generate_rect(sc_team1_logo_end, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team1_color_end, sc_y_end, home_color2) # Color2 rect
-                    generate_rect(sc_team1_name_end, sc_y_start, sc_team1_score_end, sc_y_end, bg_color_white) # Score container
-
-                    generate_rect(sc_team1_score_end, sc_y_start, sc_team2_score_start, sc_y_end, bg_color_white) # League container
-                    generate_rect(sc_team2_score_end, sc_y_end, sc_team2_logo_end, sc_y_time_end, bg_color_black, opacity=0.11) # Time container
-
-                    # Visiting team
-                    generate_rect(sc_team2_score_start, sc_y_start, sc_team2_score_end, sc_y_end, bg_color_white) # Score
-                    generate_rect(sc_team2_score_end, sc_y_start, sc_team2_color_start, sc_y_end, bg_color_graphic) # Name
-                    generate_rect(sc_team2_color_start, sc_y_start, sc_team2_name_end, sc_y_end - (sc_y_end - sc_y_start)/2, visiting_color1) # Color1
-                    generate_rect(sc_team2_color_start, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team2_name_end, sc_y_end, visiting_color2) # Color2
-                    generate_rect(sc_team2_name_end, sc_y_start, sc_team2_logo_end, sc_y_end, bg_color_graphic) # Logo
-                    
-                    # Logo
-                    frame = generate_center_logo(league_logo_url, league_width, league_height, sc_team1_score_end, sc_y_start, sc_team2_score_start, sc_y_end) # League
-                    frame = generate_center_logo(home_logo_url, sc_team1_logo_dim, sc_team1_logo_dim, sc_team1_logo_start, sc_y_start, sc_team1_logo_end, sc_y_end) # Home team
-                    frame = generate_center_logo(visiting_logo_url,sc_team2_logo_dim, sc_team2_logo_dim,sc_team2_name_end, sc_y_start,sc_team2_logo_end, sc_y_end) # Visiting team
-
-                    # Text
-                    generate_center_text(home_ini, sc_team1_color_end, sc_y_start, sc_team1_name_end, sc_y_end, color=text_color, font_scale=0.8) # Home initials
-                    generate_center_text(score[0], sc_team1_name_end, sc_y_start, sc_team1_score_end, sc_y_end, color=text_color_black) # Home score
-                    generate_center_text(visiting_ini, sc_team2_score_end, sc_y_start, sc_team2_color_start, sc_y_end, color=text_color, font_scale=0.8) # Visiting intials
-                    generate_center_text(score[2], sc_team2_score_start, sc_y_start, sc_team2_score_end, sc_y_end, color=text_color_black) # Visiting score
-                    generate_center_text(game_time, sc_team2_score_end, sc_y_end, sc_team2_logo_end, sc_y_time_end, color=bg_color_white) # Game time
-
-                if i > int(duration * 0.025) and i < int(duration * 0.125):
-                    # Intro
-                    name1_topleft, name1_bottomright, rect_height = generate_rect(in_team1_name_start, in_y_start, in_team1_name_end, in_y_end, bg_color_graphic, text=[home_name, visiting_name], grow="left", font_scale=0.5) # Name
-                    in_team1_logo_start = (name1_topleft[0]/width)+in_team1_logo_offset
-                    in_team1_logo_end = name1_topleft[0]/width
-                    generate_rect(in_team1_logo_start, in_y_start, in_team1_logo_end, in_y_end, bg_color_graphic) # Logo
-                    generate_rect(in_team1_name_end, in_y_start, in_team1_color_end, in_y_end - (in_y_end - in_y_start)/2, home_color1) # Color1
-                    generate_rect(in_team1_name_end, in_y_end - (in_y_end - in_y_start)/2, in_team1_color_end, in_y_end, home_color2) # Color2
-                    
-                    generate_rect(in_team1_color_end, in_y_start, in_score_end, in_y_end, bg_color_white) # Score
-                    
-                    generate_rect(in_score_end, in_y_start, in_team2_color_end, in_y_end - (in_y_end - in_y_start)/2, visiting_color1) # Color1
-                    generate_rect(in_score_end, in_y_end - (in_y_end - in_y_start)/2, in_team2_color_end, in_y_end, visiting_color2) # Color2
-                    name2_topleft, name2_bottomright, rect_height = generate_rect(in_team2_color_end, in_y_start, in_team2_name_end, in_y_end, bg_color_graphic, text=[home_name, visiting_name], grow="right", font_scale=0.5) # Name
-                    in_team2_logo_start = name2_bottomright[0]/width
-                    in_team2_logo_end = (name2_bottomright[0]/width)+in_team2_logo_offset
-                    generate_rect(in_team2_logo_start, in_y_start, in_team2_logo_end, in_y_end, bg_color_graphic) # Logo
-
-                    league_topleft, league_bottomright, rect2_height = generate_rect(in_league_start, in_y_end, in_league_end, sc_y_league_end, bg_color_graphic, text=[league_name], font_scale=0.5) # League
-                    
-                    # Logo
-                    in_team_logo_dim = int((in_team2_logo_end*width - in_team2_logo_start*width)*0.8) # Logo height and width equal 80% container height
-                    frame = generate_center_logo(home_logo_url, in_team_logo_dim, in_team_logo_dim, in_team1_logo_start, in_y_start, in_team1_logo_end, in_y_end) # Home logo
-                    frame = generate_center_logo(visiting_logo_url, in_team_logo_dim, in_team_logo_dim, in_team2_logo_start, in_y_start, in_team2_logo_end, in_y_end) # Visiting logo
-
-                    # Text
-                    rect_height = rect_height*0.4 # Scale font to container height
-                    rect2_height = rect2_height*0.4
-                    generate_center_text(home_name, name1_topleft[0]/width, in_y_start, name1_bottomright[0]/width, in_y_end, rect_h=rect_height, color=text_color) # Home name
-                    generate_center_text(visiting_name, name2_topleft[0]/width, in_y_start, name2_bottomright[0]/width, in_y_end, rect_h=rect_height, color=text_color) # Visiting name
-                    generate_center_text(score, in_team1_color_end, in_y_start, in_score_end, in_y_end, color=text_color_black, rect_h=rect_height) # Score
-                    generate_center_text(league_name, league_topleft[0]/width, in_y_end, league_bottomright[0]/width, sc_y_league_end, color=bg_color_white, rect_h=rect2_height) # League name
-
-                if i > int(duration*0.3) and i < int(duration*0.6):
-                    # Action
-                    generate_rect(ac_team_color_start, ac_y_start, ac_team_color_end, ac_y_end - (ac_y_end - ac_y_start)/2, color=home_color1) # Jersey color1
-                    generate_rect(ac_team_color_start, ac_y_end - (ac_y_end - ac_y_start)/2, ac_team_color_end, ac_y_end, color=home_color2) # Jersey color2
-                    generate_rect(ac_team_color_end, ac_y_start, ac_player_end, ac_y_end, color=bg_color_graphic) # Player icon container
-                    player_topleft, player_bottomright, rect_h = generate_rect(ac_player_end, ac_y_start, ac_name_end, ac_y_end, text=[player_name], color=bg_color_graphic, grow="right", font_scale=0.5) # Dynamic container of player name
-                    generate_rect(player_bottomright[0]/width, ac_y_start, player_bottomright[0]/width+ac_action_offset, ac_y_end,color=bg_color_white) # Action icon container
-                    generate_rect(player_topleft[0]/width, ac_y_end, player_bottomright[0]/width, ac_msg_y_end, color=bg_color_graphic, opacity=0.11) # Action message container
-
-                    frame = generate_center_logo(player_logo_url, ac_icon_width, ac_icon_height, ac_team_color_end, ac_y_start, ac_player_end, ac_y_end) # Player icon
-                    frame = generate_center_logo(icon, ac_icon_width, ac_icon_height, player_bottomright[0]/width, ac_y_start, player_bottomright[0]/width+ac_action_offset, ac_y_end) # Action icon
-
-                    generate_center_text(player_name, player_topleft[0]/width, ac_y_start, player_bottomright[0]/width, ac_y_end, color=text_color) # Player name
-                    generate_center_text(msg, player_topleft[0]/width, ac_y_end, player_bottomright[0]/width, ac_msg_y_end, color=bg_color_white, font_scale=0.7) # Action message
-                    
-            elif graphic_template == 'diamond':
-                # Scoreboard
-                if i <= (duration):
-                    # Generate diamond, return posistion of diamond for placing logo on-top
-                    frame, sc_league_topleft, sc_league_bottomright = generate_diamond(sc_league_center_x, sc_league_center_y, sc_league_length, color=bg_color_black)
-
-                    # Height of graphics start from peak of diamond to middle of diamond
-                    sc_y_start = sc_league_topleft[1]/height
-                    sc_y_end = sc_league_center_y
-
-                    # Scoreboard team 1
-                    generate_rect(sc_team1_name_start, sc_y_start, sc_team1_name_end, sc_y_end, color=bg_color_black)
-                    generate_rect(sc_team1_name_end, sc_y_start, sc_team1_color_end, sc_y_end - (sc_y_end - sc_y_start)/2, color=home_color1)
-                    generate_rect(sc_team1_name_end, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team1_color_end, sc_y_end, color=home_color2)
-
-                    # Score
-                    generate_rect(sc_team1_color_end, sc_y_start, sc_score_end, sc_y_end, color=bg_color_graphic)
-                    
-                    # Scoreboard team 2
-                    generate_rect(sc_score_end, sc_y_start, sc_team2_color_end, sc_y_end - (sc_y_end - sc_y_start)/2, color=visiting_color1)
-                    generate_rect(sc_score_end, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team2_color_end, sc_y_end, color=visiting_color2)
-                    generate_rect(sc_team2_color_end, sc_y_start, sc_team2_name_end, sc_y_end, color=bg_color_black)
-                 
-                    # Draw logo
-                    frame = generate_center_logo(league_logo_url, sc_league_width, sc_league_height, sc_league_center_x, sc_league_center_y, sc_league_center_x, sc_league_center_y)
-                    
-                    # Draw text 
-                    generate_center_text(home_ini, sc_team1_name_start, sc_y_start, sc_team1_name_end, sc_y_end, color=text_color_white)
-                    generate_center_text(score, sc_team1_color_end, sc_y_start, sc_score_end, sc_y_end, color=text_color_graphic)
-                    generate_center_text(visiting_ini, sc_team2_color_end, sc_y_start, sc_team2_name_end, sc_y_end, color=text_color_white)
-
-                # Introduction
-                if i > int(duration * 0.025) and i < int(duration * 0.125):
-                    if aspect_ratio == [16, 9]:
-                        # League diamond container
-                        frame, _, in_league_bottomright = generate_diamond(in_league_center_x, in_league_center_y, in_league_length, color=bg_color_black)
-
-                        # Team1 begins from middle to bottom of diamond in y-axis
-                        in_team1_y_start = in_league_center_y
-                        in_team1_y_end = in_league_bottomright[1]/height
-
-                        # Introduction team1
-                        name1_topleft, name1_bottomright, _ = generate_rect(in_team1_name_start, in_team1_y_start, in_team1_name_end, in_team1_y_end, color=bg_color_black, text=[home_name, visiting_name], grow='left', font_scale=0.5)
-                        in_team1_color_end = name1_topleft[0]/width + in_team1_color_offset # Top_left of team's color is offset to top_left of team's name
-                        generate_rect(in_team1_color_end, in_team1_y_start, name1_topleft[0]/width, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, color=home_color1)
-                        generate_rect(in_team1_color_end, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, name1_topleft[0]/width, in_team1_y_end, color=home_color2)
-                        in_team1_score_end = in_team1_color_end + in_team1_score_offset # Move top_left of team's score according to new position of team1's color
-                        generate_rect(in_team1_score_end, in_team1_y_start, in_team1_color_end, in_team1_y_end, color=bg_color_graphic)
-                        in_team1_logo_end = in_team1_score_end + in_team1_logo_offset # Repeat of above, for logo
-                        generate_rect(in_team1_logo_end, in_team1_y_start, in_team1_score_end, in_team1_y_end, color=bg_color_black)
-
-                        # Team2 begins from top to middle of diamond in y-axis
-                        in_team2_y_start = in_league_center_y - in_league_length
-                        in_team2_y_end = in_league_center_y
-
-                        # Introduction team2
-                        name2_topleft, name2_bottomright, _ =  generate_rect(in_team2_name_start, in_team2_y_start, in_team2_name_end, in_team2_y_end, color=bg_color_black, text=[home_name, visiting_name], grow='right', font_scale=0.5)
-                        in_team2_color_end = name2_bottomright[0]/width + in_team2_color_offset
-                        generate_rect(name2_bottomright[0]/width, in_team2_y_start, in_team2_color_end, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, color=visiting_color1)
-                        generate_rect(name2_bottomright[0]/width, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, in_team2_color_end, in_team2_y_end, color=visiting_color2)
-                        in_team2_score_end = in_team2_color_end + in_team2_score_offset
-                        generate_rect(in_team2_color_end, in_team2_y_start, in_team2_score_end, in_team2_y_end, color=bg_color_graphic)
-                        in_team2_logo_end = in_team2_score_end + in_team2_logo_offset
-                        generate_rect(in_team2_score_end, in_team2_y_start, in_team2_logo_end, in_team2_y_end, color=bg_color_black)
-                        
-                        # Introduction league
-                        league_name_topleft, league_name_bottomright, _ = generate_rect(in_league_bottomright[0]/width, in_league_center_y + in_league_length/2, in_league_bottomright[0]/width + in_league_name_offset, in_league_bottomright[1]/height, color=bg_color_black, text=[league_name], grow='right', font_scale=0.5)
-
-                        # Draw logos 
-                        frame = generate_center_logo(league_logo_url, in_league_width, in_league_height, in_league_center_x, in_league_center_y, in_league_center_x, in_league_center_y)
-                        frame = generate_center_logo(home_logo_url, in_team1_width, in_team1_height, in_team1_logo_end, in_team1_y_start, in_team1_score_end, in_team1_y_end)
-                        frame = generate_center_logo(visiting_logo_url, in_team2_width, in_team2_height, in_team2_score_end, in_team2_y_start, in_team2_logo_end, in_team2_y_end)
-
-                        # Draw text
-                        generate_center_text(home_name, name1_topleft[0]/width, in_team1_y_start, name1_bottomright[0]/width, in_team1_y_end, color=text_color_white, font_scale=1.2)
-                        generate_center_text(visiting_name, name2_topleft[0]/width, in_team2_y_start, name2_bottomright[0]/width, in_team2_y_end, color=text_color_white, font_scale=1.2)
-                        generate_center_text(score[0], in_team1_color_end, in_team1_y_start, in_team1_score_end, in_team1_y_end, color=text_color_graphic, thickness=3)
-                        generate_center_text(score[-1], in_team2_color_end, in_team2_y_start, in_team2_score_end, in_team2_y_end, color=text_color_graphic, thickness=3)
-                        generate_center_text(league_name, league_name_topleft[0]/width, league_name_topleft[1]/height, league_name_bottomright[0]/width, league_name_bottomright[1]/height, color=text_color_white, font_scale=0.8)
-                    elif aspect_ratio == [9, 16]:
-                        frame, _, _ = generate_diamond(in_team1_center_x, in_team1_center_y, in_team1_length, color=bg_color_black)
-                        frame, _, _ = generate_diamond(in_team2_center_x, in_team2_center_y, in_team2_length, color=bg_color_black)
-
-                        name1_topleft, name1_bottomright, _ = generate_rect(in_team1_name_start, in_team1_y_start, in_team1_name_end, in_team1_y_end, color=bg_color_black, text=[home_name, visiting_name], grow='right', font_scale=0.5)
-                        in_team1_color_start = name1_bottomright[0]/width
-                        in_team1_color_end = in_team1_color_start + in_team1_color_offset
-                        generate_rect(in_team1_color_start, in_team1_y_start, in_team1_color_end, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, color=home_color1)
-                        generate_rect(in_team1_color_start, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, in_team1_color_end, in_team1_y_end, color=home_color2)
-                        generate_rect(in_team1_color_end, in_team1_y_start, in_team1_color_end+in_team1_score_offset, in_team1_y_end, color=bg_color_graphic)
-
-                        league_topleft, league_bottomright, _ = generate_rect(in_league_name_start, in_league_y_start, in_league_name_end, in_league_y_end, color=bg_color_black, text=[league_name], opacity=0.11, font_scale=0.5)
-
-                        name2_topleft, name2_bottomright, _ = generate_rect(in_team2_name_start, in_team2_y_start, in_team2_name_end, in_team2_y_end, color=bg_color_black, text=[home_name,visiting_name], grow='left', font_scale=0.5)
-                        in_team2_color_start = name2_topleft[0]/width + in_team2_color_offset
-                        in_team2_color_end = name2_topleft[0]/width
-                        generate_rect(in_team2_color_start, in_team2_y_start, in_team2_color_end, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, color=visiting_color1)
-                        generate_rect(in_team2_color_start, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, in_team2_color_end, in_team2_y_end, color=visiting_color2)
-                        generate_rect(in_team2_color_start+in_team2_score_offset, in_team2_y_start, in_team2_color_start, in_team2_y_end, color=bg_color_graphic)
-
-                        frame = generate_center_logo(home_logo_url, in_team1_width, in_team1_height, in_team1_center_x, in_team1_center_y, in_team1_center_x, in_team1_center_y)
-                        frame = generate_center_logo(visiting_logo_url, in_team2_width, in_team2_height, in_team2_center_x, in_team2_center_y, in_team2_center_x, in_team2_center_y)
-
-                        generate_center_text(home_name, name1_topleft[0]/width, in_team1_y_start, name1_bottomright[0]/width, in_team1_y_end, color=text_color_white, font_scale=0.8)
-                        generate_center_text(visiting_name, name2_topleft[0]/width, in_team2_y_start, name2_bottomright[0]/width, in_team2_y_end, color=text_color_white, font_scale=0.8)
-                        generate_center_text(league_name, league_topleft[0]/width, in_league_y_start, league_bottomright[0]/width, in_league_y_end, color=text_color_white, font_scale=0.8)
-                        generate_center_text(score[0], in_team1_color_end, in_team1_y_start, in_team1_color_end+in_team1_score_offset, in_team1_y_end, color=text_color_graphic, font_scale=0.8)
-                        generate_center_text(score[-1], in_team2_color_end+in_team2_score_offset, in_team2_y_start, in_team2_color_start, in_team2_y_end, color=text_color_graphic, font_scale=0.8)
+                ac_action_start = ac_action_end - 0.04
+    else:
+        raise ValueError(f'Invalid aspect ratio entered: {aspect_ratio}.')
+
+    c = LayoutCompiler(RenderContext(width, height))
+    for block in BLOCKS:
+        c.begin(block)
+        if graphic_template == 'rectangle':
+        # Scoreboard
+            if block == 'scoreboard':
+                # Home team
+                c.rect(sc_team1_logo_start, sc_y_start, sc_team1_logo_end, sc_y_end, bg_color_graphic) # Logo container
+                c.rect(sc_team1_color_end, sc_y_start, sc_team1_name_end, sc_y_end, bg_color_graphic) # Name container
+                c.rect(sc_team1_logo_end, sc_y_start, sc_team1_color_end, sc_y_end - (sc_y_end - sc_y_start)/2, home_color1) # Color1 rect
+                c.rect(sc_team1_logo_end, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team1_color_end, sc_y_end, home_color2) # Color2 rect
+                c.rect(sc_team1_name_end, sc_y_start, sc_team1_score_end, sc_y_end, bg_color_white) # Score container
+
+                c.rect(sc_team1_score_end, sc_y_start, sc_team2_score_start, sc_y_end, bg_color_white) # League container
+                c.rect(sc_team2_score_end, sc_y_end, sc_team2_logo_end, sc_y_time_end, bg_color_black, opacity=0.11) # Time container
+
+                # Visiting team
+                c.rect(sc_team2_score_start, sc_y_start, sc_team2_score_end, sc_y_end, bg_color_white) # Score
+                c.rect(sc_team2_score_end, sc_y_start, sc_team2_color_start, sc_y_end, bg_color_graphic) # Name
+                c.rect(sc_team2_color_start, sc_y_start, sc_team2_name_end, sc_y_end - (sc_y_end - sc_y_start)/2, visiting_color1) # Color1
+                c.rect(sc_team2_color_start, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team2_name_end, sc_y_end, visiting_color2) # Color2
+                c.rect(sc_team2_name_end, sc_y_start, sc_team2_logo_end, sc_y_end, bg_color_graphic) # Logo
+
+                # Logo
+                c.logo(league_logo_url, league_width, league_height, sc_team1_score_end, sc_y_start, sc_team2_score_start, sc_y_end) # League
+                c.logo(home_logo_url, sc_team1_logo_dim, sc_team1_logo_dim, sc_team1_logo_start, sc_y_start, sc_team1_logo_end, sc_y_end) # Home team
+                c.logo(visiting_logo_url,sc_team2_logo_dim, sc_team2_logo_dim,sc_team2_name_end, sc_y_start,sc_team2_logo_end, sc_y_end) # Visiting team
+
+                # Text
+                c.text(home_ini, sc_team1_color_end, sc_y_start, sc_team1_name_end, sc_y_end, color=text_color, font_scale=0.8) # Home initials
+                c.text(score[0], sc_team1_name_end, sc_y_start, sc_team1_score_end, sc_y_end, color=text_color_black) # Home score
+                c.text(visiting_ini, sc_team2_score_end, sc_y_start, sc_team2_color_start, sc_y_end, color=text_color, font_scale=0.8) # Visiting intials
+                c.text(score[2], sc_team2_score_start, sc_y_start, sc_team2_score_end, sc_y_end, color=text_color_black) # Visiting score
+                c.text(game_time, sc_team2_score_end, sc_y_end, sc_team2_logo_end, sc_y_time_end, color=bg_color_white) # Game time
+
+            if block == 'intro':
+                # Intro
+                name1_topleft, name1_bottomright, rect_height = c.rect(in_team1_name_start, in_y_start, in_team1_name_end, in_y_end, bg_color_graphic, text=[home_name, visiting_name], grow="left", font_scale=0.5) # Name
+                in_team1_logo_start = (name1_topleft[0]/width)+in_team1_logo_offset
+                in_team1_logo_end = name1_topleft[0]/width
+                c.rect(in_team1_logo_start, in_y_start, in_team1_logo_end, in_y_end, bg_color_graphic) # Logo
+                c.rect(in_team1_name_end, in_y_start, in_team1_color_end, in_y_end - (in_y_end - in_y_start)/2, home_color1) # Color1
+                c.rect(in_team1_name_end, in_y_end - (in_y_end - in_y_start)/2, in_team1_color_end, in_y_end, home_color2) # Color2
+
+                c.rect(in_team1_color_end, in_y_start, in_score_end, in_y_end, bg_color_white) # Score
+
+                c.rect(in_score_end, in_y_start, in_team2_color_end, in_y_end - (in_y_end - in_y_start)/2, visiting_color1) # Color1
+                c.rect(in_score_end, in_y_end - (in_y_end - in_y_start)/2, in_team2_color_end, in_y_end, visiting_color2) # Color2
+                name2_topleft, name2_bottomright, rect_height = c.rect(in_team2_color_end, in_y_start, in_team2_name_end, in_y_end, bg_color_graphic, text=[home_name, visiting_name], grow="right", font_scale=0.5) # Name
+                in_team2_logo_start = name2_bottomright[0]/width
+                in_team2_logo_end = (name2_bottomright[0]/width)+in_team2_logo_offset
+                c.rect(in_team2_logo_start, in_y_start, in_team2_logo_end, in_y_end, bg_color_graphic) # Logo
+
+                league_topleft, league_bottomright, rect2_height = c.rect(in_league_start, in_y_end, in_league_end, sc_y_league_end, bg_color_graphic, text=[league_name], font_scale=0.5) # League
+
+                # Logo
+                in_team_logo_dim = int((in_team2_logo_end*width - in_team2_logo_start*width)*0.8) # Logo height and width equal 80% container height
+                c.logo(home_logo_url, in_team_logo_dim, in_team_logo_dim, in_team1_logo_start, in_y_start, in_team1_logo_end, in_y_end) # Home logo
+                c.logo(visiting_logo_url, in_team_logo_dim, in_team_logo_dim, in_team2_logo_start, in_y_start, in_team2_logo_end, in_y_end) # Visiting logo
+
+                # Text
+                rect_height = rect_height*0.4 # Scale font to container height
+                rect2_height = rect2_height*0.4
+                c.text(home_name, name1_topleft[0]/width, in_y_start, name1_bottomright[0]/width, in_y_end, rect_h=rect_height, color=text_color) # Home name
+                c.text(visiting_name, name2_topleft[0]/width, in_y_start, name2_bottomright[0]/width, in_y_end, rect_h=rect_height, color=text_color) # Visiting name
+                c.text(score, in_team1_color_end, in_y_start, in_score_end, in_y_end, color=text_color_black, rect_h=rect_height) # Score
+                c.text(league_name, league_topleft[0]/width, in_y_end, league_bottomright[0]/width, sc_y_league_end, color=bg_color_white, rect_h=rect2_height) # League name
+
+            if block == 'action':
                 # Action
-                if i > int(duration*0.3) and i < int(duration*0.6):
-                    if aspect_ratio == [16, 9]:
-                        action_topleft, action_bottomright, _ = generate_rect(ac_action_start, ac_action_y_start, ac_action_end, ac_action_y_end, color=bg_color_graphic, text=[msg], grow='right', font_scale=0.5)
-                        frame, ac_team_topleft, ac_team_bottomright = generate_diamond(ac_team_center_x, ac_team_center_y, ac_team_length, color=bg_color_black)
-                        player_topleft, player_bottomright, _ = generate_rect(ac_name_start, ac_name_y_start, ac_name_end, ac_name_y_end, color=bg_color_black, text=[player_name], grow='right', font_scale=0.5)
-
-                        frame = generate_center_logo(home_logo_url, in_team1_width, in_team1_height, ac_team_center_x, ac_team_center_y, ac_team_center_x, ac_team_center_y)
-
-                        generate_center_text(player_name, player_topleft[0]/width, player_topleft[1]/height, player_bottomright[0]/width, player_bottomright[1]/height, color=text_color_white)
-                        generate_center_text(msg, action_topleft[0]/width, action_topleft[1]/height, action_bottomright[0]/width, action_bottomright[1]/height, color=text_color_graphic, font_scale=0.7)
-                    elif aspect_ratio == [9, 16]:
-                        action_topleft, action_bottomright, _ = generate_rect(ac_action_start, ac_action_y_start, ac_action_end, ac_action_y_end, color=bg_color_graphic, text=[msg], grow='left')
-                        frame, ac_team_topleft, ac_team_bottomright = generate_diamond(ac_team_center_x, ac_team_center_y, ac_team_length, color=bg_color_black)
-                        player_topleft, player_bottomright, _ = generate_rect(ac_name_start, ac_name_y_start, ac_name_end, ac_name_y_end, color=bg_color_black, text=[player_name], grow='left', font_scale=0.5)
-
-                        frame = generate_center_logo(home_logo_url, in_team1_width, in_team1_height, ac_team_center_x, ac_team_center_y, ac_team_center_x, ac_team_center_y)
-
-                        generate_center_text(player_name, player_topleft[0]/width, ac_name_y_start, player_bottomright[0]/width, ac_name_y_end, color=text_color_white, font_scale=0.7, thickness=2)
-                        generate_center_text(msg, action_topleft[0]/width, ac_action_y_start, action_bottomright[0]/width, ac_action_y_end, color=text_color_graphic, font_scale=0.5, thickness=2, position=0.1)
-            # Write the frame
-            out.write(frame)
-        
-        # Release video-writer
-        out.release()
+                c.rect(ac_team_color_start, ac_y_start, ac_team_color_end, ac_y_end - (ac_y_end - ac_y_start)/2, color=home_color1) # Jersey color1
+                c.rect(ac_team_color_start, ac_y_end - (ac_y_end - ac_y_start)/2, ac_team_color_end, ac_y_end, color=home_color2) # Jersey color2
+                c.rect(ac_team_color_end, ac_y_start, ac_player_end, ac_y_end, color=bg_color_graphic) # Player icon container
+                player_topleft, player_bottomright, rect_h = c.rect(ac_player_end, ac_y_start, ac_name_end, ac_y_end, text=[player_name], color=bg_color_graphic, grow="right", font_scale=0.5) # Dynamic container of player name
+                c.rect(player_bottomright[0]/width, ac_y_start, player_bottomright[0]/width+ac_action_offset, ac_y_end,color=bg_color_white) # Action icon container
+                c.rect(player_topleft[0]/width, ac_y_end, player_bottomright[0]/width, ac_msg_y_end, color=bg_color_graphic, opacity=0.11) # Action message container
+
+                c.logo(player_logo_url, ac_icon_width, ac_icon_height, ac_team_color_end, ac_y_start, ac_player_end, ac_y_end) # Player icon
+                c.logo(icon, ac_icon_width, ac_icon_height, player_bottomright[0]/width, ac_y_start, player_bottomright[0]/width+ac_action_offset, ac_y_end) # Action icon
+
+                c.text(player_name, player_topleft[0]/width, ac_y_start, player_bottomright[0]/width, ac_y_end, color=text_color) # Player name
+                c.text(msg, player_topleft[0]/width, ac_y_end, player_bottomright[0]/width, ac_msg_y_end, color=bg_color_white, font_scale=0.7) # Action message
+
+        elif graphic_template == 'diamond':
+            # Scoreboard
+            if block == 'scoreboard':
+                # Generate diamond, return posistion of diamond for placing logo on-top
+                sc_league_topleft, sc_league_bottomright = c.diamond(sc_league_center_x, sc_league_center_y, sc_league_length, color=bg_color_black)
+
+                # Height of graphics start from peak of diamond to middle of diamond
+                sc_y_start = sc_league_topleft[1]/height
+                sc_y_end = sc_league_center_y
+
+                # Scoreboard team 1
+                c.rect(sc_team1_name_start, sc_y_start, sc_team1_name_end, sc_y_end, color=bg_color_black)
+                c.rect(sc_team1_name_end, sc_y_start, sc_team1_color_end, sc_y_end - (sc_y_end - sc_y_start)/2, color=home_color1)
+                c.rect(sc_team1_name_end, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team1_color_end, sc_y_end, color=home_color2)
+
+                # Score
+                c.rect(sc_team1_color_end, sc_y_start, sc_score_end, sc_y_end, color=bg_color_graphic)
+
+                # Scoreboard team 2
+                c.rect(sc_score_end, sc_y_start, sc_team2_color_end, sc_y_end - (sc_y_end - sc_y_start)/2, color=visiting_color1)
+                c.rect(sc_score_end, sc_y_end - (sc_y_end - sc_y_start)/2, sc_team2_color_end, sc_y_end, color=visiting_color2)
+                c.rect(sc_team2_color_end, sc_y_start, sc_team2_name_end, sc_y_end, color=bg_color_black)
+
+                # Draw logo
+                c.logo(league_logo_url, sc_league_width, sc_league_height, sc_league_center_x, sc_league_center_y, sc_league_center_x, sc_league_center_y)
+
+                # Draw text 
+                c.text(home_ini, sc_team1_name_start, sc_y_start, sc_team1_name_end, sc_y_end, color=text_color_white)
+                c.text(score, sc_team1_color_end, sc_y_start, sc_score_end, sc_y_end, color=text_color_graphic)
+                c.text(visiting_ini, sc_team2_color_end, sc_y_start, sc_team2_name_end, sc_y_end, color=text_color_white)
+
+            # Introduction
+            if block == 'intro':
+                if aspect_ratio == [16, 9]:
+                    # League diamond container
+                    _, in_league_bottomright = c.diamond(in_league_center_x, in_league_center_y, in_league_length, color=bg_color_black)
+
+                    # Team1 begins from middle to bottom of diamond in y-axis
+                    in_team1_y_start = in_league_center_y
+                    in_team1_y_end = in_league_bottomright[1]/height
+
+                    # Introduction team1
+                    name1_topleft, name1_bottomright, _ = c.rect(in_team1_name_start, in_team1_y_start, in_team1_name_end, in_team1_y_end, color=bg_color_black, text=[home_name, visiting_name], grow='left', font_scale=0.5)
+                    in_team1_color_end = name1_topleft[0]/width + in_team1_color_offset # Top_left of team's color is offset to top_left of team's name
+                    c.rect(in_team1_color_end, in_team1_y_start, name1_topleft[0]/width, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, color=home_color1)
+                    c.rect(in_team1_color_end, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, name1_topleft[0]/width, in_team1_y_end, color=home_color2)
+                    in_team1_score_end = in_team1_color_end + in_team1_score_offset # Move top_left of team's score according to new position of team1's color
+                    c.rect(in_team1_score_end, in_team1_y_start, in_team1_color_end, in_team1_y_end, color=bg_color_graphic)
+                    in_team1_logo_end = in_team1_score_end + in_team1_logo_offset # Repeat of above, for logo
+                    c.rect(in_team1_logo_end, in_team1_y_start, in_team1_score_end, in_team1_y_end, color=bg_color_black)
+
+                    # Team2 begins from top to middle of diamond in y-axis
+                    in_team2_y_start = in_league_center_y - in_league_length
+                    in_team2_y_end = in_league_center_y
+
+                    # Introduction team2
+                    name2_topleft, name2_bottomright, _ =  c.rect(in_team2_name_start, in_team2_y_start, in_team2_name_end, in_team2_y_end, color=bg_color_black, text=[home_name, visiting_name], grow='right', font_scale=0.5)
+                    in_team2_color_end = name2_bottomright[0]/width + in_team2_color_offset
+                    c.rect(name2_bottomright[0]/width, in_team2_y_start, in_team2_color_end, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, color=visiting_color1)
+                    c.rect(name2_bottomright[0]/width, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, in_team2_color_end, in_team2_y_end, color=visiting_color2)
+                    in_team2_score_end = in_team2_color_end + in_team2_score_offset
+                    c.rect(in_team2_color_end, in_team2_y_start, in_team2_score_end, in_team2_y_end, color=bg_color_graphic)
+                    in_team2_logo_end = in_team2_score_end + in_team2_logo_offset
+                    c.rect(in_team2_score_end, in_team2_y_start, in_team2_logo_end, in_team2_y_end, color=bg_color_black)
+
+                    # Introduction league
+                    league_name_topleft, league_name_bottomright, _ = c.rect(in_league_bottomright[0]/width, in_league_center_y + in_league_length/2, in_league_bottomright[0]/width + in_league_name_offset, in_league_bottomright[1]/height, color=bg_color_black, text=[league_name], grow='right', font_scale=0.5)
+
+                    # Draw logos 
+                    c.logo(league_logo_url, in_league_width, in_league_height, in_league_center_x, in_league_center_y, in_league_center_x, in_league_center_y)
+                    c.logo(home_logo_url, in_team1_width, in_team1_height, in_team1_logo_end, in_team1_y_start, in_team1_score_end, in_team1_y_end)
+                    c.logo(visiting_logo_url, in_team2_width, in_team2_height, in_team2_score_end, in_team2_y_start, in_team2_logo_end, in_team2_y_end)
+
+                    # Draw text
+                    c.text(home_name, name1_topleft[0]/width, in_team1_y_start, name1_bottomright[0]/width, in_team1_y_end, color=text_color_white, font_scale=1.2)
+                    c.text(visiting_name, name2_topleft[0]/width, in_team2_y_start, name2_bottomright[0]/width, in_team2_y_end, color=text_color_white, font_scale=1.2)
+                    c.text(score[0], in_team1_color_end, in_team1_y_start, in_team1_score_end, in_team1_y_end, color=text_color_graphic, thickness=3)
+                    c.text(score[-1], in_team2_color_end, in_team2_y_start, in_team2_score_end, in_team2_y_end, color=text_color_graphic, thickness=3)
+                    c.text(league_name, league_name_topleft[0]/width, league_name_topleft[1]/height, league_name_bottomright[0]/width, league_name_bottomright[1]/height, color=text_color_white, font_scale=0.8)
+                elif aspect_ratio == [9, 16]:
+                    _, _ = c.diamond(in_team1_center_x, in_team1_center_y, in_team1_length, color=bg_color_black)
+                    _, _ = c.diamond(in_team2_center_x, in_team2_center_y, in_team2_length, color=bg_color_black)
+
+                    name1_topleft, name1_bottomright, _ = c.rect(in_team1_name_start, in_team1_y_start, in_team1_name_end, in_team1_y_end, color=bg_color_black, text=[home_name, visiting_name], grow='right', font_scale=0.5)
+                    in_team1_color_start = name1_bottomright[0]/width
+                    in_team1_color_end = in_team1_color_start + in_team1_color_offset
+                    c.rect(in_team1_color_start, in_team1_y_start, in_team1_color_end, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, color=home_color1)
+                    c.rect(in_team1_color_start, in_team1_y_end - (in_team1_y_end - in_team1_y_start)/2, in_team1_color_end, in_team1_y_end, color=home_color2)
+                    c.rect(in_team1_color_end, in_team1_y_start, in_team1_color_end+in_team1_score_offset, in_team1_y_end, color=bg_color_graphic)
+
+                    league_topleft, league_bottomright, _ = c.rect(in_league_name_start, in_league_y_start, in_league_name_end, in_league_y_end, color=bg_color_black, text=[league_name], opacity=0.11, font_scale=0.5)
+
+                    name2_topleft, name2_bottomright, _ = c.rect(in_team2_name_start, in_team2_y_start, in_team2_name_end, in_team2_y_end, color=bg_color_black, text=[home_name,visiting_name], grow='left', font_scale=0.5)
+                    in_team2_color_start = name2_topleft[0]/width + in_team2_color_offset
+                    in_team2_color_end = name2_topleft[0]/width
+                    c.rect(in_team2_color_start, in_team2_y_start, in_team2_color_end, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, color=visiting_color1)
+                    c.rect(in_team2_color_start, in_team2_y_end - (in_team2_y_end - in_team2_y_start)/2, in_team2_color_end, in_team2_y_end, color=visiting_color2)
+                    c.rect(in_team2_color_start+in_team2_score_offset, in_team2_y_start, in_team2_color_start, in_team2_y_end, color=bg_color_graphic)
+
+                    c.logo(home_logo_url, in_team1_width, in_team1_height, in_team1_center_x, in_team1_center_y, in_team1_center_x, in_team1_center_y)
+                    c.logo(visiting_logo_url, in_team2_width, in_team2_height, in_team2_center_x, in_team2_center_y, in_team2_center_x, in_team2_center_y)
+
+                    c.text(home_name, name1_topleft[0]/width, in_team1_y_start, name1_bottomright[0]/width, in_team1_y_end, color=text_color_white, font_scale=0.8)
+                    c.text(visiting_name, name2_topleft[0]/width, in_team2_y_start, name2_bottomright[0]/width, in_team2_y_end, color=text_color_white, font_scale=0.8)
+                    c.text(league_name, league_topleft[0]/width, in_league_y_start, league_bottomright[0]/width, in_league_y_end, color=text_color_white, font_scale=0.8)
+                    c.text(score[0], in_team1_color_end, in_team1_y_start, in_team1_color_end+in_team1_score_offset, in_team1_y_end, color=text_color_graphic, font_scale=0.8)
+                    c.text(score[-1], in_team2_color_end+in_team2_score_offset, in_team2_y_start, in_team2_color_start, in_team2_y_end, color=text_color_graphic, font_scale=0.8)
+            # Action
+            if block == 'action':
+                if aspect_ratio == [16, 9]:
+                    action_topleft, action_bottomright, _ = c.rect(ac_action_start, ac_action_y_start, ac_action_end, ac_action_y_end, color=bg_color_graphic, text=[msg], grow='right', font_scale=0.5)
+                    ac_team_topleft, ac_team_bottomright = c.diamond(ac_team_center_x, ac_team_center_y, ac_team_length, color=bg_color_black)
+                    player_topleft, player_bottomright, _ = c.rect(ac_name_start, ac_name_y_start, ac_name_end, ac_name_y_end, color=bg_color_black, text=[player_name], grow='right', font_scale=0.5)
+
+                    c.logo(home_logo_url, in_team1_width, in_team1_height, ac_team_center_x, ac_team_center_y, ac_team_center_x, ac_team_center_y)
+
+                    c.text(player_name, player_topleft[0]/width, player_topleft[1]/height, player_bottomright[0]/width, player_bottomright[1]/height, color=text_color_white)
+                    c.text(msg, action_topleft[0]/width, action_topleft[1]/height, action_bottomright[0]/width, action_bottomright[1]/height, color=text_color_graphic, font_scale=0.7)
+                elif aspect_ratio == [9, 16]:
+                    action_topleft, action_bottomright, _ = c.rect(ac_action_start, ac_action_y_start, ac_action_end, ac_action_y_end, color=bg_color_graphic, text=[msg], grow='left')
+                    ac_team_topleft, ac_team_bottomright = c.diamond(ac_team_center_x, ac_team_center_y, ac_team_length, color=bg_color_black)
+                    player_topleft, player_bottomright, _ = c.rect(ac_name_start, ac_name_y_start, ac_name_end, ac_name_y_end, color=bg_color_black, text=[player_name], grow='left', font_scale=0.5)
+
+                    c.logo(home_logo_url, in_team1_width, in_team1_height, ac_team_center_x, ac_team_center_y, ac_team_center_x, ac_team_center_y)
+
+                    c.text(player_name, player_topleft[0]/width, ac_name_y_start, player_bottomright[0]/width, ac_name_y_end, color=text_color_white, font_scale=0.7, thickness=2)
+                    c.text(msg, action_topleft[0]/width, ac_action_y_start, action_bottomright[0]/width, ac_action_y_end, color=text_color_graphic, font_scale=0.5, thickness=2, position=0.1)
+
+    return c.plan()
+
+# Source frames [first, first + count) of a clip trimmed to start_offset_s..end_offset_s
+def trim_frames(fps, total_frames, start_offset_s=0, end_offset_s=None):
+    first = min(max(int(round((start_offset_s or 0) * fps)), 0), total_frames)
+    last = total_frames if end_offset_s is None else min(max(int(round(end_offset_s * fps)), first), total_frames)
+    return first, last - first
+
+# Frames (0-based, inclusive) during which each block is shown in a clip of duration frames:
+# the scoreboard throughout, the intro from 2.5% to 12.5% and the action from 30% to 60%
+def block_windows(duration):
+    return {
+        'scoreboard': (0, int(duration) - 2),
+        'intro': (int(duration * 0.025) - 1, int(duration * 0.125) - 3),
+        'action': (int(duration * 0.3) - 1, int(duration * 0.6) - 3),
+    }
+
+# Produce every variant from one decode: in the composite stage each frame is cropped and scaled per
+# variant and gets that variant's layers, then the encode stage feeds each variant its own encoder
+def render_variants(read, variants, source_size, meta, bg_color, text_color, home_color, visiting_color, local_file_name, clip_num, fps, duration, window, encoding_params, work_dir=WORK_DIR):
+    windows = block_windows(duration)
+    branches = []
+
+    try:
+        for k, variant in enumerate(variants):
+            box = crop_box(source_size[0], source_size[1], variant.aspect_ratio)
+            size = output_size(box, variant.size)
+            plan = compile_layout(size[0], size[1], meta, bg_color, text_color, home_color, visiting_color, variant.template, variant.layout, layout_aspect(variant.aspect_ratio))
+            layers = {block: rasterize_block(getattr(plan, block), size[0], size[1]) for block in BLOCKS}
+
+            params = variant.encoding_params(encoding_params)
+            filename = meta_filename(clip_num, None if k == 0 else variant.name, work_dir)
+            open_variant_writer = open_hls_writer if use_hls_output(params) else open_writer
+            out = open_variant_writer(filename, fps, size, params, audio_source=local_file_name, audio_window=window, total_frames=duration)
+            branches.append((variant, box, size, layers, out))
+
+        def composite(frame, n):
+            frames = []
+            for variant, box, size, layers, out in branches:
+                variant_frame = crop_and_scale(frame, box, size)
+                for block in BLOCKS:
+                    first, last = windows[block]
+                    if first <= n <= last:
+                        blend_layer(variant_frame, layers[block])
+                frames.append(variant_frame)
+            return frames
+
+        def write(frames):
+            for (variant, box, size, layers, out), variant_frame in zip(branches, frames):
+                out.write(variant_frame)
+
+        queue_size = (encoding_params or {}).get('pipeline_queue_size', PIPELINE_QUEUE_SIZE)
+        stats = run_pipeline(read, composite, write, queue_size)
+    finally:
+        for variant, box, size, layers, out in branches:
+            out.release()
+
+    print(f"Rendered {len(branches)} variants ({', '.join(variant.name for variant, *_ in branches)}) of clip {clip_num}: {stats.summary()}")
+
+# Width, height, frame rate and frame count of the source, from the shared probe cache (the same
+# probe Clip reads, and an exact frame count) or from the open capture if it cannot be probed.
+# fps is kept fractional, rounding 29.97 to 29 would drift from the audio.
+def source_properties(local_file_name, cap):
+    try:
+        info = probe_cache.probe(local_file_name)
+        if info.width and info.fps and info.frame_count:
+            return info.width, info.height, info.fps, info.frame_count
+    except Exception as e:
+        print(f'Could not probe {local_file_name}, reading its properties with OpenCV: {e}')
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+def create_animated_meta(video_h, video_w, clip_meta, bg_color, text_color, home_color, visiting_color, local_file_name, clip_num, graphic_template, graphic_layout, aspect_ratio=[16, 9], fps=25.0, encoding_params=None, start_offset_s=0, end_offset_s=None, work_dir=WORK_DIR):
+    # Several outputs (aspect ratio, template, bitrate) rendered from a single decode. Parsed before
+    # the source is opened, so a variant without a layout fails here.
+    variants = parse_variants(encoding_params, graphic_template, graphic_layout, aspect_ratio)
+    for i, meta in enumerate(clip_meta):
+        # Initialize video capture 
+        cap = cv2.VideoCapture(local_file_name)
+        width, height, fps, frame_count = source_properties(local_file_name, cap)
+        # Only start_offset_s..end_offset_s is rendered, the block windows are relative to it
+        first_frame, duration = trim_frames(fps, frame_count, start_offset_s, end_offset_s)
+        trimmed = first_frame > 0 or end_offset_s is not None
+        window = (first_frame / fps, duration / fps) if trimmed else None
+        output_filename = meta_filename(clip_num, work_dir=work_dir)
+
+        # OpenCV seeks to the keyframe before first_frame and decodes forward from there, discarding
+        # the frames before the in-point. Reading stops at the out-point instead of the end of the file.
+        if first_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+        remaining = [duration]
+
+        def read(buf):
+            if remaining[0] <= 0:
+                return False, None
+            remaining[0] -= 1
+            return cap.read(buf) if buf is not None else cap.read()
+
+        if variants:
+            try:
+                render_variants(read, variants, (width, height), meta, bg_color, text_color, home_color, visiting_color, local_file_name, clip_num, fps, duration, window, encoding_params, work_dir)
+            finally:
+                cap.release()
+            return output_filename
+
+        # The graphics never change within a clip, so each block is rasterized once into a
+        # premultiplied layer and the frame loop only has to blend the active layers
+        plan = compile_layout(width, height, meta, bg_color, text_color, home_color, visiting_color, graphic_template, graphic_layout, aspect_ratio)
+        layers = {block: rasterize_block(getattr(plan, block), width, height) for block in BLOCKS}
+        windows = block_windows(duration)
+
+        # Progressive HLS output comes from the frame-by-frame writer, the other backends only produce whole files
+        progressive = use_hls_output(encoding_params)
+
+        # Static layers can be composited by ffmpeg alone, without decoding frames in Python
+        if not progressive and use_ffmpeg_overlay(graphic_template, encoding_params):
+            if render_overlays_ffmpeg(local_file_name, output_filename, layers, windows, encoding_params, window, duration):
+                cap.release()
+                return output_filename
+            print('ffmpeg overlay failed, falling back to the Python compositor.')
+
+        # Long clips can be split at keyframes and rendered by several processes
+        if not progressive and render_chunked(local_file_name, output_filename, layers, windows, fps, (width, height), duration, encoding_params, first_frame, window):
+            cap.release()
+            return output_filename
+
+        # Initialize video writer, frames are piped straight into the H.264 encoder and the source audio is copied alongside
+        if progressive:
+            out = open_hls_writer(output_filename, fps, (width, height), encoding_params, audio_source=local_file_name, audio_window=window, total_frames=duration)
+        else:
+            out = open_writer(output_filename, fps, (width, height), encoding_params, audio_source=local_file_name, audio_window=window, total_frames=duration)
+
+        # Decode, composite and encode run in their own threads so the decoder and the encoder
+        # overlap with the blending instead of taking turns with it
+        def composite(frame, n):
+            for block in BLOCKS:
+                first, last = windows[block]
+                if first <= n <= last:
+                    blend_layer(frame, layers[block])
+
+        queue_size = (encoding_params or {}).get('pipeline_queue_size', PIPELINE_QUEUE_SIZE)
+        try:
+            stats = run_pipeline(read, composite, out.write, queue_size)
+        finally:
+            cap.release()
+            # Release video-writer
+            out.release()
+        print(f'Rendered {output_filename}: {stats.summary()}')
         return output_filename
     
\ No newline at end of file
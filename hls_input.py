@@ -0,0 +1,71 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import m3u8
+
+HLS_FETCH_WORKERS = 8 # Stays within requests' default connection pool of 10 per host
+HLS_SEGMENT_TIMEOUT = 10
+
+def is_hls_url(url):
+    return isinstance(url, str) and url.split('?')[0].endswith('.m3u8')
+
+# Load a playlist through fetch(url) -> response. A master playlist resolves to its highest bandwidth variant.
+def load_media_playlist(url, fetch):
+    playlist = m3u8.loads(fetch(url).text, uri=url)
+    if playlist.is_variant:
+        variant = max(playlist.playlists, key=lambda p: p.stream_info.bandwidth or 0)
+        playlist = m3u8.loads(fetch(variant.absolute_uri).text, uri=variant.absolute_uri)
+    return playlist
+
+# Segments overlapping [start_s, end_s) and the playlist time at which the first of them starts.
+# end_s=None runs to the end of the playlist.
+def covering_segments(playlist, start_s=0, end_s=None):
+    selected = []
+    first_start = None
+    t = 0.0
+    for segment in playlist.segments:
+        segment_end = t + (segment.duration or 0)
+        if segment_end > start_s and (end_s is None or t < end_s):
+            if first_start is None:
+                first_start = t
+            selected.append(segment)
+        t = segment_end
+    return selected, first_start or 0.0
+
+# Download only the segments covering [start_s, end_s) of an HLS playlist and remux them into
+# local_file_name. Segments are fetched concurrently, but are streamed into ffmpeg's stdin in playlist
+# order as soon as each one (and those before it) arrived, so nothing is staged on disk.
+# Returns the offsets of start_s/end_s within local_file_name.
+def download_hls_window(url, local_file_name, fetch, start_s=0, end_s=None, workers=HLS_FETCH_WORKERS):
+    playlist = load_media_playlist(url, fetch)
+    segments, first_start = covering_segments(playlist, start_s, end_s)
+    if not segments:
+        raise Exception(f'No segments of {url} cover {start_s}-{end_s}s')
+
+    urls = [segment.absolute_uri for segment in segments]
+    init_section = segments[0].init_section
+    if init_section is not None:
+        urls.insert(0, init_section.absolute_uri) # fMP4 segments need their init segment first
+
+    print(f"Fetching {len(segments)}/{len(playlist.segments)} segments of {url} for {start_s}s-{'end' if end_s is None else f'{end_s}s'}")
+    os.makedirs(os.path.dirname(local_file_name) or '.', exist_ok=True)
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', '-', '-map', '0', '-c', 'copy', '-movflags', '+faststart', local_file_name]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, while the fetches themselves run concurrently
+            for response in pool.map(fetch, urls):
+                process.stdin.write(response.content)
+        process.stdin.close()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+    if process.wait() != 0:
+        raise Exception(f'ffmpeg could not remux the segments of {url}')
+
+    start_offset = start_s - first_start
+    end_offset = None if end_s is None else end_s - first_start
+    return start_offset, end_offset
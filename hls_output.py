@@ -0,0 +1,143 @@
+import math
+import os
+import threading
+import m3u8
+from utils import run_and_log
+from video_writer import FFmpegWriter, threads_args, match_output_args, match_output_filter, CRF_OUTPUT_VIDEO
+
+OUTPUT_MP4 = 'mp4'
+OUTPUT_HLS = 'hls' # fMP4 segments and a playlist that grows while the clip is encoded
+
+HLS_SEGMENT_SECONDS = 2
+HLS_DIR = 'hls' # Next to the clips, video/hls for the clips in video/
+
+def use_hls_output(encoding_params=None):
+    return (encoding_params or {}).get('output_format', OUTPUT_MP4) == OUTPUT_HLS
+
+# Segment directory of a rendered clip, video/N_meta.mp4 -> video/hls/N_meta/
+def hls_dir(output_filename):
+    return os.path.join(os.path.dirname(output_filename), HLS_DIR, os.path.splitext(os.path.basename(output_filename))[0])
+
+def hls_playlist(output_filename):
+    return os.path.join(hls_dir(output_filename), 'index.m3u8')
+
+# ffmpeg's HLS muxer writes the EVENT playlist after every segment. Keyframes are forced on
+# segment boundaries, otherwise a segment can only end at the encoder's next natural keyframe.
+def hls_output_args(segment_dir, segment_seconds=HLS_SEGMENT_SECONDS):
+    return ['-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+            '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_segment_type', 'fmp4', '-hls_playlist_type', 'event', '-hls_flags', 'temp_file',
+            '-hls_fmp4_init_filename', 'init.mp4', '-hls_segment_filename', os.path.join(segment_dir, 'seg_%05d.m4s')]
+
+def write_playlist(playlist, path):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(playlist.dumps())
+    os.replace(tmp_path, path) # Players polling the playlist never see a half-written file
+
+# Turn a finished EVENT playlist into its VOD form
+def finalize_playlist(path):
+    playlist = m3u8.load(path)
+    playlist.playlist_type = 'vod'
+    playlist.is_endlist = True
+    write_playlist(playlist, path)
+
+# FFmpegWriter that encodes into HLS segments instead of one mp4, so the clip can be watched while it
+# renders. On release the playlist is finalized and the segments are remuxed into output_filename,
+# which is what the rest of the job (merging, stream copy) expects.
+class HLSWriter(FFmpegWriter):
+    def __init__(self, output_filename, fps, size, segment_seconds=HLS_SEGMENT_SECONDS, extra_output_args=None, **kwargs):
+        self.mp4_filename = output_filename
+        self.segment_dir = hls_dir(output_filename)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        for name in os.listdir(self.segment_dir):
+            os.remove(os.path.join(self.segment_dir, name))
+
+        extra_output_args = (extra_output_args or []) + hls_output_args(self.segment_dir, segment_seconds)
+        super().__init__(hls_playlist(output_filename), fps, size, extra_output_args=extra_output_args, **kwargs)
+
+    def release(self):
+        super().release()
+        finalize_playlist(self.output_filename)
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', self.output_filename,
+               '-map', '0', '-c', 'copy', '-movflags', '+faststart', self.mp4_filename]
+        if run_and_log(cmd, msg=f'remux hls {self.mp4_filename}') != 0:
+            raise RuntimeError(f'Could not remux {self.output_filename} into {self.mp4_filename}')
+
+# HLSWriter with the same encoding_params handling as video_writer.open_writer
+def open_hls_writer(output_filename, fps, size, encoding_params=None, audio_source=None, audio_window=None, total_frames=None):
+    encoding_params = encoding_params or {}
+    return HLSWriter(output_filename, fps, size,
+                     segment_seconds=encoding_params.get('hls_segment_seconds', HLS_SEGMENT_SECONDS),
+                     crf=encoding_params.get('crf', CRF_OUTPUT_VIDEO),
+                     video_bitrate=encoding_params.get('video_bitrate'),
+                     extra_output_args=threads_args(encoding_params.get('encoder_threads')) + match_output_args(encoding_params),
+                     video_filter=match_output_filter(encoding_params),
+                     audio_source=audio_source,
+                     audio_window=audio_window,
+                     audio_tracks=encoding_params.get('audio_tracks'),
+                     total_frames=total_frames)
+
+# One playlist for the whole reel, stitched from the clips' playlists in reel order while they render.
+# Clip k is only appended once clips 0..k-1 are complete, with a discontinuity and its own init segment.
+# It is written to hls/index.m3u8 next to the clips unless another path is given.
+class LivePlaylist:
+    def __init__(self, output_filenames, path=None, interval=HLS_SEGMENT_SECONDS / 2):
+        self.output_filenames = list(output_filenames)
+        self.path = path or os.path.join(os.path.dirname(self.output_filenames[0]), HLS_DIR, 'index.m3u8')
+        self.interval = interval
+        self.dropped = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='live-playlist', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.update(final=True)
+
+    # A clip that failed to render is left out instead of holding up the clips after it
+    def drop(self, index):
+        with self._lock:
+            self.dropped.add(index)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update()
+            except Exception as e:
+                print(f'Could not update {self.path}: {e}')
+
+    def update(self, final=False):
+        with self._lock:
+            reel = m3u8.M3U8()
+            reel.version = 7
+            reel.playlist_type = 'vod' if final else 'event'
+            reel.media_sequence = 0
+            target_duration = HLS_SEGMENT_SECONDS
+
+            for i, output_filename in enumerate(self.output_filenames):
+                if i in self.dropped:
+                    continue
+                path = hls_playlist(output_filename)
+                if not os.path.exists(path):
+                    break
+                clip = m3u8.load(path)
+                prefix = os.path.relpath(os.path.dirname(path), os.path.dirname(self.path))
+                init_section = {'uri': f'{prefix}/{clip.segments[0].init_section.uri}'} if clip.segments else None
+
+                for j, segment in enumerate(clip.segments):
+                    reel.segments.append(m3u8.Segment(uri=f'{prefix}/{segment.uri}', duration=segment.duration,
+                                                      discontinuity=(j == 0 and len(reel.segments) > 0), init_section=init_section))
+                    target_duration = max(target_duration, segment.duration)
+                if not clip.is_endlist:
+                    break
+
+            reel.target_duration = math.ceil(target_duration)
+            reel.is_endlist = final
+            write_playlist(reel, self.path)
@@ -0,0 +1,372 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import timezone
+from requests_cache.backends import BaseCache, BaseStorage
+
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+HTTP_CACHE_EVICT_INTERVAL = 60 # Seconds between eviction passes, sooner once enough has been written
+HTTP_CACHE_EVICT_TO = 0.9 # An eviction pass trims the cache to this share of max_bytes
+HTTP_CACHE_LOCK_TIMEOUT = 30 # Seconds a write waits for another process before giving up
+HTTP_CACHE_USED_RESOLUTION = 60 # Last-use times are only rewritten when older than this, so reads stay reads
+
+# Expiry time of a CachedResponse as a Unix timestamp, None if it never expires
+def expires_timestamp(item):
+    expires = getattr(item, 'expires', None)
+    return None if expires is None else expires.replace(tzinfo=timezone.utc).timestamp()
+
+# A thread's connection, kept in SqliteDict._local. It is closed once the thread has ended and its
+# thread-local storage is released, or by SqliteDict.close().
+class ThreadConnection:
+    def __init__(self, con, connections):
+        self.con = con
+        connections.add(con)
+        weakref.finalize(self, close_connection, con, connections)
+
+def close_connection(con, connections):
+    connections.discard(con)
+    con.close()
+
+# One table of a SQLite cache file. The file is put in WAL mode, where readers never block the writer
+# and the writer never blocks readers, and every write is a single IMMEDIATE transaction that waits
+# busy_timeout for the write lock, so several render processes can share the file without
+# 'database is locked' errors. Each thread keeps its own connection.
+class SqliteDict(BaseStorage):
+    def __init__(self, db_path, table_name, timeout=HTTP_CACHE_LOCK_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        self.table_name = table_name
+        self.timeout = timeout
+        self.bytes_written = 0
+        self._local = threading.local()
+        self._connections = set() # Open connections of all threads
+        self._create_table()
+
+    def connection(self):
+        holder = getattr(self._local, 'connection', None)
+        if holder is None:
+            # Only ever used by the thread that opened it, but closed by whichever thread releases it
+            con = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            con.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+            con.execute('PRAGMA synchronous = NORMAL') # Safe in WAL mode, a crash can only lose the last writes
+            holder = self._local.connection = ThreadConnection(con, self._connections)
+        return holder.con
+
+    # Close every thread's connection. A thread using the table afterwards opens a new one.
+    def close(self):
+        self._local = threading.local()
+        for con in list(self._connections):
+            close_connection(con, self._connections)
+
+    @contextmanager
+    def transaction(self):
+        con = self.connection()
+        con.execute('BEGIN IMMEDIATE') # Takes the write lock up front, a deferred upgrade can fail without waiting
+        try:
+            yield con
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+        con.execute('COMMIT')
+
+    # Tables of requests_cache's own SQLite backend only have key and value, the other columns are added
+    def _create_table(self):
+        con = self.connection()
+        con.execute('PRAGMA auto_vacuum = INCREMENTAL') # Only takes effect on a new file
+        if con.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            con.execute('PRAGMA journal_mode = WAL')
+        with self.transaction() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS `{self.table_name}` (key PRIMARY KEY, value, size INTEGER, used REAL, expires REAL)')
+            columns = [row[1] for row in con.execute(f'PRAGMA table_info(`{self.table_name}`)')]
+            if 'size' not in columns:
+                for column in ('size INTEGER', 'used REAL', 'expires REAL'):
+                    con.execute(f'ALTER TABLE `{self.table_name}` ADD COLUMN {column}')
+                con.execute(f'UPDATE `{self.table_name}` SET size = length(value), used = 0')
+
+    def _encode(self, item):
+        return item
+
+    def _decode(self, value):
+        return value
+
+    def __getitem__(self, key):
+        row = self.connection().execute(f'SELECT value, used FROM `{self.table_name}` WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        now = time.time()
+        if (row[1] or 0) < now - HTTP_CACHE_USED_RESOLUTION:
+            self.connection().execute(f'UPDATE `{self.table_name}` SET used = ? WHERE key = ?', (now, key))
+        return self._decode(row[0])
+
+    def __setitem__(self, key, item):
+        value = self._encode(item)
+        self.connection().execute(
+            f'INSERT OR REPLACE INTO `{self.table_name}` (key, value, size, used, expires) VALUES (?, ?, ?, ?, ?)',
+            (key, value, len(value), time.time(), expires_timestamp(item)))
+        self.bytes_written += len(value)
+
+    def __delitem__(self, key):
+        if not self.connection().execute(f'DELETE FROM `{self.table_name}` WHERE key = ?', (key,)).rowcount:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.connection().execute(f'SELECT 1 FROM `{self.table_name}` WHERE key = ?', (key,)).fetchone() is not None
+
+    def __iter__(self):
+        keys = [row[0] for row in self.connection().execute(f'SELECT key FROM `{self.table_name}`')]
+        return iter(keys)
+
+    def __len__(self):
+        return self.connection().execute(f'SELECT count(*) FROM `{self.table_name}`').fetchone()[0]
+
+    def clear(self):
+        self.connection().execute(f'DELETE FROM `{self.table_name}`')
+
+class SqlitePickleDict(SqliteDict):
+    def _encode(self, item):
+        return sqlite3.Binary(self.serialize(item))
+
+    def _decode(self, value):
+        return self.deserialize(value)
+
+# One table of a file cache: a file per key under <cache_dir>/<sha256[:2]>/<sha256>, a JSON header
+# line with the key and expiry followed by the value. Files are replaced atomically, so processes
+# sharing the directory never read a half-written entry and never wait for each other. The file's
+# mtime is its last use.
+class FileDict(BaseStorage):
+    def __init__(self, cache_dir, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_dir = cache_dir
+        self.bytes_written = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _encode(self, item):
+        return item.encode()
+
+    def _decode(self, value):
+        return value.decode()
+
+    def _read_header(self, path):
+        with open(path, 'rb') as file:
+            return json.loads(file.readline())
+
+    def __getitem__(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                header = json.loads(file.readline())
+                value = file.read()
+        except (OSError, ValueError):
+            raise KeyError(key)
+        if header.get('key') != key:
+            raise KeyError(key)
+        try:
+            if os.path.getmtime(path) < time.time() - HTTP_CACHE_USED_RESOLUTION:
+                os.utime(path)
+        except OSError:
+            pass
+        return self._decode(value)
+
+    def __setitem__(self, key, item):
+        value = self._encode(item)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(json.dumps({'key': key, 'expires': expires_timestamp(item)}).encode() + b'\n')
+                file.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            os.remove(tmp_path) # Windows refuses to replace a file another process has open, the entry is skipped
+            print(f'Could not cache {key}: {e}')
+            return
+        self.bytes_written += len(value)
+
+    def __delitem__(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def paths(self):
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if os.path.isdir(shard_dir):
+                for name in os.listdir(shard_dir):
+                    if not name.endswith('.tmp'):
+                        yield os.path.join(shard_dir, name)
+
+    def __iter__(self):
+        keys = []
+        for path in self.paths():
+            try:
+                keys.append(self._read_header(path)['key'])
+            except (OSError, ValueError, KeyError):
+                pass
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.paths())
+
+    def clear(self):
+        for path in self.paths():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class FilePickleDict(FileDict):
+    def _encode(self, item):
+        return self.serialize(item)
+
+    def _decode(self, value):
+        return self.deserialize(value)
+
+# Runs cache.evict() on a daemon thread, every interval seconds and whenever notify() is called after
+# writes, so requests never wait for an eviction pass. Started by the first notify(), ended by stop().
+class CacheEvictor:
+    def __init__(self, cache, interval=HTTP_CACHE_EVICT_INTERVAL):
+        self.cache = cache
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def notify(self):
+        with self._lock:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='http-cache-evictor', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.clear()
+            try:
+                self.cache.evict()
+            except Exception as e:
+                print(f'HTTP cache eviction failed: {e}')
+            self._wake.wait(self.interval)
+
+# requests_cache backend with a size limit: evict() drops expired responses and then the least
+# recently used ones until the cache is down to HTTP_CACHE_EVICT_TO of max_bytes. Backends list
+# their responses with entries().
+class BoundedCache(BaseCache, ABC):
+    def __init__(self, max_bytes=HTTP_CACHE_MAX_BYTES, evict_interval=HTTP_CACHE_EVICT_INTERVAL, **kwargs):
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.evictor = CacheEvictor(self, evict_interval)
+        self._evicted_at = None # responses.bytes_written when the evictor was last woken up
+
+    # The first write starts the evictor, later ones wake it up once another (1 - HTTP_CACHE_EVICT_TO)
+    # of max_bytes has been written
+    def save_response(self, key, response, expire_after=None):
+        super().save_response(key, response, expire_after)
+        written = self.responses.bytes_written
+        if self._evicted_at is None or self.max_bytes and written - self._evicted_at >= self.max_bytes * (1 - HTTP_CACHE_EVICT_TO):
+            self._evicted_at = written
+            self.evictor.notify()
+
+    # [(key, size, used, expires)] of every cached response
+    @abstractmethod
+    def entries(self):
+        pass
+
+    def drop(self, keys):
+        for key in keys:
+            self.delete(key)
+
+    # Keys to drop: the expired responses, then the least recently used ones while over max_bytes
+    def eviction_keys(self, entries):
+        now = time.time()
+        expired = [key for key, size, used, expires in entries if expires is not None and expires < now]
+        live = sorted((entry for entry in entries if entry[3] is None or entry[3] >= now), key=lambda entry: entry[2] or 0)
+        total = sum(entry[1] or 0 for entry in live)
+        lru = []
+        if self.max_bytes and total > self.max_bytes:
+            for key, size, used, expires in live:
+                if total <= self.max_bytes * HTTP_CACHE_EVICT_TO:
+                    break
+                lru.append(key)
+                total -= size or 0
+        return expired + lru
+
+    def evict(self):
+        keys = self.eviction_keys(self.entries())
+        if keys:
+            self.drop(keys)
+            self.evictions += len(keys)
+        return keys
+
+    def stats(self):
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(entry[1] or 0 for entry in entries), 'evictions': self.evictions}
+
+    # Stop the evictor and release what the storages hold open
+    def close(self):
+        self.evictor.stop()
+        for storage in (self.responses, self.redirects):
+            if hasattr(storage, 'close'):
+                storage.close()
+
+# SQLite backend, one <cache_name>.sqlite file (compatible with the file requests_cache creates)
+class SqliteCache(BoundedCache):
+    def __init__(self, cache_name='http_cache', timeout=HTTP_CACHE_LOCK_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        db_path = os.path.abspath(cache_name if '.' in os.path.basename(cache_name) else f'{cache_name}.sqlite')
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.responses = SqlitePickleDict(db_path, 'responses', timeout, suppress_warnings=True)
+        self.redirects = SqliteDict(db_path, 'redirects', timeout, suppress_warnings=True)
+
+    def entries(self):
+        return self.responses.connection().execute('SELECT key, size, used, expires FROM `responses`').fetchall()
+
+    # One transaction for the whole pass, redirects to dropped responses go with them
+    def drop(self, keys):
+        with self.responses.transaction() as con:
+            con.executemany('DELETE FROM `responses` WHERE key = ?', [(key,) for key in keys])
+            con.execute('DELETE FROM `redirects` WHERE value NOT IN (SELECT key FROM `responses`)')
+        self.responses.connection().execute('PRAGMA incremental_vacuum') # Gives the freed pages back, if the file allows it
+
+# Sharded filesystem backend under <cache_name>/responses and <cache_name>/redirects
+class FileCache(BoundedCache):
+    def __init__(self, cache_name='http_cache', **kwargs):
+        super().__init__(**kwargs)
+        self.cache_dir = cache_name
+        self.responses = FilePickleDict(os.path.join(cache_name, 'responses'), suppress_warnings=True)
+        self.redirects = FileDict(os.path.join(cache_name, 'redirects'), suppress_warnings=True)
+
+    def entries(self):
+        entries = []
+        for path in self.responses.paths():
+            try:
+                header = self.responses._read_header(path)
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                continue
+            entries.append((header.get('key'), stat.st_size, stat.st_mtime, header.get('expires')))
+        return entries
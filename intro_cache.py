@@ -0,0 +1,158 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from compilation import probe_streams, write_concat_list, level_args, AUDIO_COPY_KEYS, VIDEO_COPY_KEYS, X264_PROFILES
+from utils import run_and_log
+from video_writer import CRF_OUTPUT_VIDEO, encoder_args
+
+INTRO_DIR = 'resources/intro'
+INTRO_CACHE_DIR = 'video/intro_cache' # Outlives a job, unlike the rest of video/. Bounded by evict_intros
+INTRO_CONCAT_LIST = 'intro_concat.txt' # Written next to the reel
+INTRO_CACHE_MAX_BYTES = 512 * 1024 * 1024
+INTRO_CACHE_MAX_AGE = 30 * 24 * 60 * 60 # Seconds since an entry was last used
+INTRO_CACHE_IN_USE = 60 * 60 # Entries used this recently may be about to be joined by a running job, they are never evicted
+
+INTRO_ASPECTS = {'16_9': 16 / 9, '9_16': 9 / 16, '1_1': 1.0}
+INTRO_COLORS = ('red', 'orange', 'blue')
+INTRO_COLOR_DEFAULT = 'blue'
+
+# Colour of the bumper a job asked for with encoding_params['intro'], None if it wants none
+def intro_color(encoding_params=None):
+    color = (encoding_params or {}).get('intro')
+    if not color:
+        return None
+    if color is True:
+        return INTRO_COLOR_DEFAULT
+    if color not in INTRO_COLORS:
+        print(f"No '{color}' intro, using {INTRO_COLOR_DEFAULT}.")
+        return INTRO_COLOR_DEFAULT
+    return color
+
+# Bumper aspect closest to a width x height video
+def intro_aspect(width, height):
+    return min(INTRO_ASPECTS, key=lambda aspect: abs(math.log(width / height / INTRO_ASPECTS[aspect])))
+
+def intro_source(aspect, color):
+    return os.path.join(INTRO_DIR, f'intro_{aspect}_{color}.mp4')
+
+# Everything a cached bumper depends on: the source file as it is on disk, the stream parameters of the
+# reel that intro_command copies (those stream copy needs to match) and the encoder settings. Any change
+# gives a new key, and so a new transcode.
+def intro_profile(source, reference, encoding_params, audio_bitrate):
+    stat = os.stat(source)
+    video = reference['video']
+    audio = reference['audio']
+    profile = {
+        'source': [os.path.abspath(source), stat.st_size, stat.st_mtime_ns],
+        'video': [str(video.get(key)) for key in VIDEO_COPY_KEYS],
+        'audio': [str(audio[0].get(key)) for key in AUDIO_COPY_KEYS] if audio else None,
+        'audio_streams': len(audio),
+        'crf': encoding_params.get('crf', CRF_OUTPUT_VIDEO),
+        'video_bitrate': encoding_params.get('video_bitrate'),
+        'audio_bitrate': audio_bitrate if audio else None,
+    }
+    return hashlib.sha1(json.dumps(profile, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+# Remove entries (and .part files of crashed transcodes) unused for max_age, then the least recently
+# used ones while the cache is larger than max_bytes. Anything used within in_use is kept, as is keep.
+def evict_intros(cache_dir=INTRO_CACHE_DIR, keep=None, max_bytes=INTRO_CACHE_MAX_BYTES, max_age=INTRO_CACHE_MAX_AGE, in_use=INTRO_CACHE_IN_USE):
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue # Evicted by another job meanwhile
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    now = time.time()
+    total_bytes = sum(size for _, size, _ in entries)
+    for used, size, path in sorted(entries):
+        if path == keep or now - used < in_use:
+            continue
+        if now - used > max_age or total_bytes > max_bytes:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            print(f'Evicted cached intro {path}')
+
+def channel_layout(channels):
+    return {1: 'mono', 2: 'stereo'}.get(int(channels), f'{channels}c')
+
+# Transcode a bumper to exactly the stream parameters of reference: its size (scaled to cover and
+# center-cropped), frame rate, pixel format, H.264 profile and level and timescale, with silent audio tracks
+# in the reference's audio format, one per audio stream of the reel.
+def intro_command(source, output_filename, reference, encoding_params, audio_bitrate):
+    video = reference['video']
+    w, h = video['width'], video['height']
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', source]
+    audio = reference['audio']
+    if audio:
+        cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={audio[0]['sample_rate']}:cl={channel_layout(audio[0]['channels'])}"]
+
+    cmd += ['-map', '0:v:0',
+            '-vf', f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h},setsar=1,fps={video['r_frame_rate']},format={video['pix_fmt']}"]
+    cmd += encoder_args(encoding_params.get('crf', CRF_OUTPUT_VIDEO), encoding_params.get('video_bitrate'))
+    cmd += ['-profile:v', X264_PROFILES[video['profile']], '-video_track_timescale', video['time_base'].split('/')[-1]]
+    cmd += level_args(video)
+    for _ in audio:
+        cmd += ['-map', '1:a']
+    if audio:
+        cmd += ['-c:a', audio[0]['codec_name'], '-b:a', audio_bitrate, '-shortest']
+    return cmd + ['-f', 'mp4', output_filename]
+
+# Bumper for reference's stream parameters, from the cache or transcoded into it. A use refreshes the
+# entry's mtime, which evict_intros goes by.
+def cached_intro(color, reference, encoding_params, audio_bitrate, cache_dir=INTRO_CACHE_DIR):
+    aspect = intro_aspect(reference['video']['width'], reference['video']['height'])
+    source = intro_source(aspect, color)
+    if not os.path.exists(source):
+        print(f'Intro {source} not found.')
+        return None
+
+    key = intro_profile(source, reference, encoding_params, audio_bitrate)
+    cached = os.path.join(cache_dir, f'intro_{aspect}_{color}_{key}.mp4')
+    try:
+        os.utime(cached)
+        print(f'Using cached intro {cached}')
+        return cached
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    tmp_filename = f'{cached}.{os.getpid()}.{threading.get_ident()}.part' # Jobs transcoding the same bumper each write their own
+    if run_and_log(intro_command(source, tmp_filename, reference, encoding_params, audio_bitrate), msg=f'transcode intro {source}') != 0:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return None
+    os.replace(tmp_filename, cached) # A failed or concurrent transcode never leaves a half-written entry behind
+    evict_intros(cache_dir, keep=cached)
+    return cached
+
+# Put the bumper in front of mp4_filename in place, joined by stream copy. Returns False and leaves the
+# reel as it was when no bumper could be prepared for it.
+def prepend_intro(mp4_filename, color, encoding_params, audio_bitrate):
+    reference = probe_streams(mp4_filename)
+    video = reference['video']
+    if video is None or video.get('codec_name') != 'h264' or video.get('profile') not in X264_PROFILES:
+        print(f'Cannot prepend an intro to {mp4_filename}.')
+        return False
+
+    intro = cached_intro(color, reference, encoding_params, audio_bitrate)
+    if intro is None:
+        return False
+
+    tmp_filename = f'{os.path.splitext(mp4_filename)[0]}_intro.mp4'
+    concat_list = write_concat_list([intro, mp4_filename], os.path.join(os.path.dirname(mp4_filename), INTRO_CONCAT_LIST))
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list,
+           '-map', '0', '-c', 'copy', '-movflags', '+faststart', tmp_filename]
+    if run_and_log(cmd, msg='ffmpeg prepend intro') != 0:
+        return False
+    os.replace(tmp_filename, mp4_filename)
+    return True
@@ -0,0 +1,56 @@
+import numpy as np
+from compositing import blend_premultiplied
+
+# A static graphic block (scoreboard, intro or action) rasterized once per clip.
+# Colors are stored premultiplied by alpha and cropped to the bounding box of the
+# block, so blending it onto a frame only touches that region.
+class OverlayLayer:
+    def __init__(self, bgra, mask, x, y):
+        self.bgra = bgra # Premultiplied BGRA
+        self.mask = mask # True where the layer covers the frame
+        self.x = x
+        self.y = y
+        self.width = bgra.shape[1]
+        self.height = bgra.shape[0]
+
+        # Kept in uint16 so the per-frame blend never has to convert them again
+        self.bgr = bgra[:, :, :3].astype(np.uint16)
+        self.inv_alpha = (255 - bgra[:, :, 3:]).astype(np.uint16)
+
+    def bounds(self):
+        return self.x, self.y, self.x + self.width, self.y + self.height
+
+# Recover a premultiplied layer from the same graphic drawn onto a black and onto a white canvas.
+# Every primitive (filled shapes, anti-aliased text, alpha-pasted logos, addWeighted) is a linear
+# blend with the background, so the difference between the two renders is the transparency.
+def layer_from_canvases(on_black, on_white):
+    diff = on_white.astype(np.int16) - on_black.astype(np.int16)
+    alpha = 255 - np.clip(np.rint(diff.mean(axis=2)), 0, 255).astype(np.uint8)
+    mask = alpha > 0
+
+    if not mask.any():
+        return None
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    y0, y1 = rows[0], rows[-1] + 1
+    x0, x1 = cols[0], cols[-1] + 1
+
+    bgra = np.dstack((on_black[y0:y1, x0:x1], alpha[y0:y1, x0:x1]))
+    return OverlayLayer(np.ascontiguousarray(bgra), mask[y0:y1, x0:x1], int(x0), int(y0))
+
+# Rasterize a block by calling draw(canvas) -> canvas on a black and on a white canvas
+def render_layer(draw, width, height):
+    on_black = draw(np.zeros((height, width, 3), dtype=np.uint8))
+    on_white = draw(np.full((height, width, 3), 255, dtype=np.uint8))
+    return layer_from_canvases(on_black, on_white)
+
+# Alpha-blend a premultiplied layer onto a BGR frame in place: out = layer + frame * (1 - alpha)
+def blend_layer(frame, layer):
+    if layer is None:
+        return frame
+
+    x0, y0, x1, y1 = layer.bounds()
+    blend_premultiplied(frame[y0:y1, x0:x1], layer.bgr, layer.inv_alpha)
+
+    return frame
@@ -0,0 +1,145 @@
+import numpy as np
+from collections import namedtuple
+from asset_cache import FIT_STRETCH
+
+BLOCKS = ('scoreboard', 'intro', 'action')
+
+# Draw operations of a compiled layout, all positions are resolved to integer pixels.
+# They are immutable and hashable so identical blocks can share a rasterized layer.
+RectOp = namedtuple('RectOp', ['top_left', 'bottom_right', 'color', 'opacity'])
+TextOp = namedtuple('TextOp', ['text', 'origin', 'font_scale', 'color', 'thickness'])
+LogoOp = namedtuple('LogoOp', ['logo', 'center', 'size', 'fit'])
+PolygonOp = namedtuple('PolygonOp', ['points', 'color'])
+
+# Display list of a template for one resolution and one clip_meta entry, one tuple of ops per block
+LayoutPlan = namedtuple('LayoutPlan', ['width', 'height', 'scoreboard', 'intro', 'action'])
+
+# Pixel corners of a rectangle given as fractional offsets of the frame, grown to fit the longest text
+def rect_box(ctx, x_offset, y_offset, end_x=1, end_y=1, text=[], font_scale=1, grow=""):
+    width, height = ctx.width, ctx.height
+    # If rectangle is centered both horiz. and vert.
+    if (end_x == 1 and end_y == 1):
+        top_left = int(width * x_offset), int(height * y_offset)
+        bottom_right = (int(width - top_left[0]), int(height - top_left[1]))
+    # If rectangle is offcenter both horiz. and vert.
+    elif (end_x != 1 and end_y != 1):
+        top_left = int(width * x_offset), int(height * y_offset)
+        bottom_right = (int(width * end_x), int(height * end_y))
+    # If rectangle is centered only horizontally
+    elif (end_y != 1):
+        top_left = (int(width * x_offset), int(height * y_offset))
+        bottom_right = (int(width - top_left[0]), int(height * end_y))
+
+    if text:
+        text_size = ctx.text_size(max(text, key=len), ((bottom_right[1]-top_left[1])*font_scale)/22, 2)
+        text_width = int(text_size[0][0])
+        new_top_left = ["",""]
+        new_bottom_right = ["",""]
+        new_top_left[1] = top_left[1]
+        new_bottom_right[1] = bottom_right[1]
+        if grow == "":
+            if (end_x == 1 and end_y == 1):
+                if len(text) == 2:
+                    new_top_left[0] = int(top_left[0] - text_width)
+                    new_bottom_right[0] = int(bottom_right[0] + text_width)
+                else:
+                    new_top_left[0] = int(top_left[0] - text_width/2)
+                    new_bottom_right[0] = int(bottom_right[0] + text_width/2)
+            elif (end_y != 1):
+                if len(text) == 2:
+                    new_top_left[0] = int(top_left[0] - text_width)
+                    new_bottom_right[0] = int(bottom_right[0] + text_width)
+                else:
+                    new_top_left[0] = int(top_left[0] - text_width/2)
+                    new_bottom_right[0] = int(bottom_right[0] + text_width/2)
+            elif (end_x != 1 and end_y != 1):
+                    new_top_left = top_left[0]
+                    new_bottom_right[0] = int(bottom_right[0] + text_width/2)
+        elif grow == "left":
+            new_top_left[0] = int(top_left[0] - text_width)
+            new_bottom_right[0] = bottom_right[0]
+        else:
+            new_top_left[0] = top_left[0]
+            new_bottom_right[0] = int(bottom_right[0] + text_width)
+
+        top_left = tuple(new_top_left)
+        bottom_right = tuple(new_bottom_right)
+
+    return top_left, bottom_right
+
+# Pixel center of the area given as fractional offsets, shifted left by a fraction (position) of its width
+def center_point(ctx, x_offset, y_offset, end_x=1, end_y=1, position=0):
+    width, height = ctx.width, ctx.height
+    if (end_x == 1 and end_y == 1):
+        center_w = int(width / 2)
+        center_h = int(height / 2)
+        if position != 0:
+            w_offset = int((width - 2*(x_offset*width))*position)
+            center_w = center_w - w_offset
+    elif (end_x != 1 and end_y != 1):
+        center_w = int(width*x_offset + ((width*end_x - width*x_offset)/2))
+        center_h = int(height*y_offset + ((height*end_y - height*y_offset)/2))
+        if position != 0:
+            w_offset = int((width*end_x - width*x_offset)*position)
+            center_w = center_w - w_offset
+    elif (end_y != 1):
+        center_w = int(width / 2)
+        center_h = int(height*y_offset + ((height*end_y - height*y_offset)/2))
+        if position != 0:
+            w_offset = int((width - 2*(x_offset*width))*position)
+            center_w = center_w - w_offset
+
+    return center_w, center_h
+
+# Origin (bottom-left corner) of a text centered on center_w, center_h
+def text_origin(ctx, text, center, font_scale, thickness):
+    text_size, _ = ctx.text_size(text, font_scale, thickness)
+    return (int(center[0] - text_size[0] / 2), int(center[1] + text_size[1] / 2))
+
+# Vertices of a diamond centered on fractional offsets, length is a fraction of the frame height
+def diamond_vertices(ctx, x_offset, y_offset, length_offset):
+    center_x = x_offset * ctx.width
+    center_y = y_offset * ctx.height
+    length = length_offset * ctx.height
+
+    top_left = (center_x - length, center_y - length)
+    bottom_right = (center_x + length, center_y + length)
+    vertices = [(center_x + length, center_y), (center_x, center_y + length), (center_x - length, center_y), (center_x, center_y - length)]
+
+    return vertices, top_left, bottom_right
+
+# Mirrors the generate_* primitives of graphics.py, but records a draw op instead of drawing.
+# Templates call it once per block to produce the display list of a LayoutPlan.
+class LayoutCompiler:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.blocks = {block: [] for block in BLOCKS}
+        self.ops = None
+
+    def begin(self, block):
+        self.ops = self.blocks[block]
+
+    def rect(self, x_offset, y_offset, end_x=1, end_y=1, color=(255, 255, 255), text=[], font_scale=1, grow="", opacity=1):
+        top_left, bottom_right = rect_box(self.ctx, x_offset, y_offset, end_x, end_y, text, font_scale, grow)
+        self.ops.append(RectOp(top_left, bottom_right, tuple(color), opacity))
+        return top_left, bottom_right, bottom_right[1]-top_left[1] # Return top_left, bottom_right and height of rect.
+
+    def text(self, text, x_offset, y_offset, end_x=1, end_y=1, position=0, color=(0,0,0), thickness=2, rect_h=0, font_scale=1):
+        center = center_point(self.ctx, x_offset, y_offset, end_x, end_y, position)
+        if rect_h != 0:
+            font_scale = (rect_h)/22 # Scale the font, 22 meaning the standard size of the font in pixels
+        self.ops.append(TextOp(text, text_origin(self.ctx, text, center, font_scale, thickness), font_scale, tuple(color), thickness))
+
+    def logo(self, logo, logo_w, logo_h, x_offset, y_offset, end_x=1, end_y=1, position=0, fit=FIT_STRETCH):
+        center = center_point(self.ctx, x_offset, y_offset, end_x, end_y, position)
+        self.ops.append(LogoOp(logo, center, (logo_w, logo_h), fit))
+
+    def diamond(self, x_offset, y_offset, length_offset, rotation=45, color=(255, 255, 255)):
+        vertices, top_left, bottom_right = diamond_vertices(self.ctx, x_offset, y_offset, length_offset)
+        # Integer vertices on the same pixels as compositing.fill_polygon
+        points = tuple(tuple(int(v) for v in point) for point in np.floor(vertices))
+        self.ops.append(PolygonOp(points, tuple(color)))
+        return top_left, bottom_right
+
+    def plan(self):
+        return LayoutPlan(self.ctx.width, self.ctx.height, *(tuple(self.blocks[block]) for block in BLOCKS))
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from session_manager import asset_session
+from variants import WORK_DIR
+
+PROBE_CACHE_DIR = 'video/probe_cache' # Kept between jobs, entries are never stale as the key changes with the file
+PROBE_CACHE_MAX_ENTRIES = 512 # Results kept in memory
+PROBE_CACHE_MAX_FILES = 2048 # Results kept on disk
+PROBE_WORKERS = 8
+PROBE_HEAD_TIMEOUT = 5
+
+def is_url(path):
+    return isinstance(path, str) and path.split(':', 1)[0] in ('http', 'https')
+
+# "30000/1001" -> 29.97, None for 0/0 or N/A
+def parse_rate(rate):
+    try:
+        num, _, den = str(rate).partition('/')
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value or None
+
+# Everything about a media file the pipeline asks for, from run_ffprobe: all streams, the format,
+# and the video packets, which give an exact frame count and the keyframe positions without decoding.
+class MediaInfo:
+    def __init__(self, data):
+        self.data = data
+        streams = data.get('streams', [])
+        video = [stream for stream in streams if stream.get('codec_type') == 'video']
+        self.video = video[0] if video else None
+        self.audio = [stream for stream in streams if stream.get('codec_type') == 'audio']
+        self.format = data.get('format', {})
+        self.keyframe_times = data.get('keyframe_times', [])
+
+        video = self.video or {}
+        self.width = video.get('width')
+        self.height = video.get('height')
+        self.fps = parse_rate(video.get('avg_frame_rate')) or parse_rate(video.get('r_frame_rate'))
+        self.duration = float(self.format.get('duration') or video.get('duration') or 0)
+        self.frame_count = data.get('frame_count') or int(video.get('nb_frames') or 0) or round(self.duration * (self.fps or 0))
+
+    # Keyframe positions as frame indices, the first keyframe being frame 0
+    def keyframe_indices(self, fps=None):
+        fps = fps or self.fps
+        if not self.keyframe_times or not fps:
+            return [0]
+        return sorted({round((t - self.keyframe_times[0]) * fps) for t in self.keyframe_times})
+
+    # The {'video', 'audio'} layout of compilation.probe_streams
+    def streams(self):
+        return {'video': self.video, 'audio': self.audio}
+
+# One ffprobe run for streams, format and packets. Only stream_index, pts_time and flags are printed
+# per packet, and only the first video stream's packets are kept: they give an exact frame count and
+# the keyframe positions without decoding.
+def run_ffprobe(path):
+    output = subprocess.check_output(
+        ['ffprobe',
+         '-v', 'error',
+         '-show_entries', 'stream:format:packet=stream_index,pts_time,flags',
+         '-of', 'json',
+         path]
+    )
+    probe = json.loads(output)
+    streams = probe.get('streams', [])
+    video = [stream for stream in streams if stream.get('codec_type') == 'video']
+    video_index = video[0].get('index') if video else None
+    packets = [packet for packet in probe.get('packets', []) if packet.get('stream_index') == video_index]
+
+    keyframe_times = []
+    for packet in packets:
+        if 'K' in packet.get('flags', ''):
+            try:
+                keyframe_times.append(float(packet['pts_time']))
+            except (KeyError, ValueError):
+                pass
+    return {
+        'streams': streams,
+        'format': probe.get('format', {}),
+        'frame_count': len(packets),
+        'keyframe_times': sorted(keyframe_times),
+    }
+
+# Identifies a version of a file: path, size and mtime locally, the server's validators for a URL.
+# None when a URL gives no validators, it is then probed every time.
+def probe_key(path):
+    if is_url(path):
+        try:
+            headers = asset_session.head(path, allow_redirects=True, timeout=PROBE_HEAD_TIMEOUT).headers
+        except requests.RequestException:
+            return None
+        validators = [headers.get(name) for name in ('ETag', 'Last-Modified', 'Content-Length')]
+        if not any(validators[:2]):
+            return None
+        identity = [path] + validators
+    else:
+        stat = os.stat(path)
+        identity = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha1(json.dumps(identity).encode()).hexdigest()
+
+# Process-wide probe results, the most recently used max_entries kept in memory. Results for files
+# outside the work directory (sources, URLs) are also persisted as one JSON file per key so later jobs
+# skip ffprobe for them, at most max_files of them, evicting the least recently used. A job's own
+# clips and outputs are deleted by clean_up, so they are never written out.
+# Concurrent requests for the same file share a single ffprobe run.
+class ProbeCache:
+    def __init__(self, cache_dir=PROBE_CACHE_DIR, max_entries=PROBE_CACHE_MAX_ENTRIES, max_files=PROBE_CACHE_MAX_FILES, work_dir=WORK_DIR):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self.work_dir = os.path.abspath(work_dir)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> MediaInfo, least recently used first
+        self._lock = threading.Lock()
+        self._loading = {} # key -> lock
+
+    def _persistent(self, path):
+        return is_url(path) or not os.path.abspath(path).startswith(self.work_dir + os.sep)
+
+    def _lookup(self, key):
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return info
+
+    def _store(self, key, info):
+        with self._lock:
+            self._entries[key] = info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _load(self, key):
+        path = os.path.join(self.cache_dir, f'{key}.json')
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path) # The mtime is the last use, which _evict_files goes by
+        except OSError:
+            pass
+        return data
+
+    def _save(self, key, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, f'{key}.json')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+        self._evict_files()
+
+    # Remove the least recently used files beyond max_files. Other processes may remove some meanwhile.
+    def _evict_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            try:
+                files.append((os.stat(os.path.join(self.cache_dir, name)).st_mtime, name))
+            except OSError:
+                continue
+        for _, name in sorted(files)[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            with self._lock:
+                self.evictions += 1
+
+    # MediaInfo of path, raises if it cannot be probed
+    def probe(self, path):
+        key = probe_key(path)
+        if key is None:
+            return MediaInfo(run_ffprobe(path))
+
+        info = self._lookup(key)
+        if info is not None:
+            return info
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+                info = self._lookup(key) # Probed by another thread while this one waited
+                if info is None:
+                    persistent = self._persistent(path)
+                    data = self._load(key) if persistent else None
+                    if data is None:
+                        with self._lock:
+                            self.misses += 1
+                        data = run_ffprobe(path)
+                        if persistent:
+                            self._save(key, data)
+                    else:
+                        with self._lock:
+                            self.hits += 1
+                    info = MediaInfo(data)
+                    self._store(key, info)
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+        return info
+
+    # Probe several files at once, returning MediaInfo or the exception for each, in order
+    def probe_all(self, paths, workers=PROBE_WORKERS):
+        def probe_or_error(path):
+            try:
+                return self.probe(path)
+            except Exception as e:
+                return e
+
+        paths = list(paths)
+        if len(paths) < 2:
+            return [probe_or_error(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            return list(pool.map(probe_or_error, paths))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._entries)}
+
+probe_cache = ProbeCache()
@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+
+PIPELINE_QUEUE_SIZE = 8
+STAGES = ('decode', 'composite', 'encode')
+
+_END = object() # Sent down the queues after the last frame
+
+class PipelineError(Exception):
+    def __init__(self, stage, error):
+        super().__init__(f'{stage} stage failed: {error!r}')
+        self.stage = stage
+        self.error = error
+
+# Reusable frame buffers, so decoding does not allocate a new full frame every time.
+# The pool is bounded as well, which caps the number of frames in flight.
+class FramePool:
+    def __init__(self, size):
+        self._free = queue.Queue(maxsize=size)
+        self.size = size
+        for _ in range(size):
+            self._free.put(None) # Buffers are allocated lazily by the decoder on first use
+
+    def acquire(self, timeout=None):
+        return self._free.get(timeout=timeout)
+
+    def release(self, buf):
+        self._free.put_nowait(buf)
+
+# Time each stage spends doing work (busy) versus waiting on its neighbours
+class PipelineStats:
+    def __init__(self):
+        self.busy = {stage: 0.0 for stage in STAGES}
+        self.frames = {stage: 0 for stage in STAGES}
+        self.wall_time = 0.0
+
+    def add(self, stage, seconds):
+        self.busy[stage] += seconds
+        self.frames[stage] += 1
+
+    # Stage with the most busy time, i.e. the one limiting throughput
+    def bottleneck(self):
+        return max(STAGES, key=lambda stage: self.busy[stage])
+
+    def summary(self):
+        parts = []
+        for stage in STAGES:
+            share = self.busy[stage] / self.wall_time * 100 if self.wall_time else 0.0
+            parts.append(f'{stage} {self.busy[stage]:.2f}s ({share:.0f}%)')
+        fps = self.frames['encode'] / self.wall_time if self.wall_time else 0.0
+        return f"{self.frames['encode']} frames in {self.wall_time:.2f}s ({fps:.1f} fps), busy: {', '.join(parts)}, bottleneck: {self.bottleneck()}"
+
+# Run decode -> composite -> encode in three threads connected by bounded queues.
+#   read(buf) -> (ok, frame): decode the next frame, into buf if possible (buf is None until the pool has warmed up)
+#   composite(frame, n): draw onto frame n in place, or return something else for write() to encode
+#   write(frame): encode the frame, or whatever composite returned for it
+# A full queue blocks the stage before it (backpressure). An exception in any stage stops all of
+# them and is raised as PipelineError once every thread has exited.
+def run_pipeline(read, composite, write, queue_size=PIPELINE_QUEUE_SIZE):
+    decoded = queue.Queue(maxsize=queue_size)
+    composited = queue.Queue(maxsize=queue_size)
+    pool = FramePool(2 * queue_size + 3) # Both queues full plus one frame held by each stage
+    stats = PipelineStats()
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def fail(stage, error):
+        errors.append(PipelineError(stage, error))
+        stop.set()
+
+    def decode_stage():
+        try:
+            n = 0
+            while not stop.is_set():
+                try:
+                    buf = pool.acquire(timeout=0.1)
+                except queue.Empty:
+                    continue
+                t = time.perf_counter()
+                ok, frame = read(buf)
+                if not ok:
+                    break
+                stats.add('decode', time.perf_counter() - t)
+                if not put(decoded, (n, frame)):
+                    return
+                n += 1
+            put(decoded, _END)
+        except Exception as e:
+            fail('decode', e)
+
+    def composite_stage():
+        try:
+            while True:
+                item = get(decoded)
+                if item is _END:
+                    break
+                n, frame = item
+                t = time.perf_counter()
+                result = composite(frame, n)
+                stats.add('composite', time.perf_counter() - t)
+                if not put(composited, (frame, frame if result is None else result)):
+                    return
+            put(composited, _END)
+        except Exception as e:
+            fail('composite', e)
+
+    def encode_stage():
+        try:
+            while True:
+                item = get(composited)
+                if item is _END:
+                    break
+                frame, result = item
+                t = time.perf_counter()
+                write(result)
+                stats.add('encode', time.perf_counter() - t)
+                pool.release(frame)
+        except Exception as e:
+            fail('encode', e)
+
+    t_start = time.perf_counter()
+    threads = [threading.Thread(target=target, name=f'pipeline-{stage}', daemon=True)
+               for stage, target in zip(STAGES, (decode_stage, composite_stage, encode_stage))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.wall_time = time.perf_counter() - t_start
+
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,192 @@
+import sys
+import threading
+import time
+
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats'] # key=value blocks on stdout, every -stats_period (0.5s)
+PROGRESS_STALL_SECONDS = 10 # No new frame or output time for this long marks an encode as stalled
+PROGRESS_LOG_INTERVAL = 5 # Seconds between progress lines when the console is not a terminal
+
+def parse_float(value):
+    try:
+        return float(value.strip().rstrip('x').replace('kbits/s', ''))
+    except (AttributeError, ValueError):
+        return None # ffmpeg reports N/A until it has a value
+
+def parse_int(value):
+    value = parse_float(value)
+    return None if value is None else int(value)
+
+# One -progress block of an ffmpeg process, plus what can be derived from it. percent and eta_s are
+# None unless the expected length (duration_s or total_frames) of the output is known.
+class ProgressEvent:
+    def __init__(self, label, values, elapsed_s, duration_s=None, total_frames=None, stalled=False):
+        self.label = label
+        self.frame = parse_int(values.get('frame'))
+        self.fps = parse_float(values.get('fps'))
+        out_time_us = parse_int(values.get('out_time_us'))
+        self.out_time_s = None if out_time_us is None or out_time_us < 0 else out_time_us / 1e6
+        self.speed = parse_float(values.get('speed'))
+        self.total_size = parse_int(values.get('total_size'))
+        self.bitrate_kbps = parse_float(values.get('bitrate'))
+        self.done = values.get('progress') == 'end'
+        self.elapsed_s = elapsed_s
+        self.stalled = stalled
+        self.duration_s = duration_s
+        self.total_frames = total_frames
+
+        self.percent = None
+        self.eta_s = None
+        if total_frames and self.frame is not None:
+            self.percent = min(100.0, 100.0 * self.frame / total_frames)
+            rate = self.frame / elapsed_s if elapsed_s > 0 else 0
+            if rate > 0:
+                self.eta_s = max(total_frames - self.frame, 0) / rate
+        elif duration_s and self.out_time_s is not None:
+            self.percent = min(100.0, 100.0 * self.out_time_s / duration_s)
+            rate = self.speed or (self.out_time_s / elapsed_s if elapsed_s > 0 else 0)
+            if rate > 0:
+                self.eta_s = max(duration_s - self.out_time_s, 0) / rate
+        if self.done:
+            self.percent, self.eta_s = 100.0, 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+# Process-wide fan-out of progress events to the registered callbacks. A failing callback is
+# reported and skipped, it never breaks the encode it is watching.
+class ProgressMonitor:
+    def __init__(self):
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def publish(self, event):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f'Progress callback {callback} failed: {e}')
+
+progress_monitor = ProgressMonitor()
+
+# Reads an ffmpeg -progress stream (text lines) and publishes an event per block. Call watch() to
+# read it on a daemon thread, join() once the process has exited.
+class ProgressReader:
+    def __init__(self, stream, label, duration_s=None, total_frames=None, monitor=progress_monitor):
+        self.stream = stream
+        self.label = label
+        self.duration_s = duration_s
+        self.total_frames = total_frames
+        self.monitor = monitor
+        self.last_event = None
+        self.other_output = [] # stdout lines that are not progress, e.g. ffmpeg writing to pipe:1 itself
+        self._thread = None
+
+    def watch(self):
+        self._thread = threading.Thread(target=self.read, name=f'progress-{self.label}', daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def read(self):
+        t_start = time.monotonic()
+        last_change = t_start
+        last_position = None
+        values = {}
+        for line in self.stream:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            key, sep, value = line.strip().partition('=')
+            if not sep:
+                if line.strip():
+                    self.other_output.append(line.rstrip())
+                continue
+            values[key] = value
+            if key != 'progress':
+                continue
+
+            now = time.monotonic()
+            position = (values.get('frame'), values.get('out_time_us'))
+            if position != last_position:
+                last_position, last_change = position, now
+            stalled = value != 'end' and now - last_change >= PROGRESS_STALL_SECONDS
+            self.last_event = ProgressEvent(self.label, values, now - t_start, self.duration_s, self.total_frames, stalled)
+            self.monitor.publish(self.last_event)
+            values = {}
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}' if seconds >= 3600 else f'{seconds // 60:02d}:{seconds % 60:02d}'
+
+# Console view of every running encode. On a terminal one line is redrawn in place, otherwise (log
+# files, the render farm) each encode gets a line every PROGRESS_LOG_INTERVAL seconds and when it ends.
+class ConsoleProgressBar:
+    def __init__(self, stream=None, width=20, interval=PROGRESS_LOG_INTERVAL):
+        self.stream = stream or sys.stderr
+        self.width = width
+        self.interval = interval
+        self.active = {} # label -> latest event
+        self._last_logged = {}
+        self._lock = threading.Lock()
+
+    def describe(self, event):
+        parts = [event.label]
+        if event.percent is not None:
+            filled = int(self.width * event.percent / 100)
+            parts.append(f"[{'#' * filled}{'.' * (self.width - filled)}] {event.percent:5.1f}%")
+        if event.frame is not None:
+            parts.append(f'frame {event.frame}')
+        if event.fps:
+            parts.append(f'{event.fps:.1f} fps')
+        if event.speed:
+            parts.append(f'{event.speed:.2f}x')
+        parts.append(f'ETA {format_seconds(event.eta_s)}')
+        if event.stalled:
+            parts.append('STALLED')
+        return ' '.join(parts)
+
+    def __call__(self, event):
+        with self._lock:
+            if self.stream.isatty():
+                if event.done:
+                    self.active.pop(event.label, None)
+                    self.stream.write(f'\r\033[K{self.describe(event)} done in {format_seconds(event.elapsed_s)}\n')
+                else:
+                    self.active[event.label] = event
+                self.stream.write('\r\033[K' + ' | '.join(self.describe(e) for e in self.active.values()))
+            else:
+                now = time.monotonic()
+                if event.done or event.stalled or now - self._last_logged.get(event.label, 0) >= self.interval:
+                    self._last_logged[event.label] = now
+                    self.stream.write(self.describe(event) + (' done\n' if event.done else '\n'))
+                if event.done:
+                    self._last_logged.pop(event.label, None)
+            self.stream.flush()
+
+# Insert PROGRESS_ARGS into an ffmpeg command, a list or a shell string, unless it already reports progress
+# or writes its own output to stdout
+def with_progress_args(cmd):
+    if isinstance(cmd, str):
+        if not cmd.startswith('ffmpeg ') or ' -progress ' in cmd or ' pipe:1' in cmd or cmd.rstrip().endswith(' -'):
+            return cmd, False
+        return 'ffmpeg ' + ' '.join(PROGRESS_ARGS) + cmd[len('ffmpeg'):], True
+    if not cmd or cmd[0] != 'ffmpeg' or '-progress' in cmd or 'pipe:1' in cmd or cmd[-1] == '-':
+        return cmd, False
+    return cmd[:1] + PROGRESS_ARGS + cmd[1:], True
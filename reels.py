@@ -1,3 +1,4 @@
+import copy
 import json
 import os
 import re
@@ -7,20 +8,35 @@ import time
 import m3u8
 import io
 import glob
+import contextlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 from utils import run_and_log
 from graphics import GraphicsTemplate
 from session_manager import session
+from asset_cache import asset_cache
+from video_writer import CRF_HIGH_QUALITY, CRF_OUTPUT_VIDEO
+from hls_output import LivePlaylist, use_hls_output
+from variants import parse_variants, variant_encoding_params, meta_filename, WORK_DIR
+from hls_input import is_hls_url, download_hls_window, HLS_SEGMENT_TIMEOUT
+from compilation import probe_streams, write_concat_list, concat_stream_copy, AUDIO_COPY_KEYS
+from intro_cache import intro_color, prepend_intro, INTRO_CONCAT_LIST
+from progress import progress_monitor, ConsoleProgressBar
+from media_probe import probe_cache
+from config_session import ConfigSession, load_json
+from color_names import color_name
+from asset_prefetch import collect_asset_refs, prefetch_assets
 
-current_path_config = None
 AUDIO_BITRATE_DEFAULT = '128k'
-CRF_HIGH_QUALITY = 18
-CRF_OUTPUT_VIDEO = 22
+AUDIO_CONCAT_LIST = 'audio_concat.txt' # Concat lists are written next to the reel
+CONCAT_LIST = 'concat.txt'
+JOBS_DIR = os.path.join(WORK_DIR, 'jobs') # Work directories of render_reel jobs that do not name one
 
 class Clip:
-    def __init__(self, config: Dict, local_file_name: str, graphic_data):
+    def __init__(self, config: Dict, local_file_name: str, graphic_data, graphic_settings=None, work_dir=WORK_DIR):
         self.local_file_name = local_file_name
-        self.local_file_name_duration = None
+        self.work_dir = work_dir
         self._info_cache = None
         self.config = config
         self.encoding_params = config.get('encoding_params', {})
@@ -31,82 +47,81 @@ class Clip:
         self.audio_tracks = self.encoding_params.get('audio_tracks', None)
         self.destination = config.get('destination', {}).get('path', {None})
         self.num_audio_streams = 1
-        self.graphic = self.initialize_graphics(graphic_data)
-
-    def initialize_graphics(self, graphic_data):
+        self.clip_num = 0
+        self.source_url = None
+        self.start_offset_s = config.get('start_offset_s', 0)
+        self.end_offset_s = config.get('end_offset_s', None)
+        self.graphic = self.initialize_graphics(graphic_data, graphic_settings)
+
+    # graphic_settings is general_settings of main_template.json, read from disk when not given
+    def initialize_graphics(self, graphic_data, graphic_settings=None):
         try:
-            json_file_path = path_graphic('main_template.json')
-            with open(json_file_path, 'r') as file:
-                data = json.load(file)
-                template = data['general_settings']['template']
-                
-                if not template:
-                    print(f"'No template for found, graphics are disabled.")
-                    return None
-                
-                graphics = GraphicsTemplate()
+            if graphic_settings is None:
+                json_file_path = path_graphic('main_template.json')
+                with open(json_file_path, 'r') as file:
+                    graphic_settings = json.load(file)['general_settings']
+            template = graphic_settings['template']
                 
-                if not graphics.initialize(self, graphic_data):
-                    print(f'Could not initialize graphic template {template}')
-                    return None
-                        
-                return graphics
+            if not template:
+                print(f"'No template for found, graphics are disabled.")
+                return None
+            
+            graphics = GraphicsTemplate()
+            
+            if not graphics.initialize(self, graphic_data):
+                print(f'Could not initialize graphic template {template}')
+                return None
+                    
+            return graphics
         except Exception as e:
             print(f"Error loading graphic_template: {e}")
             return None
         
+    # Probed once through the shared probe cache, which the compositor reads as well
     def _fetch_video_info(self):
         if self._info_cache is not None:
             return self._info_cache
         
         if self.local_file_name is not None and os.path.isfile(self.local_file_name):
-            
-            probe = subprocess.check_output(
-                ['ffprobe',
-                 '-v', 'error',
-                 '-show_entries', 'format=duration:stream=avg_frame_rate:stream=height:stream=width',
-                 '-of', 'json',
-                 self.local_file_name]
-            )
-            self._info_cache = json.loads(probe)
+            self._info_cache = probe_cache.probe(self.local_file_name)
             return self._info_cache
         else:
             raise Exception(f'File not found: {self.local_file_name}')
 
     def frame_rate(self):
-        info = self._fetch_video_info()
-        fps_str = info["streams"][0]["avg_frame_rate"]
-
-        if '/' in fps_str:
-            num, den = fps_str.split('/')
-            fps = float(num) / float(den)
-        else:
-            fps = float(fps_str)
-
-        return fps
+        return self._fetch_video_info().fps
     
     def video_height(self):
-        info = self._fetch_video_info()
-        return info['streams'][0]['height']
+        return self._fetch_video_info().height
             
     def video_width(self):
-        info = self._fetch_video_info()
-        return info["streams"][0]["width"]
+        return self._fetch_video_info().width
     
     def file_duration(self):
-        if self.local_file_name is not None and os.path.isfile(self.local_file_name):
-            if self.local_file_name_duration is None:
-                self.local_file_name_duration = float(subprocess.check_output(
-                    ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-                     '-of', 'default=noprint_wrappers=1:nokey=1', self.local_file_name]))
-            return self.local_file_name_duration
-        raise Exception('File does not exist: %s' % self.local_file_name)
+        return self._fetch_video_info().duration
     
     def duration(self):
-        return self.end_offset_s - self.start_offset_s
+        end_offset_s = self.file_duration() if self.end_offset_s is None else self.end_offset_s
+        return end_offset_s - self.start_offset_s
 
     def path(self):
         return self.destination
+
+    # An HLS source is replaced by a local mp4 of just the segments covering start_offset_s-end_offset_s.
+    # The offsets are moved to be relative to that file.
+    def resolve_source(self):
+        if not is_hls_url(self.local_file_name):
+            return
+        self.source_url = self.local_file_name
+        self.local_file_name = os.path.join(self.work_dir, f'{self.clip_num}_source.mp4')
+        self.start_offset_s, self.end_offset_s = download_hls_window(
+            self.source_url, self.local_file_name, lambda url: get_response(url, timeout=HLS_SEGMENT_TIMEOUT),
+            self.start_offset_s, self.end_offset_s)
+        self._info_cache = None
+
+    # Rendered clip with graphics, written by create_animated_meta
+    def meta_filename(self, variant=None):
+        return meta_filename(self.clip_num, variant, self.work_dir)
     
 def get_response(url: str, timeout: int = 2, retries: int = 2) -> requests.Response:
     headers = {'X-Forzify-Client': 'telenor-internal'}# if IN_CLOUD else {}
@@ -122,15 +137,24 @@ def get_response(url: str, timeout: int = 2, retries: int = 2) -> requests.Respo
                 raise
             time.sleep(0.2)
 
-# Utilizes a web-api to GET data regarding hexadecimal value, i.e. name of the color
-def translate_color(hex_color, target_language='en'):
+# Name of a hexadecimal color, the closest one in the bundled color list so it works offline.
+# With online=True, or if the list cannot be read, it is looked up in thecolorapi.com instead.
+def translate_color(hex_color, target_language='en', online=False):
+    if not online:
+        try:
+            return color_name(hex_color)
+        except (OSError, ValueError) as e:
+            print(f'Could not name {hex_color} offline: {e}')
+
     url = f"https://www.thecolorapi.com/id?hex={hex_color.lstrip('#')}"
-    response = requests.get(url)
-    data = response.json()
+    try:
+        data = session.get(url, timeout=2).json()
+    except (requests.RequestException, ValueError):
+        return 'Unknown color'
 
     if 'name' in data:
-        color_name = data['name']['value']
-        return color_name
+        color_name_value = data['name']['value']
+        return color_name_value
     else:
         return 'Unknown color'
 
@@ -149,13 +173,13 @@ def is_valid_hex(color):
         return False
 
 # Requests user-input of different hex. values and applies if inputted properly
-def user_custom():
+def user_custom(config_session):
     while True:
         print("Choose the foreground color (hex code) ")
         choice = input("Enter a hexadecimal color: ")
 
         if is_valid_hex(choice):
-            modify_graphic('fg_color', choice)
+            config_session.modify_graphic('fg_color', choice)
             break
         else:
             print("Invalid hexadecimal format")
@@ -165,7 +189,7 @@ def user_custom():
         choice = input("Enter a hexadecimal color: ")
 
         if is_valid_hex(choice):
-            modify_graphic('bg_color', choice)
+            config_session.modify_graphic('bg_color', choice)
             break
         else:
             print("Invalid hexadecimal format")
@@ -175,7 +199,7 @@ def user_custom():
         choice = input("Enter a hexadecimal color: ")
 
         if is_valid_hex(choice):
-            modify_graphic('border_color', choice)
+            config_session.modify_graphic('border_color', choice)
             break
         else:
             print("Invalid hexadecimal format")
@@ -185,7 +209,7 @@ def user_custom():
         choice = input("Enter a hexadecimal color: ")
 
         if is_valid_hex(choice):
-            modify_graphic('text_color', choice)
+            config_session.modify_graphic('text_color', choice)
             break
         else:
             print("Invalid hexadecimal format")
@@ -217,60 +241,8 @@ def path_graphic(graphic_file):
 
     return json_file_path
 
-# Edit color config of main_template.json
-def modify_graphic(setting, value):
-    json_file_path = path_graphic('main_template.json')
-
-    with open(json_file_path, 'r') as file:
-        data = json.load(file)
-    
-    if setting == 'home_color' or setting == 'visiting_color':
-        for i in range(len(value)):
-            data["general_settings"][setting][i]= value[i]
-
-    data["general_settings"][setting] = value
-    
-    with open(json_file_path, 'w') as file:
-        json.dump(data, file, indent=4)
-
-# Returns x-count clips from specified config_template
-def count_clips(config_json):
-    json_path_file = path_config(config_json)
-
-    with open(json_path_file, 'r') as file:
-        data = json.load(file)
-
-    if 'clips' in data:
-        return len(data['clips'])
-    else:
-        return 0
-
-
-# Edits JSON-file "example_1clip.json" or "example_2clip.json"
-def modify_config(config_file, type, value, index=0):
-    clip_meta = ["home_logo_url", "home_name", "home_initials", "visiting_logo_url", "visiting_name", "visiting_initials", "league_logo_url", "league_name", "league_name", "action"]
-    json_file_path = path_config(config_file)
-
-    with open(json_file_path, 'r') as file:
-        data = json.load(file)
-
-    if(type == 'graphic_template'):
-        data['clip_parameters']['clip_graphic_template'][type] = value
-    elif(type in clip_meta):
-        data['clips'][index]['clip_meta'][0][type] = value
-    elif(type == 'platform' or type == 'aspect_ratio'):
-        data['encoding_parameters'][type] = value
-    elif(type == 'video_url'):
-        for i in range(count_clips(config_file)):
-            data['clips'][i][type] = value
-    
-
-    with open(json_file_path, 'w') as file:
-        json.dump(data, file, indent=4)
-
-# Configurates config_template & graphic_template according to user-input
+# Configurates config_template & graphic_template according to user-input. Returns the ConfigSession holding both.
 def user_options():
-    global current_path_config
     config = None
     real_use = True
     while True:
@@ -279,17 +251,18 @@ def user_options():
 
         if choice == '1':
             config = 'example_1clip.json'
-            current_path_config = path_config(config)
             
         elif choice == '2':
             config = 'example_2clip.json'
-            current_path_config = path_config(config)
             
         else:
             print(f"Error resolving input '{choice}'")
             continue
         break
 
+    # Both files are read once here; the choices below only edit them in memory
+    config_session = ConfigSession(path_config(config), path_graphic('main_template.json'))
+
     while real_use:
         ptemp = 'platform'
         atemp = 'aspect_ratio'
@@ -298,19 +271,19 @@ def user_options():
         choice = input("Enter your choice (1/2/3/4): ")
 
         if choice == '1' or choice == 'youtube':
-            modify_config(config, ptemp, 'youtube')
-            modify_config(config, atemp, [16, 9])
-            modify_config(config, vtemp, 'resources/clips/clip_2_16_9.mp4')
+            config_session.modify_config(ptemp, 'youtube')
+            config_session.modify_config(atemp, [16, 9])
+            config_session.modify_config(vtemp, 'resources/clips/clip_2_16_9.mp4')
         elif choice == '2' or choice == 'tiktok':
-            modify_config(config, ptemp, 'tiktok')
-            modify_config(config, atemp, [9, 16])
-            modify_config(config, vtemp, 'resources/clips/clip_2_9_16.mp4')
+            config_session.modify_config(ptemp, 'tiktok')
+            config_session.modify_config(atemp, [9, 16])
+            config_session.modify_config(vtemp, 'resources/clips/clip_2_9_16.mp4')
         elif choice == '3' or choice == 'instagram':
-            modify_config(config, ptemp, 'instagram')
-            modify_config(config, atemp, [1, 1])
+            config_session.modify_config(ptemp, 'instagram')
+            config_session.modify_config(atemp, [1, 1])
         elif choice == '4' or choice == 'facebook':
-            modify_config(config, ptemp, 'facebook')
-            modify_config(config, atemp, [1, 1])
+            config_session.modify_config(ptemp, 'facebook')
+            config_session.modify_config(atemp, [1, 1])
         else:
             print(f"Error resolving input '{choice}'")
             continue
@@ -324,10 +297,10 @@ def user_options():
 
         if choice == '1' or choice == 'left':
             orientation = 'left'
-            modify_graphic(setting, orientation)
+            config_session.modify_graphic(setting, orientation)
         elif choice == '2' or choice == 'center':
             orientation = 'center'
-            modify_graphic(setting, orientation)
+            config_session.modify_graphic(setting, orientation)
         else:
             print(f"Error resolving input '{choice}'")
             continue
@@ -341,10 +314,10 @@ def user_options():
 
         if choice == '1' or choice == 'rectangle':
             graphic_pack = 'rectangle'
-            modify_graphic(setting, graphic_pack)
+            config_session.modify_graphic(setting, graphic_pack)
         elif choice == '2' or choice == 'diamond':
             graphic_pack = 'diamond'
-            modify_graphic(setting, graphic_pack)
+            config_session.modify_graphic(setting, graphic_pack)
         else:
             print(f"Error resolving input '{choice}'")
             continue
@@ -357,20 +330,20 @@ def user_options():
         if choice == 'yes' or choice == 'y':
             cmeta = 'action'
             # Iterates over all clips in config, repeats itself only when multiple clips are present in config.
-            for i in range(count_clips(config)):
+            for i in range(config_session.count_clips()):
                 while True:
-                    print(f"Choose an action for clip {i+1} out of {count_clips(config)} (default: goal): \n1. Goal\n2. Shot\n3. Yellow card\n4. Red card\n5. Penalty")
+                    print(f"Choose an action for clip {i+1} out of {config_session.count_clips()} (default: goal): \n1. Goal\n2. Shot\n3. Yellow card\n4. Red card\n5. Penalty")
                     choice = input("Enter your choice (1/2/3/4/5): ")
                     if choice == '1':
-                        modify_config(config, cmeta, 'goal', i)
+                        config_session.modify_config(cmeta, 'goal', i)
                     elif choice == '2':
-                        modify_config(config, cmeta, 'shot', i)
+                        config_session.modify_config(cmeta, 'shot', i)
                     elif choice == '3':
-                        modify_config(config, cmeta, 'yellow card', i)
+                        config_session.modify_config(cmeta, 'yellow card', i)
                     elif choice == '4':
-                        modify_config(config, cmeta, 'red card', i)
+                        config_session.modify_config(cmeta, 'red card', i)
                     elif choice == '5':
-                        modify_config(config, cmeta, 'penalty', i) 
+                        config_session.modify_config(cmeta, 'penalty', i) 
                     else:
                         print(f"Error resolving input '{choice}'")
                         continue
@@ -384,82 +357,82 @@ def user_options():
                 print("Choose a league or a color-theme (default: J1 League): \n1. J1 League\n2. Eredivisie\n3. Allsvenskan\n4. Red\n5. Green\n6. En eller annen farge")
                 choice = input("Enter your choice (1/2/3/4/5/6): ")
                 if choice == '1':
-                    modify_config(config, setting, 'j1_league')
+                    config_session.modify_config(setting, 'j1_league')
                 elif choice == '2':
-                    modify_config(config, setting, 'eredivisie')
+                    config_session.modify_config(setting, 'eredivisie')
                 elif choice == '3':
-                    modify_config(config, setting, 'allsvenskan')
+                    config_session.modify_config(setting, 'allsvenskan')
                 elif choice == '4':
-                    modify_config(config, setting, 'red')
+                    config_session.modify_config(setting, 'red')
                 elif choice == '5':
-                    modify_config(config, setting, 'green') 
+                    config_session.modify_config(setting, 'green') 
                 elif choice == '6':
-                    modify_config(config, setting, 'purple')
+                    config_session.modify_config(setting, 'purple')
                 else:
                     print(f"Error resolving input '{choice}'")
                     continue
                 
                 # Choosing a league will result in all clips having the same theme. Therefor will all League logos be same for every clip.
-                for i in range(count_clips(config)):
+                for i in range(config_session.count_clips()):
                     if choice == '1':
-                        modify_config(config, league_url, "league/j1.png", i)
-                        modify_config(config, league_n, "J1 League", i)
+                        config_session.modify_config(league_url, "league/j1.png", i)
+                        config_session.modify_config(league_n, "J1 League", i)
                     elif choice == '2':
-                        modify_config(config, league_url, "league/eredivisie.png", i)
-                        modify_config(config, league_n, "Eredivisie", i)
+                        config_session.modify_config(league_url, "league/eredivisie.png", i)
+                        config_session.modify_config(league_n, "Eredivisie", i)
                     elif choice == '3':
-                        modify_config(config, league_url, "league/allsvenskan.png", i)
-                        modify_config(config, league_n, "Allsvenskan", i)
+                        config_session.modify_config(league_url, "league/allsvenskan.png", i)
+                        config_session.modify_config(league_n, "Allsvenskan", i)
                 break
             # Select home team and visiting team
-            for i in range(count_clips(config)):
+            for i in range(config_session.count_clips()):
                 while True:
                     home_n = "home_name" # Name of team
                     home_i = "home_initials" # Initials of team
                     home_c = "home_color" # Jersey color of team
                     home_url = "home_logo_url" # Url of team logo
-                    print(f"Choose the HOME team for clip {i +1} out of {count_clips(config)} (default: FC Tokyo): \n1. FC Tokyo\n2. Kashima Antlers\n3. Urawa Red Diamond\n4. Tokyo Verdy\n5. PSV Eindhoven\n6. Fortuna Sittard\n7. FC Volendam\n8. Sparta Rotterdam")
+                    print(f"Choose the HOME team for clip {i +1} out of {config_session.count_clips()} (default: FC Tokyo): \n1. FC Tokyo\n2. Kashima Antlers\n3. Urawa Red Diamond\n4. Tokyo Verdy\n5. PSV Eindhoven\n6. Fortuna Sittard\n7. FC Volendam\n8. Sparta Rotterdam")
                     choice = input("Enter your choice (1/2/3/4/5/6): ")
                     if choice == '1':
-                        modify_config(config, home_n, 'FC Tokyo', i) # Changes name of home team 
-                        modify_config(config, home_i, 'FCT', i) # Changes the initials for the home team
-                        modify_graphic(home_c, ["#002B67","#FF0B33"]) # Changes the team's colors according to jersey
-                        modify_config(config, home_url, "team/tokyo.png", i) # Changes local url to team's logo
+                        config_session.modify_config(home_n, 'FC Tokyo', i) # Changes name of home team 
+                        config_session.modify_config(home_i, 'FCT', i) # Changes the initials for the home team
+                        config_session.modify_graphic(home_c, ["#002B67","#FF0B33"]) # Changes the team's colors according to jersey
+                        config_session.modify_config(home_url, "team/tokyo.png", i) # Changes local url to team's logo
                     elif choice == '2':
-                        modify_config(config, home_n, 'Kashima Antlers', i)
-                        modify_config(config, home_i, 'KASM', i)
-                        modify_graphic(home_c, ["#ffffff","#ffffff"])
-                        modify_config(config, home_url, "team/kashima.png", i)
+                        config_session.modify_config(home_n, 'Kashima Antlers', i)
+                        config_session.modify_config(home_i, 'KASM', i)
+                        config_session.modify_graphic(home_c, ["#ffffff","#ffffff"])
+                        config_session.modify_config(home_url, "team/kashima.png", i)
                     elif choice == '3':
-                        modify_config(config, home_n, 'Urawa Red Diamond', i)
-                        modify_config(config, home_i, 'URAW', i)
-                        modify_graphic(home_c, ["#ffffff","#CFCED2"])
-                        modify_config(config, home_url, "team/urawa.png", i)
+                        config_session.modify_config(home_n, 'Urawa Red Diamond', i)
+                        config_session.modify_config(home_i, 'URAW', i)
+                        config_session.modify_graphic(home_c, ["#ffffff","#CFCED2"])
+                        config_session.modify_config(home_url, "team/urawa.png", i)
                     elif choice == '4':
-                        modify_config(config, home_n, 'Tokyo Verdy', i)
-                        modify_config(config, home_i, 'TK-V', i)
-                        modify_graphic(home_c, ["#ffffff","#ffffff"])
-                        modify_config(config, home_url, "team/tokyoverdy.png", i)
+                        config_session.modify_config(home_n, 'Tokyo Verdy', i)
+                        config_session.modify_config(home_i, 'TK-V', i)
+                        config_session.modify_graphic(home_c, ["#ffffff","#ffffff"])
+                        config_session.modify_config(home_url, "team/tokyoverdy.png", i)
                     elif choice == '5':
-                        modify_config(config, home_n, 'PSV Eindhoven', i) 
-                        modify_config(config, home_i, 'PSV', i)
-                        modify_graphic(home_c, ["#ffffff","#ED1C24"])
-                        modify_config(config, home_url, "team/psv.png", i)
+                        config_session.modify_config(home_n, 'PSV Eindhoven', i) 
+                        config_session.modify_config(home_i, 'PSV', i)
+                        config_session.modify_graphic(home_c, ["#ffffff","#ED1C24"])
+                        config_session.modify_config(home_url, "team/psv.png", i)
                     elif choice == '6':
-                        modify_config(config, home_n, 'Fortuna Sittard', i)
-                        modify_config(config, home_i, 'FOR', i)
-                        modify_graphic(home_c, ["#000000","#000000"])
-                        modify_config(config, home_url, "team/fortuna.png", i)
+                        config_session.modify_config(home_n, 'Fortuna Sittard', i)
+                        config_session.modify_config(home_i, 'FOR', i)
+                        config_session.modify_graphic(home_c, ["#000000","#000000"])
+                        config_session.modify_config(home_url, "team/fortuna.png", i)
                     elif choice == '7':
-                        modify_config(config, home_n, 'FC Volendam', i)
-                        modify_config(config, home_i, 'VOL', i)
-                        modify_graphic(home_c, ["#ee7f00","#ffffff"])
-                        modify_config(config, home_url, "team/volendam.png", i)
+                        config_session.modify_config(home_n, 'FC Volendam', i)
+                        config_session.modify_config(home_i, 'VOL', i)
+                        config_session.modify_graphic(home_c, ["#ee7f00","#ffffff"])
+                        config_session.modify_config(home_url, "team/volendam.png", i)
                     elif choice == '8':
-                        modify_config(config, home_n, 'Sparta Rotterdam', i)
-                        modify_config(config, home_i, 'SPA', i)
-                        modify_graphic(home_c, ["#466173","#466173"])
-                        modify_config(config, home_url, "team/rotterdam.png", i)
+                        config_session.modify_config(home_n, 'Sparta Rotterdam', i)
+                        config_session.modify_config(home_i, 'SPA', i)
+                        config_session.modify_graphic(home_c, ["#466173","#466173"])
+                        config_session.modify_config(home_url, "team/rotterdam.png", i)
                     else:
                         print(f"Error resolving input '{choice}'")
                         continue
@@ -468,48 +441,48 @@ def user_options():
                     visiting_i = "visiting_initials"
                     visiting_c = "visiting_color"
                     visiting_url = "visiting_logo_url"
-                    print(f"Choose the VISITING team for clip {i +1} out of {count_clips(config)} (default: FC Tokyo): \n1. FC Tokyo\n2. Kashima Antlers\n3. Urawa Red Diamond\n4. Tokyo Verdy\n5. PSV Eindhoven\n6. Fortuna Sittard\n7. FC Volendam\n8. Sparta Rotterdam")
+                    print(f"Choose the VISITING team for clip {i +1} out of {config_session.count_clips()} (default: FC Tokyo): \n1. FC Tokyo\n2. Kashima Antlers\n3. Urawa Red Diamond\n4. Tokyo Verdy\n5. PSV Eindhoven\n6. Fortuna Sittard\n7. FC Volendam\n8. Sparta Rotterdam")
                     choice = input("Enter your choice (1/2/3/4/5/6): ")
                     if choice == '1':
-                        modify_config(config, visiting_n, 'FC Tokyo', i)
-                        modify_config(config, visiting_i, 'FCT', i)
-                        modify_graphic(visiting_c, ["#002B67","#FF0B33"])
-                        modify_config(config, visiting_url, "team/tokyo.png", i) # Changes local url to team's logo
+                        config_session.modify_config(visiting_n, 'FC Tokyo', i)
+                        config_session.modify_config(visiting_i, 'FCT', i)
+                        config_session.modify_graphic(visiting_c, ["#002B67","#FF0B33"])
+                        config_session.modify_config(visiting_url, "team/tokyo.png", i) # Changes local url to team's logo
                     elif choice == '2':
-                        modify_config(config, visiting_n, 'Kashima Antlers', i)
-                        modify_config(config, visiting_i, 'KASM', i)
-                        modify_graphic(visiting_c, ["#ffffff","#ffffff"])
-                        modify_config(config, visiting_url, "team/kashima.png", i)
+                        config_session.modify_config(visiting_n, 'Kashima Antlers', i)
+                        config_session.modify_config(visiting_i, 'KASM', i)
+                        config_session.modify_graphic(visiting_c, ["#ffffff","#ffffff"])
+                        config_session.modify_config(visiting_url, "team/kashima.png", i)
                     elif choice == '3':
-                        modify_config(config, visiting_n, 'Urawa Red Diamond', i)
-                        modify_config(config, visiting_i, 'URAW', i)
-                        modify_graphic(visiting_c, ["#ffffff","#CFCED2"])
-                        modify_config(config, visiting_url, "team/urawa.png", i)
+                        config_session.modify_config(visiting_n, 'Urawa Red Diamond', i)
+                        config_session.modify_config(visiting_i, 'URAW', i)
+                        config_session.modify_graphic(visiting_c, ["#ffffff","#CFCED2"])
+                        config_session.modify_config(visiting_url, "team/urawa.png", i)
                     elif choice == '4':
-                        modify_config(config, visiting_n, 'Tokyo Verdy', i)
-                        modify_config(config, visiting_i, 'TK-V', i)
-                        modify_graphic(visiting_c, ["#ffffff","#ffffff"])
-                        modify_config(config, visiting_url, "team/tokyoverdy.png", i)
+                        config_session.modify_config(visiting_n, 'Tokyo Verdy', i)
+                        config_session.modify_config(visiting_i, 'TK-V', i)
+                        config_session.modify_graphic(visiting_c, ["#ffffff","#ffffff"])
+                        config_session.modify_config(visiting_url, "team/tokyoverdy.png", i)
                     elif choice == '5':
-                        modify_config(config, visiting_n, 'PSV Eindhoven', i) 
-                        modify_config(config, visiting_i, 'PSV', i)
-                        modify_graphic(visiting_c, ["#ffffff","#ED1C24"])
-                        modify_config(config, visiting_url, "team/psv.png", i)
+                        config_session.modify_config(visiting_n, 'PSV Eindhoven', i) 
+                        config_session.modify_config(visiting_i, 'PSV', i)
+                        config_session.modify_graphic(visiting_c, ["#ffffff","#ED1C24"])
+                        config_session.modify_config(visiting_url, "team/psv.png", i)
                     elif choice == '6':
-                        modify_config(config, visiting_n, 'Fortuna Sittard', i)
-                        modify_config(config, visiting_i, 'FOR', i)
-                        modify_graphic(visiting_c, ["#000000","#000000"])
-                        modify_config(config, visiting_url, "team/fortuna.png", i)
+                        config_session.modify_config(visiting_n, 'Fortuna Sittard', i)
+                        config_session.modify_config(visiting_i, 'FOR', i)
+                        config_session.modify_graphic(visiting_c, ["#000000","#000000"])
+                        config_session.modify_config(visiting_url, "team/fortuna.png", i)
                     elif choice == '7':
-                        modify_config(config, visiting_n, 'FC Volendam', i)
-                        modify_config(config, visiting_i, 'VOL', i)
-                        modify_graphic(visiting_c, ["#ee7f00","#ffffff"])
-                        modify_config(config, visiting_url, "team/volendam.png", i)
+                        config_session.modify_config(visiting_n, 'FC Volendam', i)
+                        config_session.modify_config(visiting_i, 'VOL', i)
+                        config_session.modify_graphic(visiting_c, ["#ee7f00","#ffffff"])
+                        config_session.modify_config(visiting_url, "team/volendam.png", i)
                     elif choice == '8':
-                        modify_config(config, visiting_n, 'Sparta Rotterdam', i)
-                        modify_config(config, visiting_i, 'SPA', i)
-                        modify_graphic(visiting_c, ["#466173","#466173"])
-                        modify_config(config, visiting_url, "team/rotterdam.png", i)
+                        config_session.modify_config(visiting_n, 'Sparta Rotterdam', i)
+                        config_session.modify_config(visiting_i, 'SPA', i)
+                        config_session.modify_graphic(visiting_c, ["#466173","#466173"])
+                        config_session.modify_config(visiting_url, "team/rotterdam.png", i)
                     else:
                         print(f"Error resolving input '{choice}'")
                         continue
@@ -521,20 +494,17 @@ def user_options():
             continue
         break
 
-def open_config():
-    if current_path_config is None:
-        print(f"{current_path_config} was not found. ")
-    try:
-        with open(current_path_config, 'r') as f:
-            return json.loads(f.read())
-    except Exception as e:
-        # log.error(f'An error occured while opening config: {e}')
-        return None
-    
-def get_graphic(graphic_template, config):
+    # Written once, after every choice was made
+    config_session.flush()
+    return config_session
+
+# The template's section and general_settings of main_template.json, from graphic if the caller already has it loaded
+def get_graphic(graphic_template, config, graphic=None):
     if graphic_template is None:
         return None
     try:
+        if graphic is not None:
+            return graphic.get(graphic_template), graphic.get("general_settings")
         with open(path_graphic('main_template.json'), 'r') as f:
             graphic_data = json.load(f)
             return graphic_data.get(graphic_template), graphic_data.get("general_settings")
@@ -542,13 +512,38 @@ def get_graphic(graphic_template, config):
         # log.error(f'An error occured while loading graphic: {e}')
         return None
 
-def initialize_clip(clip_config, clip_params, encoding_params, config, i, graphic_data):
+def initialize_clip(clip_config, clip_params, encoding_params, config, i, graphic_data, graphic_settings=None, work_dir=WORK_DIR):
     clip_config['graphic_template'] = clip_params.get('clip_graphic_template', {}).get('graphic_template', None)
     clip_config['name'] = config['name']
     clip_config['encoding_params'] = encoding_params
-    return Clip(clip_config, config['clips'][i].get('video_url', None), graphic_data)
-
-def process_clips(config, clip_params, encoding_params):
+    clip = Clip(clip_config, config['clips'][i].get('video_url', None), graphic_data, graphic_settings, work_dir)
+    clip.clip_num = i
+    clip.resolve_source()
+    return clip
+
+# Number of clips rendered at the same time, one per core unless the config says otherwise
+def clip_workers(encoding_params, total_clips):
+    workers = encoding_params.get('clip_workers', 'auto')
+    if workers == 'auto':
+        workers = os.cpu_count() or 1
+    return max(min(int(workers), total_clips), 1)
+
+def process_clip(clip_config, clip_params, encoding_params, config, i, graphic_data, graphic_settings, is_compilation, total_clips, work_dir=WORK_DIR):
+    print(f"Applying graphics for clip #{i+1}")
+    tpc = time.perf_counter()
+
+    clip = initialize_clip(clip_config, clip_params, encoding_params, config, i, graphic_data, graphic_settings, work_dir)
+
+    if clip.graphic:
+        clip.graphic.download_and_meta(None, None, None, is_compilation, None, graphic_settings, i)
+
+    print(f'Added video with meta graphic {i + 1}/{total_clips} with duration {clip.duration():.2f} seconds in {time.perf_counter()-tpc:.2f}')
+    return clip
+
+# Clips are rendered concurrently, each into its own {work_dir}/{i}_meta.mp4. The returned list keeps
+# config order whatever order they finish in; a clip that fails is reported and left out.
+# graphic is the loaded main_template.json, it is read from disk when not given.
+def process_clips(config, clip_params, encoding_params, graphic=None, work_dir=WORK_DIR):
     total_clips = len(config['clips'])
     is_compilation = total_clips > 1
     video_h = None
@@ -556,72 +551,150 @@ def process_clips(config, clip_params, encoding_params):
     fps = None
     platform = None
     clips = []
+    failed = []
     
     graphic_template = clip_params.get('clip_graphic_template', {}).get('graphic_template', None)
     
-    graphic_data, graphic_settings = get_graphic(graphic_template, config)
-    
-    for i, clip_config in enumerate(config['clips']):
-        print(f"Applying graphics for clip #{i+1}")
-        tpc = time.perf_counter()
-       
-        clip = initialize_clip(clip_config, clip_params, encoding_params, config, i, graphic_data)
-        
-        if clip.graphic:
-            clip.graphic.download_and_meta(video_h, video_w, fps, is_compilation, platform, graphic_settings, i)
-        
-        clips.append(clip)
-        print(f'Added video with meta graphic {i + 1}/{total_clips} with duration {clip.file_duration():.2f} seconds in {time.perf_counter()-tpc:.2f}')
+    graphic_data, graphic_settings = get_graphic(graphic_template, config, graphic)
+    # A variant the graphic template has no layout for fails the job before anything is downloaded or decoded
+    parse_variants(encoding_params, (graphic_settings or {}).get('template'), None, encoding_params.get('aspect_ratio'))
+
+    workers = clip_workers(encoding_params, total_clips)
+    if workers > 1:
+        # Every clip runs its own encoder, so share the cores out instead of letting each x264 take all of them
+        encoding_params = dict(encoding_params)
+        encoding_params.setdefault('encoder_threads', max((os.cpu_count() or 1) // workers, 1))
+    print(f'Rendering {total_clips} clips with {workers} workers')
+
+    # Every logo and icon is loaded before the first frame is decoded, a missing one fails the job here
+    prefetch_assets(collect_asset_refs(config['clips']))
+
+    # Probe every local source at once up front, the clips then find them in the probe cache.
+    # HLS sources are probed by their clip once the segments are downloaded.
+    sources = [clip_config.get('video_url') for clip_config in config['clips']]
+    sources = [source for source in sources if source and not is_hls_url(source) and os.path.isfile(source)]
+    for source, info in zip(sources, probe_cache.probe_all(sources)):
+        if isinstance(info, Exception):
+            print(f'Could not probe {source}: {info}')
+
+    # In HLS mode the reel's playlist grows as clips finish, so it can be watched before the job is done
+    live = LivePlaylist([meta_filename(i, work_dir=work_dir) for i in range(total_clips)]) if use_hls_output(encoding_params) else contextlib.nullcontext()
+
+    with live, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_clip, clip_config, clip_params, encoding_params, config, i, graphic_data, graphic_settings, is_compilation, total_clips, work_dir)
+                   for i, clip_config in enumerate(config['clips'])]
+
+        for i, future in enumerate(futures):
+            try:
+                clips.append(future.result())
+            except Exception as e:
+                print(f'Failed to process clip #{i+1}: {e}')
+                failed.append(i + 1)
+                if isinstance(live, LivePlaylist):
+                    live.drop(i)
+
+    if failed:
+        print(f'{len(failed)}/{total_clips} clips failed: {failed}')
+    if not clips:
+        raise Exception('All clips failed to process')
     
     return video_h, video_w, fps, platform, clips, is_compilation
 
-def merge_all_videos(clips: List[Clip], mp4_file: str, clip_params: dict, video_bitrate: str = None, audio_bitrate: str = None):
+def merge_all_videos(clips: List[Clip], mp4_file: str, clip_params: dict, video_bitrate: str = None, audio_bitrate: str = None, variant: str = None):
     if not clips:
         print('No clips were found to process')
         return
     
     ffmpeg_cmd = ''
     
-    for i, _ in enumerate(clips):
-        ffmpeg_cmd += f'-i video/{i}_meta.mp4 '
+    for clip in clips:
+        ffmpeg_cmd += f'-i {clip.meta_filename(variant)} '
+
+    # Audio: copied through a concat demuxer input when every clip's audio matches, otherwise
+    # decoded alongside the video in the concat filter and encoded once. Dropped if a clip has none.
+    audio_streams = [probe_streams(clip.meta_filename(variant))['audio'] for clip in clips]
+    has_audio = all(audio_streams)
+    copy_audio = has_audio and len({tuple(streams[0].get(key) for key in AUDIO_COPY_KEYS) for streams in audio_streams}) == 1
+
+    if not has_audio and any(audio_streams):
+        print('Not every clip has audio, the compilation will be silent.')
+
+    if copy_audio:
+        audio_list = write_concat_list([clip.meta_filename(variant) for clip in clips], os.path.join(os.path.dirname(mp4_file), AUDIO_CONCAT_LIST))
+        ffmpeg_cmd += f'-f concat -safe 0 -i {audio_list} '
 
     ffmpeg_cmd += "-filter_complex "
 
     concat_cmd = ""
     for i, _ in enumerate(clips):
         concat_cmd += f"[{i}:v]"
-    concat_cmd += f"concat=n={len(clips)}:v=1:a=0[v]"
+        if has_audio and not copy_audio:
+            concat_cmd += f"[{i}:a:0]"
+    concat_cmd += f"concat=n={len(clips)}:v=1:a={int(has_audio and not copy_audio)}[v]"
+    if has_audio and not copy_audio:
+        concat_cmd += "[a]"
         
-    ffmpeg_cmd += f'"{concat_cmd}" -map "[v]" video/output.mp4'
+    ffmpeg_cmd += f'"{concat_cmd}" -map "[v]" '
+
+    if copy_audio:
+        ffmpeg_cmd += f'-map {len(clips)}:a:0 -c:a copy '
+    elif has_audio:
+        print('Clip audio formats differ, re-encoding the audio.')
+        ffmpeg_cmd += f'-map "[a]" -c:a aac -b:a {audio_bitrate or AUDIO_BITRATE_DEFAULT} '
+
+    ffmpeg_cmd += mp4_file
 
     return ffmpeg_cmd
 
-def process_encode_final(clips, clip_params, is_comp, encoding_params):
-    mp4_filename = f'video/output.mp4'
-   
+def encode_final(clips, clip_params, is_comp, encoding_params, mp4_filename, variant=None):
     if os.path.exists(mp4_filename):
         os.remove(mp4_filename)
         print(f"Existing {mp4_filename} deleted successfully.")
 
     if is_comp:
-        ffmpeg_cmd = merge_all_videos(clips, mp4_filename, clip_params, encoding_params.get('video_bitrate'), encoding_params.get('audio_bitrate'))
         tpc = time.perf_counter()
-        run_and_log(f'ffmpeg -hide_banner -progress progress-log.txt -loglevel warning -y {ffmpeg_cmd}', shell=True)
+        # Clips encoded with the same parameters are joined without re-encoding, the concat filter is the fallback
+        audio_bitrate = encoding_params.get('audio_bitrate') or AUDIO_BITRATE_DEFAULT
+        if not concat_stream_copy([clip.meta_filename(variant) for clip in clips], mp4_filename, os.path.join(os.path.dirname(mp4_filename), CONCAT_LIST), audio_bitrate,
+                                  variant_encoding_params(encoding_params, variant)):
+            print('Clips cannot be joined by stream copy, re-encoding the compilation.')
+            ffmpeg_cmd = merge_all_videos(clips, mp4_filename, clip_params, encoding_params.get('video_bitrate'), encoding_params.get('audio_bitrate'), variant)
+            run_and_log(f'ffmpeg -hide_banner -loglevel warning -y {ffmpeg_cmd}', msg=f'merge {mp4_filename}', shell=True, duration_s=sum(clip.duration() for clip in clips))
         
         #log.info(f'Final video encoded in {time.perf_counter() - tpc:.2f} seconds.)
     else:
-        single_clip_filename = 'video/0_meta.mp4'
+        single_clip_filename = clips[0].meta_filename(variant)
         os.rename(single_clip_filename, mp4_filename)
         #log.info(f'Single clip moved to {mp4_filename}')
 
+    # The bumper is transcoded once per reel format and cached, so here it is only a stream copy
+    color = intro_color(encoding_params)
+    if color and not prepend_intro(mp4_filename, color, encoding_params, encoding_params.get('audio_bitrate') or AUDIO_BITRATE_DEFAULT):
+        print(f'{mp4_filename} is written without the intro.')
+
     return mp4_filename
 
+# {variant name: reel}: video/output.mp4 under None, plus video/output_<name>.mp4 for every variant
+# after the first in a multi-variant job
+def output_filenames(encoding_params, work_dir=WORK_DIR):
+    filenames = {None: os.path.join(work_dir, 'output.mp4')}
+    for variant in parse_variants(encoding_params, None, None, None)[1:]:
+        filenames[variant.name] = os.path.join(work_dir, f'output_{variant.name}.mp4')
+    return filenames
+
+def process_encode_final(clips, clip_params, is_comp, encoding_params, work_dir=WORK_DIR):
+    for variant, mp4_filename in output_filenames(encoding_params, work_dir).items():
+        encode_final(clips, clip_params, is_comp, encoding_params, mp4_filename, variant)
+
+    return output_filenames(encoding_params, work_dir)[None]
+
 def verify_file(filename):
     return filename and os.path.exists(filename) and os.path.getsize(filename) > 0
 
-def clean_up():
-    file_pattern = 'video/*_meta.mp4'
-    files_to_remove = glob.glob(file_pattern)
+def clean_up(work_dir=WORK_DIR):
+    file_pattern = os.path.join(work_dir, '*_meta.mp4')
+    files_to_remove = glob.glob(file_pattern) + glob.glob(os.path.join(work_dir, '*_conform.mp4')) + glob.glob(os.path.join(work_dir, '*_source.mp4'))
+    files_to_remove += glob.glob(os.path.join(work_dir, AUDIO_CONCAT_LIST)) + glob.glob(os.path.join(work_dir, CONCAT_LIST)) + glob.glob(os.path.join(work_dir, INTRO_CONCAT_LIST))
 
     for file_path in files_to_remove:
         try:
@@ -630,41 +703,95 @@ def clean_up():
         except Exception as e:
             print(f"Failed to delete file {file_path}: {e}")
 
-def main():
-    global_start_time = time.perf_counter()
-    mp4_filename = None
-    success = False
-    
+# Outcome of render_reel. outputs maps variant name to reel (the primary reel under None) and only
+# holds reels that were written; clips and failed_clips are clip indices in config order.
+class RenderResult:
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.success = False
+        self.outputs = {}
+        self.clips = []
+        self.failed_clips = []
+        self.error = None
+        self.elapsed_s = 0.0
+
+    def output(self):
+        return self.outputs.get(None)
+
+# Render one reel without prompting and without writing to the templates, so a long-lived worker can
+# run jobs back to back or side by side on threads. job_spec holds:
+#   config: the job, laid out like config_template/*.json
+#   graphic: the contents of main_template.json, read from disk if missing
+#   work_dir: where the clips and reels are written, a new directory under video/jobs if missing
+#   keep_intermediates: keep the rendered clips and concat lists, False by default
+# config and graphic are copied, the caller's objects are left as they are. Jobs only share the
+# probe, asset and HTTP caches, which are safe to use from several threads.
+def render_reel(job_spec):
+    t_start = time.perf_counter()
+    config = copy.deepcopy(job_spec['config'])
+    graphic = copy.deepcopy(job_spec.get('graphic') or load_json(path_graphic('main_template.json')))
+    work_dir = job_spec.get('work_dir')
+    if not work_dir:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix='job_', dir=JOBS_DIR)
+    os.makedirs(work_dir, exist_ok=True)
+    result = RenderResult(work_dir)
+
     try:
-        user_options()
-        config = open_config()
         encoding_params = config.get('encoding_parameters', {})
         clip_params = config.get('clip_parameters', {})
-        
-        #log_initial_params(config, encoding_params, clip_params)
-        video_h, video_w, fps, platform, clips, is_comp = process_clips(config, clip_params, encoding_params)
 
-        mp4_filename = process_encode_final(clips, clip_params, is_comp, encoding_params)
-        
-        if verify_file(mp4_filename):
-            success = True
+        video_h, video_w, fps, platform, clips, is_comp = process_clips(config, clip_params, encoding_params, graphic, work_dir)
+        result.clips = [clip.clip_num for clip in clips]
+        result.failed_clips = [i for i in range(len(config['clips'])) if i not in result.clips]
+
+        process_encode_final(clips, clip_params, is_comp, encoding_params, work_dir)
+        result.outputs = {variant: filename for variant, filename in output_filenames(encoding_params, work_dir).items() if verify_file(filename)}
+
+        if result.output():
+            result.success = True
         else:
-            print('Failed to create valid mp4 file.')
-            
+            result.error = 'Failed to create valid mp4 file.'
+            print(result.error)
+    except Exception as e:
+        result.error = str(e)
+        print(f'An error has occured: {e}')
+    finally:
+        if not job_spec.get('keep_intermediates'):
+            clean_up(work_dir)
+        result.elapsed_s = time.perf_counter() - t_start
+
+    return result
+
+# Interactive run: the choices are saved to the templates, then the reel is rendered into video/
+def main():
+    global_start_time = time.perf_counter()
+    result = None
+    
+    progress_bar = progress_monitor.subscribe(ConsoleProgressBar())
+
+    try:
+        config_session = user_options()
+        result = render_reel({'config': config_session.config, 'graphic': config_session.graphic, 'work_dir': WORK_DIR})
     except Exception as e:
         print(f'An error has occured: {e}')
     finally:
         global_end_time = time.perf_counter()
         #log.info(f'[reels] Total time taken for entire process: {global_end_time - global_start_time:.2f} seconds.')
         print(f'[reels] Total time taken for entire process: {global_end_time - global_start_time:.2f} seconds.')
-
-        if success:
+        cache_stats = asset_cache.stats()
+        print(f"[reels] Asset cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['decodes']} images decoded.")
+        http_stats = session.stats()
+        if http_stats['hits'] or http_stats['misses']:
+            print(f"[reels] HTTP cache: {http_stats['hits']} hits, {http_stats['misses']} misses, {http_stats['entries']} entries, {http_stats['bytes'] / 1e6:.1f} MB.")
+        session.close()
+
+        if result is not None and result.success:
             print('Successfully completed entire process')
         else:
             print('Failed to compelete entire process')
 
-        clean_up()
+        progress_monitor.unsubscribe(progress_bar)
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,212 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from session_manager import asset_session
+
+REMOTE_ASSET_DIR = 'video/remote_assets' # Kept between jobs, entries are revalidated instead of downloaded again
+REMOTE_ASSET_MAX_BYTES = 128 * 1024 * 1024
+REMOTE_ASSET_TIMEOUT = (3, 5) # Connect, read
+REMOTE_ASSET_IN_USE = 60 # Seconds, entries used this recently are never evicted
+
+def is_remote(url):
+    return isinstance(url, str) and url.split(':', 1)[0] in ('http', 'https')
+
+# Downloaded logos and icons, stored once per content (the file name is the SHA-256 of the bytes) and
+# found by URL through an index file per URL with the server's ETag/Last-Modified, so processes sharing
+# the cache never overwrite each other's entries. A URL is revalidated with a conditional GET the first
+# time a process asks for it, afterwards it is served from disk. The blobs are capped at max_bytes,
+# evicting the least recently used URLs (an index file's mtime is its last use).
+class RemoteAssetCache:
+    def __init__(self, cache_dir=REMOTE_ASSET_DIR, max_bytes=REMOTE_ASSET_MAX_BYTES, http=asset_session, in_use=REMOTE_ASSET_IN_USE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.http = http
+        self.in_use = in_use
+        self.downloads = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._validated = {} # url -> digest, for URLs checked with the server by this process
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._url_locks = {}
+
+    def _entry_path(self, url):
+        return os.path.join(self.cache_dir, 'index', hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, 'blobs', digest[:2], digest)
+
+    # {'url', 'digest', 'etag', 'last_modified', 'size'} of url, {} if it is not cached
+    def _read_entry(self, url):
+        try:
+            with open(self._entry_path(url), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_entry(self, url, entry):
+        path = self._entry_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(dict(entry, url=url), file)
+        os.replace(tmp_path, path)
+
+    def _touch(self, url):
+        try:
+            os.utime(self._entry_path(url))
+        except OSError:
+            pass
+
+    def _write_blob(self, digest, data):
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    # (last use, index path, url, digest) of every entry and size of every blob, as they are on disk
+    def _scan(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, 'index', '*.json')):
+            try:
+                used = os.stat(path).st_mtime
+                with open(path, 'r') as file:
+                    entry = json.load(file)
+                entries.append((used, path, entry['url'], entry['digest']))
+            except (OSError, ValueError, KeyError):
+                continue # Replaced or evicted by another process meanwhile
+        blobs = {}
+        for path in glob.glob(os.path.join(self.cache_dir, 'blobs', '*', '*')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if not path.endswith('.tmp'):
+                blobs[os.path.basename(path)] = (stat.st_size, stat.st_mtime)
+        return entries, blobs
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    # Drop the least recently used URLs other than keep until the blobs fit in max_bytes. A blob shared
+    # by several URLs is only removed with the last of them, one no URL points to (left by a process
+    # that stopped halfway) goes first. Nothing used within in_use is removed, another job may be
+    # about to read it. The files are scanned and removed outside self._lock so lookups are not held
+    # up, and a thread that finds another one evicting leaves it to that one.
+    def _evict(self, keep=None):
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            entries, blobs = self._scan()
+            now = time.time()
+            references = {}
+            for _, _, _, digest in entries:
+                references[digest] = references.get(digest, 0) + 1
+            total = sum(size for size, _ in blobs.values())
+
+            for digest, (size, created) in blobs.items():
+                if digest not in references and now - created >= self.in_use and self._remove(self._blob_path(digest)):
+                    total -= size
+
+            keep_path = self._entry_path(keep) if keep else None
+            evicted = []
+            for used, path, url, digest in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep_path or now - used < self.in_use or not self._remove(path):
+                    continue
+                evicted.append(url)
+                references[digest] -= 1
+                if not references[digest] and digest in blobs and self._remove(self._blob_path(digest)):
+                    total -= blobs[digest][0]
+        finally:
+            self._evict_lock.release()
+
+        with self._lock:
+            for url in evicted:
+                self._validated.pop(url, None)
+            self.evictions += len(evicted)
+
+    # Content digest of url, downloading or revalidating it if this process has not checked it yet.
+    # If the server cannot be reached the cached copy is used. timeout is passed on to requests.
+    def digest(self, url, timeout=REMOTE_ASSET_TIMEOUT):
+        with self._lock:
+            digest = self._validated.get(url)
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        if digest and os.path.exists(self._blob_path(digest)):
+            self._touch(url)
+            return digest
+
+        with url_lock: # Concurrent requests for one URL share a single round trip
+            with self._lock:
+                digest = self._validated.get(url)
+            if digest and os.path.exists(self._blob_path(digest)):
+                self._touch(url)
+                return digest
+            entry = self._read_entry(url)
+            if entry and not os.path.exists(self._blob_path(entry['digest'])):
+                entry = {}
+
+            headers = {}
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+            try:
+                response = self.http.get(url, headers=headers, timeout=timeout)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            except requests.RequestException as e:
+                if not entry:
+                    raise
+                print(f'Could not revalidate {url}, using the cached copy: {e}')
+                response = None
+
+            downloaded = response is not None and response.status_code != 304
+            if downloaded:
+                data = response.content
+                digest = hashlib.sha256(data).hexdigest()
+                self._write_blob(digest, data)
+                entry = {'digest': digest, 'size': len(data)}
+            if response is not None:
+                entry['etag'] = response.headers.get('ETag') or entry.get('etag')
+                entry['last_modified'] = response.headers.get('Last-Modified') or entry.get('last_modified')
+            self._write_entry(url, entry) # Also marks it as used
+
+            with self._lock:
+                if downloaded:
+                    self.downloads += 1
+                elif response is not None:
+                    self.revalidations += 1
+                self._validated[url] = entry['digest']
+            if downloaded:
+                self._evict(keep=url)
+            return entry['digest']
+
+    # Reader for the cached bytes of a digest
+    def reader(self, digest):
+        def read():
+            with open(self._blob_path(digest), 'rb') as file:
+                return file.read()
+        return read
+
+    def stats(self):
+        entries, blobs = self._scan()
+        with self._lock:
+            return {'downloads': self.downloads, 'revalidations': self.revalidations, 'evictions': self.evictions,
+                    'entries': len(entries), 'bytes': sum(size for size, _ in blobs.values())}
+
+remote_assets = RemoteAssetCache()
@@ -0,0 +1,26 @@
+import cv2
+
+# Everything a primitive needs to draw: the frame buffer, its dimensions and the font.
+# One context per render, so several clips can be drawn at once from different threads.
+class RenderContext:
+    def __init__(self, width, height, frame=None, font_style=cv2.FONT_HERSHEY_SIMPLEX):
+        self.width = width
+        self.height = height
+        self.frame = frame
+        self.font_style = font_style
+        self._text_sizes = {}
+
+    # New context with the same dimensions and font, drawing onto another frame buffer
+    def with_frame(self, frame):
+        ctx = RenderContext(self.width, self.height, frame, self.font_style)
+        ctx._text_sizes = self._text_sizes
+        return ctx
+
+    # cv2.getTextSize, cached per (text, scale, thickness) since templates measure the same strings repeatedly
+    def text_size(self, text, font_scale, thickness):
+        key = (text, font_scale, thickness)
+        size = self._text_sizes.get(key)
+        if size is None:
+            size = cv2.getTextSize(text, self.font_style, font_scale, thickness)
+            self._text_sizes[key] = size
+        return size
@@ -1,3 +1,114 @@
+import threading
+import weakref
+import requests
 import requests_cache
+from requests.adapters import HTTPAdapter
+from http_cache import SqliteCache, FileCache, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_EVICT_INTERVAL
 
-session = requests_cache.CachedSession('reels_cache')
\ No newline at end of file
+ASSET_POOL_SIZE = 8 # Kept connections per host, enough for asset_prefetch's per-host limit
+
+HTTP_CACHE_NAME = 'reels_cache'
+HTTP_CACHE_BACKEND = 'sqlite' # 'sqlite' (reels_cache.sqlite) or 'filesystem' (a reels_cache directory)
+HTTP_CACHE_EXPIRE_AFTER = 24 * 60 * 60 # Seconds, for URLs no pattern of HTTP_CACHE_URLS_EXPIRE_AFTER matches
+
+# Expiry per URL pattern (a glob on the URL without its scheme, the first match wins), in seconds or
+# -1 for never. Published HLS segments do not change, playlists of a running match do.
+HTTP_CACHE_URLS_EXPIRE_AFTER = {
+    '*.m3u8': 10,
+    '*.ts': -1,
+    '*.m4s': -1,
+    '*.aac': -1,
+    'www.thecolorapi.com/id': -1,
+}
+
+HTTP_CACHE_BACKENDS = {'sqlite': SqliteCache, 'filesystem': FileCache}
+
+# CachedSession that reports whether each cacheable response came from the cache to owner
+class ReelsCachedSession(requests_cache.CachedSession):
+    def __init__(self, owner, *args, **kwargs):
+        self.owner = owner
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if self._is_cacheable(request):
+            self.owner.count(getattr(response, 'from_cache', False)) # Expired responses fetched again count as misses
+        return response
+
+# Cached HTTP on the given backend ('sqlite' or 'filesystem'), evicting the least recently used
+# responses in the background once the cache grows past max_bytes (None for no limit). The cache is
+# only opened by the first request, so importing this module touches no file.
+# requests_cache holds a session-wide lock for the whole of every request (it keeps the per-request
+# expire_after on the session), which would fetch HLS segments one by one. Each thread therefore
+# gets its own CachedSession, all of them on the one shared backend.
+class ReelsSession:
+    def __init__(self, cache_name=HTTP_CACHE_NAME, backend=HTTP_CACHE_BACKEND, expire_after=HTTP_CACHE_EXPIRE_AFTER,
+                 urls_expire_after=HTTP_CACHE_URLS_EXPIRE_AFTER, max_bytes=HTTP_CACHE_MAX_BYTES,
+                 evict_interval=HTTP_CACHE_EVICT_INTERVAL):
+        if backend not in HTTP_CACHE_BACKENDS:
+            raise ValueError(f'Unknown HTTP cache backend {backend}, choose one of {", ".join(HTTP_CACHE_BACKENDS)}')
+        self.cache_name = cache_name
+        self.backend = backend
+        self.expire_after = expire_after
+        self.urls_expire_after = urls_expire_after
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self.cache = None
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._sessions = weakref.WeakSet() # Sessions of live threads, for close()
+        self._lock = threading.Lock()
+
+    def thread_session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            with self._lock:
+                if self.cache is None:
+                    self.cache = HTTP_CACHE_BACKENDS[self.backend](self.cache_name, max_bytes=self.max_bytes, evict_interval=self.evict_interval)
+                session = ReelsCachedSession(self, self.cache_name, backend=self.cache, expire_after=self.expire_after,
+                                             urls_expire_after=self.urls_expire_after)
+                self._sessions.add(session)
+            self._local.session = session
+        return session
+
+    # expire_after overrides the session's and the URL patterns' expiry for this request only
+    def request(self, method, url, expire_after=None, **kwargs):
+        return self.thread_session().request(method, url, expire_after=expire_after, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def count(self, from_cache):
+        with self._lock:
+            if from_cache:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            hits, misses, cache = self.hits, self.misses, self.cache
+        stats = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else None}
+        if cache is not None:
+            stats.update(cache.stats())
+        return stats
+
+    # Close the sessions and the cache, the next request opens them again
+    def close(self):
+        with self._lock:
+            sessions, cache = list(self._sessions), self.cache
+            self._sessions = weakref.WeakSet()
+            self._local = threading.local()
+            self.cache = None
+        for session in sessions:
+            session.close()
+        if cache is not None:
+            cache.close()
+
+session = ReelsSession()
+
+# Plain pooled session for callers that do their own caching, like remote_assets
+asset_session = requests.Session()
+asset_session.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=ASSET_POOL_SIZE))
+asset_session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=ASSET_POOL_SIZE))
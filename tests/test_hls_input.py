@@ -0,0 +1,126 @@
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import m3u8
+import requests
+from hls_input import covering_segments, download_hls_window
+
+SEGMENT_SECONDS = 2
+SEGMENT_COUNT = 4
+
+# Serves a directory on 127.0.0.1 and records the path of every request
+class RecordingHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requested.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+def fetch(url):
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response
+
+@unittest.skipIf(shutil.which('ffmpeg') is None, 'needs ffmpeg')
+class DownloadHlsWindowTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp(prefix='reels_hls_test_')
+        serve_dir = os.path.join(cls.tmp_dir, 'serve')
+        os.makedirs(serve_dir)
+        # fMP4 segments, cut at exactly SEGMENT_SECONDS as every segment starts on a keyframe
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=size=64x36:rate=10',
+                        '-t', str(SEGMENT_SECONDS * SEGMENT_COUNT), '-c:v', 'libx264', '-g', str(10 * SEGMENT_SECONDS),
+                        '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+                        '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'init.mp4',
+                        '-hls_segment_filename', os.path.join(serve_dir, 'seg%d.m4s'),
+                        os.path.join(serve_dir, 'media.m3u8')], check=True)
+        with open(os.path.join(serve_dir, 'master.m3u8'), 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=100000\nlow.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=900000\nmedia.m3u8\n')
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(RecordingHandler, directory=serve_dir))
+        cls.server.requested = []
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        with self.server.lock:
+            self.server.requested.clear()
+
+    def download(self, start_s, end_s, playlist='media.m3u8'):
+        output = os.path.join(self.tmp_dir, f'window_{start_s}_{end_s}.mp4')
+        offsets = download_hls_window(f'{self.base_url}/{playlist}', output, fetch, start_s, end_s)
+        self.assertGreater(os.path.getsize(output), 0)
+        return offsets
+
+    # Media segments fetched, checking the init segment came along whenever there were any
+    def requested_segments(self):
+        with self.server.lock:
+            requested = list(self.server.requested)
+        segments = sorted(path for path in requested if path.endswith('.m4s'))
+        self.assertEqual(requested.count('/init.mp4'), 1 if segments else 0)
+        return segments
+
+    def test_fetches_only_covering_segments(self):
+        self.assertEqual(self.download(3, 5), (1, 3))
+        self.assertEqual(self.requested_segments(), ['/seg1.m4s', '/seg2.m4s'])
+
+    def test_window_starting_inside_first_segment(self):
+        self.assertEqual(self.download(0.5, 3), (0.5, 3))
+        self.assertEqual(self.requested_segments(), ['/seg0.m4s', '/seg1.m4s'])
+
+    def test_window_ending_on_segment_boundary(self):
+        # The segment starting at end_s holds no frame of the window
+        self.assertEqual(self.download(2, 4), (0, 2))
+        self.assertEqual(self.requested_segments(), ['/seg1.m4s'])
+
+    def test_open_ended_window(self):
+        self.assertEqual(self.download(5, None), (1, None))
+        self.assertEqual(self.requested_segments(), ['/seg2.m4s', '/seg3.m4s'])
+
+    def test_master_playlist_uses_highest_bandwidth_variant(self):
+        self.download(0, 2, playlist='master.m3u8')
+        with self.server.lock:
+            requested = list(self.server.requested)
+        self.assertEqual(requested[:2], ['/master.m3u8', '/media.m3u8'])
+        self.assertNotIn('/low.m3u8', requested)
+        self.assertEqual(self.requested_segments(), ['/seg0.m4s'])
+
+    def test_window_outside_playlist(self):
+        with self.assertRaises(Exception):
+            self.download(SEGMENT_SECONDS * SEGMENT_COUNT, None)
+        self.assertEqual(self.requested_segments(), [])
+
+class CoveringSegmentsTest(unittest.TestCase):
+    def playlist(self, durations):
+        lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:10']
+        for i, duration in enumerate(durations):
+            lines += [f'#EXTINF:{duration},', f'seg{i}.m4s']
+        return m3u8.loads('\n'.join(lines + ['#EXT-X-ENDLIST']))
+
+    def test_uneven_segments(self):
+        segments, first_start = covering_segments(self.playlist([4, 2.5, 6]), 5, 7)
+        self.assertEqual([s.uri for s in segments], ['seg1.m4s', 'seg2.m4s'])
+        self.assertEqual(first_start, 4)
+
+    def test_window_starting_on_segment_boundary(self):
+        segments, first_start = covering_segments(self.playlist([2, 2, 2]), 2, 3)
+        self.assertEqual([s.uri for s in segments], ['seg1.m4s'])
+        self.assertEqual(first_start, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import glob
+import hashlib
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from remote_assets import RemoteAssetCache
+
+# Stand-in for an asset host: serves server.assets (path -> bytes) with a strong ETag, answers a
+# matching If-None-Match with 304 and logs (path, status) of every request
+class ETagHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        data = self.server.assets.get(self.path)
+        etag = data is not None and f'"{hashlib.sha1(data).hexdigest()}"'
+        status = 404 if data is None else 304 if self.headers.get('If-None-Match') == etag else 200
+        with self.server.lock: # Before answering, the client may look at the log as soon as it has the response
+            self.server.requests.append((self.path, status))
+
+        if status == 404:
+            self.send_error(status)
+            return
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        if status == 200:
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class RemoteAssetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix='reels_remote_assets_test_')
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+        self.server.assets = {'/logo.png': b'logo v1', '/icon.png': b'icon', '/copy.png': b'logo v1'}
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    # A fresh cache on the shared directory, as a new process would have
+    def cache(self, **kwargs):
+        return RemoteAssetCache(self.cache_dir, http=requests.Session(), **kwargs)
+
+    def url(self, path):
+        return self.base_url + path
+
+    def requests_made(self):
+        with self.server.lock:
+            requests_made = list(self.server.requests)
+            self.server.requests.clear()
+        return requests_made
+
+    def blobs(self):
+        return glob.glob(os.path.join(self.cache_dir, 'blobs', '*', '*'))
+
+    def test_download_then_served_from_disk(self):
+        cache = self.cache()
+        digest = cache.digest(self.url('/logo.png'))
+        self.assertEqual(digest, hashlib.sha256(b'logo v1').hexdigest())
+        self.assertEqual(cache.reader(digest)(), b'logo v1')
+        self.assertEqual(cache.digest(self.url('/logo.png')), digest)
+        self.assertEqual(self.requests_made(), [('/logo.png', 200)])
+        self.assertEqual(cache.stats()['downloads'], 1)
+
+    def test_revalidation_not_modified(self):
+        digest = self.cache().digest(self.url('/logo.png'))
+        self.requests_made()
+
+        cache = self.cache()
+        self.assertEqual(cache.digest(self.url('/logo.png')), digest)
+        self.assertEqual(self.requests_made(), [('/logo.png', 304)])
+        self.assertEqual((cache.downloads, cache.revalidations), (0, 1))
+
+    def test_changed_etag_downloads_again(self):
+        old_digest = self.cache().digest(self.url('/logo.png'))
+        self.server.assets['/logo.png'] = b'logo v2'
+        self.requests_made()
+
+        cache = self.cache()
+        digest = cache.digest(self.url('/logo.png'))
+        self.assertEqual(digest, hashlib.sha256(b'logo v2').hexdigest())
+        self.assertNotEqual(digest, old_digest)
+        self.assertEqual(cache.reader(digest)(), b'logo v2')
+        self.assertEqual(self.requests_made(), [('/logo.png', 200)])
+        self.assertEqual((cache.downloads, cache.revalidations), (1, 0))
+
+    def test_same_content_stored_once(self):
+        cache = self.cache()
+        self.assertEqual(cache.digest(self.url('/logo.png')), cache.digest(self.url('/copy.png')))
+        self.assertEqual(len(self.blobs()), 1)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_caches_sharing_a_directory_keep_each_others_entries(self):
+        first, second = self.cache(), self.cache()
+        first.digest(self.url('/logo.png'))
+        second.digest(self.url('/icon.png'))
+        self.requests_made()
+
+        cache = self.cache()
+        cache.digest(self.url('/logo.png'))
+        cache.digest(self.url('/icon.png'))
+        self.assertEqual(sorted(self.requests_made()), [('/icon.png', 304), ('/logo.png', 304)])
+
+    def test_server_unreachable_uses_cached_copy(self):
+        digest = self.cache().digest(self.url('/logo.png'))
+        del self.server.assets['/logo.png']
+        self.assertEqual(self.cache().digest(self.url('/logo.png')), digest)
+        with self.assertRaises(requests.RequestException):
+            self.cache().digest(self.url('/missing.png'))
+
+    def test_connect_timeout_fails_fast(self):
+        # A listening socket whose backlog is full never completes a handshake, like a host that drops packets
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(0)
+        port = listener.getsockname()[1]
+        pending = [socket.socket() for _ in range(3)]
+        for client in pending:
+            client.setblocking(False)
+            client.connect_ex(('127.0.0.1', port))
+        try:
+            start = time.perf_counter()
+            with self.assertRaises(requests.ConnectTimeout):
+                self.cache().digest(f'http://127.0.0.1:{port}/logo.png', timeout=(0.5, 5))
+            self.assertLess(time.perf_counter() - start, 2)
+        finally:
+            for client in pending + [listener]:
+                client.close()
+
+    def test_evicts_least_recently_used(self):
+        self.server.assets['/big.png'] = b'x' * 10
+        cache = self.cache(max_bytes=10, in_use=0)
+        logo = cache.digest(self.url('/logo.png'))
+        cache.digest(self.url('/copy.png')) # Same blob as logo.png
+        cache.digest(self.url('/icon.png'))
+        cache.digest(self.url('/big.png'))
+        self.assertEqual(cache.evictions, 3)
+        self.assertEqual([os.path.basename(path) for path in self.blobs()], [hashlib.sha256(b'x' * 10).hexdigest()])
+        self.requests_made()
+
+        self.assertEqual(cache.digest(self.url('/logo.png')), logo)
+        self.assertEqual(self.requests_made(), [('/logo.png', 200)])
+
+    def test_recently_used_entries_are_kept(self):
+        self.server.assets['/big.png'] = b'x' * 10
+        cache = self.cache(max_bytes=10)
+        cache.digest(self.url('/logo.png'))
+        cache.digest(self.url('/big.png'))
+        self.assertEqual(cache.evictions, 0)
+        self.assertEqual(len(self.blobs()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from variants import parse_variants, variant_encoding_params
+
+TWO_VARIANTS = {
+    'video_bitrate': 4000000,
+    'variants': [
+        {'name': 'youtube', 'aspect_ratio': [16, 9], 'template': 'rectangle', 'layout': 'left'},
+        {'name': 'tiktok', 'aspect_ratio': [9, 16], 'template': 'diamond', 'layout': 'center', 'video_bitrate': 2000000, 'size': [1080, 1920]},
+    ],
+}
+
+class ParseVariantsTest(unittest.TestCase):
+    def test_two_variants(self):
+        youtube, tiktok = parse_variants(TWO_VARIANTS, 'diamond', 'left', [16, 9])
+        self.assertEqual((youtube.name, youtube.aspect_ratio, youtube.template, youtube.layout, youtube.size), ('youtube', [16, 9], 'rectangle', 'left', None))
+        self.assertEqual((tiktok.name, tiktok.aspect_ratio, tiktok.template, tiktok.layout, tiktok.size), ('tiktok', [9, 16], 'diamond', 'center', (1080, 1920)))
+        self.assertEqual(youtube.encoding_params(TWO_VARIANTS), {'video_bitrate': 4000000})
+        self.assertEqual(tiktok.encoding_params(TWO_VARIANTS), {'video_bitrate': 2000000})
+
+    def test_missing_keys_fall_back_to_the_job(self):
+        (variant,) = parse_variants({'variants': [{}]}, 'diamond', 'center', [9, 16])
+        self.assertEqual((variant.name, variant.aspect_ratio, variant.template, variant.layout), ('variant0', [9, 16], 'diamond', 'center'))
+
+    def test_no_variants(self):
+        self.assertEqual(parse_variants({}, 'diamond', 'left', [16, 9]), [])
+        self.assertEqual(parse_variants(None, 'diamond', 'left', [16, 9]), [])
+
+    def test_template_without_layout_for_aspect(self):
+        spec = {'variants': [{'name': 'tiktok', 'aspect_ratio': [9, 16], 'template': 'rectangle'}]}
+        with self.assertRaisesRegex(ValueError, "'tiktok'.*rectangle.*9:16"):
+            parse_variants(spec, 'diamond', 'left', [16, 9])
+        # The job's template is checked as well when a variant does not name one
+        with self.assertRaises(ValueError):
+            parse_variants({'variants': [{'aspect_ratio': [9, 16]}]}, 'rectangle', 'left', [16, 9])
+
+    def test_unknown_template(self):
+        with self.assertRaises(ValueError):
+            parse_variants({'variants': [{'template': 'hexagon'}]}, None, 'left', [16, 9])
+
+    def test_other_aspects_use_the_closest_layout(self):
+        (square,) = parse_variants({'variants': [{'aspect_ratio': [1, 1], 'template': 'rectangle'}]}, None, 'left', None)
+        self.assertEqual(square.aspect_ratio, [1, 1])
+
+    def test_variant_encoding_params(self):
+        self.assertEqual(variant_encoding_params(TWO_VARIANTS)['video_bitrate'], 4000000) # The primary output is the first variant
+        self.assertEqual(variant_encoding_params(TWO_VARIANTS, 'tiktok')['video_bitrate'], 2000000)
+        self.assertEqual(variant_encoding_params({'crf': 20}), {'crf': 20})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,9 @@ import json
 import logging
 import re
 import subprocess
+import threading
 import time
+from progress import ProgressReader, with_progress_args
 
 #log = logging.getLogger('highlight-reels')
 
@@ -25,12 +27,27 @@ import time
 #                 self.video_duration = float(stream['duration'])
 #                 self.video_n_frames = int(self.video_fps * self.video_duration)
 
-def run_and_log(cmd: [] or str, msg: str = None, shell: bool = False):
+# Run a command and log how it went. ffmpeg commands report -progress on stdout while they run, which is
+# published to progress_monitor under msg; duration_s or total_frames of the output give percent and ETA.
+def run_and_log(cmd: [] or str, msg: str = None, shell: bool = False, duration_s: float = None, total_frames: int = None):
     try:
         t_start = time.monotonic()
+        cmd, reports_progress = with_progress_args(cmd)
         print(f'[reels] Cmd to run ({msg}): {" ".join(cmd) if isinstance(cmd, list) else cmd}')
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=shell)
-        stdout, stderr = process.communicate()
+
+        if reports_progress:
+            # stderr is drained on its own thread so ffmpeg never blocks on it while stdout is read
+            stderr_chunks = []
+            stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+            stderr_thread.start()
+            reader = ProgressReader(process.stdout, msg or str(cmd)[:40], duration_s, total_frames)
+            reader.read()
+            process.wait()
+            stderr_thread.join()
+            stdout, stderr = '\n'.join(reader.other_output).encode('utf-8'), b''.join(stderr_chunks)
+        else:
+            stdout, stderr = process.communicate()
         return_code = process.returncode
 
         cmd_dur = time.monotonic() - t_start
@@ -40,9 +57,9 @@ def run_and_log(cmd: [] or str, msg: str = None, shell: bool = False):
             print(f"[utils.py] line 40, cmd succeeded {cmd_dur:.3f}s:\n{stdout.decode('utf-8')}")
         else:
             #log.error(f"[reels] Cmd failed in {cmd_duration:.3f}s:\n{stderr.decode('utf-8')}")
-            print(f"[utils.py] line 43, cmd failed {cmd_dur:.3f}s:\n{stdout.decode('utf-8')}")
+            print(f"[utils.py] line 43, cmd failed {cmd_dur:.3f}s:\n{stderr.decode('utf-8', errors='replace')}")
 
         return return_code
     except Exception:
         #log.exception(f'[reels] Failed to run command: {cmd})
-        print(f'[utils.py] line 48, failed to run cmd commmand {cmd}')
\ No newline at end of file
+        print(f'[utils.py] line 48, failed to run cmd commmand {cmd}')
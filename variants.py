@@ -0,0 +1,85 @@
+import os
+import cv2
+
+WORK_DIR = 'video' # Where a job writes its clips and reels, render_reel gives every job its own
+
+# Aspect ratios the graphic templates have layouts for, other ratios borrow the closest one
+LAYOUT_ASPECTS = ([16, 9], [9, 16])
+
+# Layout aspects each graphic template is drawn for in graphics.compile_layout
+TEMPLATE_ASPECTS = {'rectangle': ([16, 9],), 'diamond': ([16, 9], [9, 16])}
+
+# One output of a multi-variant job, e.g. {"name": "tiktok", "aspect_ratio": [9, 16], "template": "diamond",
+# "layout": "center", "video_bitrate": 2000000, "size": [1080, 1920]}. Missing keys fall back to the job's settings.
+class Variant:
+    def __init__(self, name, aspect_ratio, template, layout, video_bitrate=None, size=None):
+        self.name = name
+        self.aspect_ratio = list(aspect_ratio)
+        self.template = template
+        self.layout = layout
+        self.video_bitrate = video_bitrate
+        self.size = tuple(size) if size else None
+
+    # Encoding parameters for this variant's writer
+    def encoding_params(self, encoding_params):
+        params = dict(encoding_params)
+        params.pop('variants', None)
+        if self.video_bitrate:
+            params['video_bitrate'] = self.video_bitrate
+        return params
+
+# Variants declared in encoding_params['variants'], empty for an ordinary single-output job. Raises
+# ValueError for a template that has no layout for the variant's aspect ratio.
+def parse_variants(encoding_params, template, layout, aspect_ratio):
+    variants = []
+    for i, spec in enumerate((encoding_params or {}).get('variants') or []):
+        variant = Variant(spec.get('name', f'variant{i}'),
+                          spec.get('aspect_ratio') or aspect_ratio or [16, 9],
+                          spec.get('template', template),
+                          spec.get('layout', layout),
+                          spec.get('video_bitrate'),
+                          spec.get('size'))
+        if variant.template is not None and layout_aspect(variant.aspect_ratio) not in TEMPLATE_ASPECTS.get(variant.template, ()):
+            w, h = variant.aspect_ratio
+            raise ValueError(f"Variant '{variant.name}': the {variant.template} template has no layout for {w}:{h}")
+        variants.append(variant)
+    return variants
+
+# Encoding parameters the clips of the named variant are written with. None is the primary output,
+# which the first variant of a multi-variant job renders to.
+def variant_encoding_params(encoding_params, name=None):
+    for i, variant in enumerate(parse_variants(encoding_params, None, None, None)):
+        if variant.name == name or name is None and i == 0:
+            return variant.encoding_params(encoding_params)
+    return encoding_params
+
+# Rendered clip file; the first (primary) variant keeps the plain name so merging works unchanged
+def meta_filename(clip_num, variant=None, work_dir=WORK_DIR):
+    if variant:
+        return os.path.join(work_dir, f'{clip_num}_{variant}_meta.mp4')
+    return os.path.join(work_dir, f'{clip_num}_meta.mp4')
+
+# Template layout to use for an aspect ratio
+def layout_aspect(aspect_ratio):
+    if aspect_ratio in LAYOUT_ASPECTS:
+        return aspect_ratio
+    return [16, 9] if aspect_ratio[0] >= aspect_ratio[1] else [9, 16]
+
+# Largest centered region of a width x height frame with the given aspect ratio, as (x, y, w, h)
+def crop_box(width, height, aspect_ratio):
+    aw, ah = aspect_ratio
+    w = min(width, height * aw // ah) & ~1
+    h = min(height, width * ah // aw) & ~1
+    return (width - w) // 2, (height - h) // 2, w, h
+
+# Output size of a variant: its own size if given, else the crop at source resolution
+def output_size(box, size=None):
+    return size or (box[2], box[3])
+
+# The variant's view of a decoded frame, as a new buffer the overlay can be blended onto
+def crop_and_scale(frame, box, size):
+    x, y, w, h = box
+    crop = frame[y:y + h, x:x + w]
+    if (w, h) == tuple(size):
+        return crop.copy()
+    return cv2.resize(crop, tuple(size), interpolation=cv2.INTER_AREA)
@@ -0,0 +1,180 @@
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+import cv2
+from progress import ProgressReader, PROGRESS_ARGS
+
+CRF_HIGH_QUALITY = 18
+CRF_OUTPUT_VIDEO = 22
+
+WRITER_FFMPEG = 'ffmpeg'
+WRITER_OPENCV = 'opencv'
+
+# Fixed stream parameters for encoding_params['match_output'], so every clip of a compilation
+# comes out identical in the ways the concat demuxer cares about and can be joined by stream copy
+MATCH_PROFILE = 'high'
+MATCH_TIMESCALE = 90000
+
+# Encodes BGR frames to H.264 by streaming them raw into an ffmpeg subprocess.
+# Frames go through the stdin pipe only, whose kernel buffer is bounded, so a slow
+# encoder blocks write() instead of raw frames piling up in memory or on disk.
+# Mirrors the cv2.VideoWriter interface (write/release/isOpened). Encoder progress is published
+# to progress_monitor under the output's file name, with percent and ETA when total_frames is given.
+class FFmpegWriter:
+    def __init__(self, output_filename, fps, size, crf=CRF_OUTPUT_VIDEO, video_bitrate=None, preset='veryfast', extra_output_args=None, ffmpeg='ffmpeg', audio_source=None, audio_tracks=None, video_filter=None, audio_window=None, total_frames=None):
+        self.output_filename = output_filename
+        self.width, self.height = size
+        self.frames_written = 0
+        self._stderr = deque(maxlen=50)
+
+        self.cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y'] + PROGRESS_ARGS + [
+                    '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{self.width}x{self.height}', '-r', str(fps), '-i', '-']
+        # The source's audio is muxed in untouched, as a second input next to the piped frames
+        if audio_source:
+            self.cmd += input_window_args(audio_window) + ['-i', audio_source, '-map', '0:v'] + audio_map_args(1, audio_tracks)
+        if video_filter:
+            self.cmd += ['-vf', video_filter]
+        self.cmd += encoder_args(crf, video_bitrate, preset)
+        self.cmd += extra_output_args or []
+        self.cmd += [output_filename]
+
+        self.process = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+        # Drain stderr continuously so ffmpeg can never block on a full stderr pipe
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+        self._progress = ProgressReader(self.process.stdout, os.path.basename(output_filename), total_frames=total_frames).watch()
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self._stderr.append(line.decode('utf-8', errors='replace').rstrip())
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def write(self, frame):
+        if frame.shape[:2] != (self.height, self.width):
+            raise ValueError(f'Frame size {frame.shape[1]}x{frame.shape[0]} does not match writer size {self.width}x{self.height}')
+        try:
+            self.process.stdin.write(memoryview(frame if frame.flags.c_contiguous else frame.copy()).cast('B'))
+        except (BrokenPipeError, OSError):
+            self.process.wait()
+            self._stderr_thread.join()
+            raise RuntimeError(f'ffmpeg stopped while encoding {self.output_filename}: {self.error_output()}')
+        self.frames_written += 1
+
+    def release(self):
+        if not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+        return_code = self.process.wait()
+        self._stderr_thread.join()
+        self._progress.join()
+
+        if return_code != 0:
+            raise RuntimeError(f'ffmpeg failed with code {return_code} while encoding {self.output_filename}: {self.error_output()}')
+
+    def error_output(self):
+        return '\n'.join(self._stderr)
+
+BITRATE_SUFFIXES = {'k': 1e3, 'm': 1e6, 'g': 1e9} # SI multipliers, as ffmpeg reads them for bit rates
+
+# Bits per second of a bitrate as the configs give it (2500000, '2500000', '2500k', '4M'), None if unreadable
+def parse_bitrate(bitrate):
+    value = str(bitrate).strip().lower()
+    multiplier = BITRATE_SUFFIXES.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        return None
+
+# H.264 encoder arguments: constant quality, capped at video_bitrate when one is given
+def encoder_args(crf=CRF_OUTPUT_VIDEO, video_bitrate=None, preset='veryfast'):
+    args = ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p']
+    if video_bitrate:
+        args += ['-maxrate', str(video_bitrate).strip()]
+        bits = parse_bitrate(video_bitrate)
+        if bits:
+            args += ['-bufsize', str(2 * bits)]
+        else:
+            print(f'Cannot read video bitrate {video_bitrate}, passing it to ffmpeg without a buffer size.')
+    return args + ['-movflags', '+faststart']
+
+# Input options reading only window = (start_s, duration_s) of the next input
+def input_window_args(window=None):
+    if not window:
+        return []
+    start_s, duration_s = window
+    return ['-ss', f'{start_s:.6f}', '-t', f'{duration_s:.6f}']
+
+# Map the audio streams of input to the output and copy them as they are. audio_tracks is an audio
+# stream index or a list of them, None keeps every audio stream. Maps are optional (?), so a source
+# without audio still renders.
+def audio_map_args(input_index, audio_tracks=None):
+    if audio_tracks is None:
+        maps = [f'{input_index}:a?']
+    else:
+        tracks = audio_tracks if isinstance(audio_tracks, (list, tuple)) else [audio_tracks]
+        maps = [f'{input_index}:a:{track}?' for track in tracks]
+
+    args = []
+    for stream in maps:
+        args += ['-map', stream]
+    return args + ['-c:a', 'copy']
+
+# Filter chain for match_output: square pixels, plus the output_size ([w, h], letterboxed) and output_fps when given
+def match_output_filter(encoding_params):
+    if not encoding_params.get('match_output'):
+        return None
+    filters = []
+    if encoding_params.get('output_size'):
+        w, h = encoding_params['output_size']
+        filters.append(f'scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2')
+    filters.append('setsar=1')
+    if encoding_params.get('output_fps'):
+        filters.append(f"fps={encoding_params['output_fps']}")
+    return ','.join(filters)
+
+def match_output_args(encoding_params):
+    if not encoding_params.get('match_output'):
+        return []
+    return ['-profile:v', MATCH_PROFILE, '-video_track_timescale', str(MATCH_TIMESCALE)]
+
+# Limits the encoder's thread count, for when several encoders share the machine
+def threads_args(threads=None):
+    return ['-threads', str(threads)] if threads else []
+
+# Writer for a rendered clip, H.264 through ffmpeg unless the job asks for OpenCV or ffmpeg is missing.
+# With audio_source, its audio streams (audio_window of them, if given) are copied into the output.
+def open_writer(output_filename, fps, size, encoding_params=None, audio_source=None, audio_window=None, total_frames=None):
+    encoding_params = encoding_params or {}
+    backend = encoding_params.get('writer_backend', WRITER_FFMPEG)
+
+    if os.path.exists(output_filename):
+        os.remove(output_filename)
+        print(f"Existing {output_filename} deleted successfully.")
+
+    if backend == WRITER_FFMPEG and shutil.which('ffmpeg'):
+        return FFmpegWriter(output_filename, fps, size,
+                            crf=encoding_params.get('crf', CRF_OUTPUT_VIDEO),
+                            video_bitrate=encoding_params.get('video_bitrate'),
+                            extra_output_args=threads_args(encoding_params.get('encoder_threads')) + match_output_args(encoding_params),
+                            video_filter=match_output_filter(encoding_params),
+                            audio_source=audio_source,
+                            audio_window=audio_window,
+                            audio_tracks=encoding_params.get('audio_tracks'),
+                            total_frames=total_frames)
+
+    if backend == WRITER_FFMPEG:
+        print('ffmpeg was not found, falling back to OpenCV writer.')
+    if audio_source:
+        print(f'OpenCV writer cannot carry audio, {output_filename} will be silent.')
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(output_filename, fourcc, fps, size)